@@ -0,0 +1,58 @@
+"""
+Builds the program as a zipapp - a single executable file - with precompiled bytecode.
+
+Usage:
+
+  > python3 make-zipapp.py [TARGET]
+
+The default TARGET is build/filelist.pyz.
+
+The bytecode is compiled by, and is only used by, the version of Python that runs this script
+(other versions compile the sources when the program is started).
+The bytecode is not checked against the sources, so that starting the program
+does not involve checking timestamps.
+"""
+
+import os
+import py_compile
+import stat
+import sys
+import tempfile
+import zipfile
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parent / 'src'
+PACKAGE = 'filelist_lib'
+MAIN_SCRIPT = 'filelist.py'
+DEFAULT_TARGET = Path('build') / 'filelist.pyz'
+INTERPRETER = '/usr/bin/env python3'
+
+
+def add_module(zip_file: zipfile.ZipFile,
+               source: Path,
+               name_in_archive: str,
+               tmp_dir: Path):
+    """Adds the source of a module, together with its bytecode."""
+    zip_file.write(str(source), name_in_archive)
+    compiled = tmp_dir / (name_in_archive.replace('/', '.') + 'c')
+    py_compile.compile(str(source),
+                       cfile=str(compiled),
+                       dfile=name_in_archive,
+                       doraise=True,
+                       invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH)
+    zip_file.write(str(compiled), name_in_archive + 'c')
+
+
+def build(target: Path):
+    target.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix='filelist-zipapp-') as tmp_dir, target.open('wb') as f:
+        f.write(b'#!' + INTERPRETER.encode() + b'\n')
+        with zipfile.ZipFile(f, 'w', compression=zipfile.ZIP_STORED) as zip_file:
+            add_module(zip_file, SRC_DIR / MAIN_SCRIPT, '__main__.py', Path(tmp_dir))
+            for source in sorted((SRC_DIR / PACKAGE).glob('*.py')):
+                add_module(zip_file, source, PACKAGE + '/' + source.name, Path(tmp_dir))
+    os.chmod(str(target), os.stat(str(target)).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+
+if __name__ == '__main__':
+    build(Path(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_TARGET)
@@ -1,3 +1,12 @@
-from filelist_lib import main
+import sys
 
-main.main()
+from filelist_lib import daemon_client
+
+if __name__ == "__main__":
+    exit_code = daemon_client.forward_to_running_daemon(sys.argv[1:])
+    if exit_code is not None:
+        sys.exit(exit_code)
+
+    from filelist_lib import main
+
+    main.main_of_program()
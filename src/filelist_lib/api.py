@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+
+###############################################################################
+# In-process API.
+#
+# Gives the file-paths of list-files, without running the program in a
+# separate process. Nothing is written to stdout, and errors are reported
+# by exceptions, instead of by exiting.
+#
+# Example:
+#
+#   from filelist_lib import api
+#
+#   for file_path in api.iter_paths(["project.list"], missing="ignore"):
+#       print(file_path.path, sorted(file_path.tags))
+#
+# or, in a coroutine of asyncio:
+#
+#   async for file_path in api.aiter_paths(["project.list"]):
+#       print(file_path.path)
+###############################################################################
+
+from . import main
+
+# Exceptions raised by iter_paths.
+# All are sub classes of ExecutionException, which can render an error message.
+ExecutionException = main.ExecutionException
+FileArgumentException = main.FileArgumentException
+InstructionSyntaxErrorException = main.InstructionSyntaxErrorException
+ResultItemConstructionExceptionBase = main.ResultItemConstructionExceptionBase
+ResultItemConstructionForMissingFileException = main.ResultItemConstructionForMissingFileException
+PreprocessorException = main.PreprocessorException
+
+MISSING_FILE_MODES = tuple(main.FileExistenceHandlingModeOptionParser().mode_keys())
+
+
+class FilePath:
+    """
+    A file-path in the result of list-files.
+    """
+    def __init__(self,
+                 path: str,
+                 tags: frozenset,
+                 exists: bool):
+        """
+        :param path: The path, rendered according to the settings of iter_paths.
+        :param exists: Tells if the file existed when the list-file was evaluated.
+        """
+        self.path = path
+        self.tags = tags
+        self.exists = exists
+
+    def __repr__(self):
+        return "FilePath(" + repr(self.path) + ", " + repr(self.tags) + ", " + repr(self.exists) + ")"
+
+
+def new_tags_condition(tags,
+                       operator_name: str = main.TagsConditionSetup.DEFAULT_OPERATOR_NAME,
+                       negate: bool = False) -> main.TagsCondition:
+    """
+    A condition that selects the file-paths who's tags satisfy
+    <FILE-TAGS> OPERATOR tags (as --filter-tags and --operator-for-filter-tags).
+
+    :param tags: Iterable of tags.
+    :param operator_name: One of the operators of --operator-for-filter-tags.
+    :raises ValueError: Unknown operator.
+    """
+    tags_condition_setup = main.TagsConditionSetup()
+    if operator_name not in tags_condition_setup.all_operator_names():
+        raise ValueError("Unknown tags operator: " + operator_name)
+    return tags_condition_setup.condition_for(operator_name,
+                                              negate,
+                                              frozenset(tags))
+
+
+def iter_paths(files: list,
+               tags_condition: main.TagsCondition = None,
+               missing: str = "fail",
+               normalize: bool = False,
+               absolute: bool = False,
+               relative_file_argument_location: bool = False,
+               forward_tags: bool = False,
+               instruction_prefix: str = main.DEFAULT_INSTRUCTION_PREFIX,
+               preprocessor: str = None):
+    """
+    Gives the file-paths of list-files, as the program would output them.
+
+    The arguments are checked directly, but the list-files are parsed and
+    evaluated lazily, while the iterator is consumed - so paths may be given
+    before an error is discovered.
+    Output other than file-paths (e.g. from PRINT) is not included.
+
+    The options correspond to those of the command line.
+
+    :param files: Names of list-files. "-" means stdin.
+    :param tags_condition: None, or a condition for the tags of file-paths (see new_tags_condition).
+    :param missing: Handling of file-paths of non-existing files - one of MISSING_FILE_MODES
+    (as --missing-file-handling).
+    :return: Iterator of FilePath.
+    :raises ValueError: Invalid argument.
+    :raises ExecutionException: Failure of the parsing or evaluation of a list-file.
+    """
+    parsing_settings, list_files = _parsed_list_files(files,
+                                                      tags_condition,
+                                                      missing,
+                                                      normalize,
+                                                      absolute,
+                                                      relative_file_argument_location,
+                                                      forward_tags,
+                                                      instruction_prefix,
+                                                      preprocessor)
+    return _file_paths(parsing_settings, list_files)
+
+
+def aiter_paths(files: list,
+                tags_condition: main.TagsCondition = None,
+                missing: str = "fail",
+                normalize: bool = False,
+                absolute: bool = False,
+                relative_file_argument_location: bool = False,
+                forward_tags: bool = False,
+                instruction_prefix: str = main.DEFAULT_INSTRUCTION_PREFIX,
+                preprocessor: str = None,
+                max_concurrency: int = 8,
+                executor=None):
+    """
+    Gives the file-paths of list-files, as iter_paths, but as an asynchronous iterator
+    for asyncio (see async_evaluation.py).
+
+    The event loop is not blocked by the evaluation: file and directory I/O is done by
+    an executor, and shell commands are executed as asyncio subprocesses.
+    The file-paths are the same as those of iter_paths, in the same order.
+
+    :param max_concurrency: The maximum number of concurrent file operations and shell commands.
+    :param executor: A concurrent.futures.Executor for file operations, or None for the
+    default executor of the event loop.
+    :return: Asynchronous iterator of FilePath.
+    :raises ValueError: Invalid argument.
+    :raises ExecutionException: Failure of the parsing or evaluation of a list-file.
+    """
+    if max_concurrency < 1:
+        raise ValueError("max_concurrency must be at least 1: " + str(max_concurrency))
+    from . import async_evaluation
+    parsing_settings, list_files = _parsed_list_files(files,
+                                                      tags_condition,
+                                                      missing,
+                                                      normalize,
+                                                      absolute,
+                                                      relative_file_argument_location,
+                                                      forward_tags,
+                                                      instruction_prefix,
+                                                      preprocessor)
+    evaluator = async_evaluation.AsyncEvaluator(parsing_settings, max_concurrency, executor)
+    return _async_file_paths(evaluator.result_items_of_list_files(list_files))
+
+
+def _parsed_list_files(files: list,
+                       tags_condition: main.TagsCondition,
+                       missing: str,
+                       normalize: bool,
+                       absolute: bool,
+                       relative_file_argument_location: bool,
+                       forward_tags: bool,
+                       instruction_prefix: str,
+                       preprocessor: str) -> tuple:
+    """
+    Checks the arguments.
+
+    :return: (ParsingSettings, iterator of parsed list-files - see Command.parsed_list_files)
+    """
+    if missing not in MISSING_FILE_MODES:
+        raise ValueError("Invalid missing file mode: " + str(missing))
+    if list(files).count(main.COMMAND_LINE_ARGUMENT_FOR_STDIN) > 1:
+        raise ValueError("stdin can be given at most once")
+    file_existence_handling_settings = main.FileExistenceHandlingModeOptionParser().lookup(missing)
+    if tags_condition is None:
+        tags_condition = main.TagsCondition.new_for_no_condition()
+    rendition_settings = main.RenditionSettings(relative_file_argument_location,
+                                                file_existence_handling_settings.include_existing_in_output,
+                                                file_existence_handling_settings.include_non_existing_in_output,
+                                                normalize,
+                                                absolute,
+                                                main.TagsRenditionSettings(False, False),
+                                                True)
+    parsing_settings = main.ParsingSettings(preprocessor,
+                                            main.system_line_parsers(instruction_prefix),
+                                            main.instruction_identifier_to_parser_dict())
+    parsing_settings = parsing_settings.new_constructing_only_output_of(rendition_settings)
+    list_files = main.Command.parsed_list_files(files,
+                                                forward_tags,
+                                                [],
+                                                file_existence_handling_settings.program_should_fail_on_non_existing,
+                                                tags_condition,
+                                                rendition_settings,
+                                                parsing_settings)
+    return parsing_settings, list_files
+
+
+def _file_paths(parsing_settings: main.ParsingSettings,
+                list_files):
+    for _, _, file_processor, env in list_files:
+        for result_item in file_processor.result_item_iterable(parsing_settings, env):
+            if _is_output_file_path(result_item, env):
+                yield _file_path(result_item, env)
+
+
+async def _async_file_paths(result_items_and_envs):
+    async for result_item, env in result_items_and_envs:
+        if _is_output_file_path(result_item, env):
+            yield _file_path(result_item, env)
+
+
+def _is_output_file_path(result_item: main.ResultItem,
+                         env: main.RenditionEnvironment) -> bool:
+    return isinstance(result_item, main.ResultItemForFilePath) and result_item.include_in_output(env)
+
+
+def _file_path(result_item: main.ResultItemForFilePath,
+               env: main.RenditionEnvironment) -> FilePath:
+    return FilePath(env.render_file_name(result_item.file_name),
+                    result_item.tags,
+                    isinstance(result_item, main.ResultItemForFilePathExisting))
@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+
+###############################################################################
+# Evaluation of list-files for asyncio.
+#
+# Evaluates the same Processor:s as the ordinary evaluation (main.py), in the
+# same order - so the ResultItem:s are the same, and come in the same order.
+# But blocking operations are not executed by the event loop:
+#  - file and directory I/O (and preprocessors) is executed by an executor,
+#  - shell commands of SHELL are executed as asyncio subprocesses.
+#
+# Included list-files are read and parsed ahead, concurrently with the
+# evaluation of the preceding instructions. Reading ahead stops at SHELL
+# instructions, since a command may create the files that follows it - and
+# at included list-files that may execute commands themselves (contain SHELL
+# or INCLUDE). Nothing is read ahead when a preprocessor is used, since
+# the preprocessor is itself a command.
+#
+# The number of concurrent blocking operations and shell commands is bounded.
+###############################################################################
+
+import asyncio
+import itertools
+import locale
+import time
+
+from . import main
+
+MAX_NUM_FILE_PATHS_PER_BATCH = 1000
+
+
+class AsyncEvaluator:
+    """
+    Evaluates list-files, and gives their ResultItem:s as asynchronous iterators.
+
+    Must be used by a single event loop.
+    """
+
+    def __init__(self,
+                 parsing_settings: main.ParsingSettings,
+                 max_concurrency: int,
+                 executor=None):
+        """
+        :param max_concurrency: The maximum number of concurrent blocking operations
+        and shell commands. Also the maximum number of list-files that are read ahead
+        (per list-file).
+        :param executor: A concurrent.futures.Executor for blocking operations,
+        or None for the default executor of the event loop.
+        """
+        self.parsing_settings = parsing_settings
+        self._max_concurrency = max_concurrency
+        self._executor = executor
+        self._semaphore = None
+
+    def max_concurrency(self) -> int:
+        return self._max_concurrency
+
+    async def run_blocking(self, function, *args):
+        """Executes a function by the executor."""
+        async with self._concurrency_limit():
+            return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+
+    def _concurrency_limit(self) -> asyncio.Semaphore:
+        # Constructed when first used, so that it belongs to the running event loop.
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        return self._semaphore
+
+    async def result_items_of_list_files(self, list_files):
+        """
+        :param list_files: Iterator of (file number, file name, ProcessorForListFile, RenditionEnvironment)
+        (as given by Command.parsed_list_files) - list-files are parsed by the executor.
+        :return: Asynchronous iterator of (ResultItem, RenditionEnvironment of the list-file).
+        """
+        while True:
+            list_file = await self.run_blocking(next, list_files, None)
+            if list_file is None:
+                return
+            _, _, file_processor, env = list_file
+            async for result_item in self.result_items(file_processor.processors(), env):
+                yield result_item, env
+
+    async def result_items(self,
+                           instructions: list,
+                           env: main.ResultItemsConstructionEnvironment):
+        """
+        :param instructions: The Processor:s of a list-file.
+        :return: Asynchronous iterator of the ResultItem:s of the instructions.
+        """
+        read_ahead = _ReadAhead(self, instructions, env)
+        release_evaluated_instructions = self.parsing_settings.list_file_cache is None
+        index = 0
+        try:
+            while index < len(instructions):
+                read_ahead.start_reading(index)
+                instruction = instructions[index]
+                if isinstance(instruction, main.ProcessorForFilePaths):
+                    result_items = self._result_items_of_file_paths(instruction, env)
+                else:
+                    result_items = self._result_items_of_instruction(instruction, env, read_ahead, index)
+                if release_evaluated_instructions:
+                    instructions[index] = None
+                index += 1
+                async for result_item in result_items:
+                    yield result_item
+        finally:
+            read_ahead.cancel()
+
+    async def _result_items_of_instruction(self,
+                                           instruction: main.Processor,
+                                           env: main.ResultItemsConstructionEnvironment,
+                                           read_ahead,
+                                           index: int):
+        parsing_settings = self.parsing_settings
+        if isinstance(instruction, main.ProcessorForInclude):
+            env_for_file = instruction.env_for_included_file(env)
+            file_processor = await read_ahead.parsed_included_file(index, instruction)
+            async for result_item in self.result_items(file_processor.processors(), env_for_file):
+                yield result_item
+        elif isinstance(instruction, main.ProcessorForShell):
+            if env.current_tags_satisfies_tags_filter():
+                output = await self._output_of_shell_command(instruction, env)
+                async for result_item in self._result_items_by_executor(
+                        lambda: instruction.result_item_iterable_for_output(parsing_settings, env, output)):
+                    yield result_item
+        elif isinstance(instruction, main.ProcessorForFileSetBase):
+            async for result_item in self._result_items_by_executor(
+                    lambda: instruction.result_item_iterable(parsing_settings, env)):
+                yield result_item
+        else:
+            # Instructions without I/O (tags, PRINT).
+            for result_item in instruction.result_item_iterable(parsing_settings, env):
+                yield result_item
+
+    async def _result_items_of_file_paths(self,
+                                          instruction: main.ProcessorForFilePaths,
+                                          env: main.ResultItemsConstructionEnvironment):
+        """
+        The existence of the files of consecutive file-path lines are checked by
+        a single operation by the executor, for each batch of files.
+        """
+        result_item_iterator = instruction.result_item_iterable(self.parsing_settings, env)
+        while True:
+            result_items, exception = await self.run_blocking(
+                _result_items_until_failure,
+                lambda: itertools.islice(result_item_iterator, MAX_NUM_FILE_PATHS_PER_BATCH))
+            for result_item in result_items:
+                yield result_item
+            if exception is not None:
+                raise exception
+            if len(result_items) < MAX_NUM_FILE_PATHS_PER_BATCH:
+                return
+
+    async def _result_items_by_executor(self, result_item_iterable_constructor):
+        """
+        Evaluates a function that gives a ResultItem iterable, by the executor.
+
+        If the evaluation fails, the items that precede the failure are given before the exception
+        is raised (as in the ordinary evaluation).
+        """
+        result_items, exception = await self.run_blocking(_result_items_until_failure,
+                                                          result_item_iterable_constructor)
+        for result_item in result_items:
+            yield result_item
+        if exception is not None:
+            raise exception
+
+    async def _output_of_shell_command(self,
+                                       instruction: main.ProcessorForShell,
+                                       env: main.ResultItemsConstructionEnvironment) -> str:
+        """
+        Corresponds to check_output_of_shell_command.
+
+        :raises ResultItemConstructionForShellException: The command failed.
+        """
+        import subprocess
+        command_line = instruction.command_line()
+        start_time = time.perf_counter()
+        async with self._concurrency_limit():
+            process = await asyncio.create_subprocess_shell(command_line,
+                                                            stdout=asyncio.subprocess.PIPE,
+                                                            cwd=instruction.working_directory(env))
+            output_bytes, _ = await process.communicate()
+        self.parsing_settings.file_system.invalidate()
+        output = _text_with_universal_newlines(output_bytes)
+        if self.parsing_settings.observer is not None:
+            self.parsing_settings.observer.subprocess_finished(instruction.source,
+                                                               command_line,
+                                                               process.returncode,
+                                                               start_time,
+                                                               time.perf_counter() - start_time)
+        if process.returncode != 0:
+            raise main.ResultItemConstructionForShellException(
+                instruction.source,
+                subprocess.CalledProcessError(process.returncode, command_line, output))
+        return output
+
+
+class _ReadAhead:
+    """
+    Parses the files included by the instructions of a list-file, ahead of their evaluation.
+    """
+
+    def __init__(self,
+                 evaluator: AsyncEvaluator,
+                 instructions: list,
+                 env: main.ResultItemsConstructionEnvironment):
+        """
+        :param env: The environment of the list-file. Parsing an included file depends
+        only on the directory of the environment, which is the same for all instructions.
+        """
+        self._evaluator = evaluator
+        self._instructions = instructions
+        self._env = env
+        self._parsings = {}
+        self._next_index = 0
+        self._current_index = 0
+        self._is_cancelled = False
+        self._last_included_file_index = None
+        self._indexes_of_included_files_without_commands = set()
+        self._is_enabled = evaluator.parsing_settings.preprocessor_shell_command_or_none is None
+
+    def start_reading(self, current_index: int):
+        """
+        Starts parsing of the included files of the current and following instructions,
+        up to the next SHELL instruction that has not been evaluated, or the next included
+        file that has not been evaluated, and may execute commands.
+
+        Reading continues when an included file that has been read ahead is found to
+        not execute commands.
+        """
+        if not self._is_enabled:
+            return
+        self._current_index = current_index
+        instructions = self._instructions
+        if self._next_index < current_index:
+            self._next_index = current_index
+        while (self._next_index < len(instructions) and
+               len(self._parsings) < self._evaluator.max_concurrency()):
+            if self._preceding_included_file_may_execute_commands(current_index):
+                return
+            instruction = instructions[self._next_index]
+            if isinstance(instruction, main.ProcessorForShell):
+                return
+            if isinstance(instruction, main.ProcessorForInclude):
+                self._start_parsing(self._next_index, instruction)
+            self._next_index += 1
+
+    async def parsed_included_file(self,
+                                   index: int,
+                                   instruction: main.ProcessorForInclude) -> main.ProcessorForListFile:
+        """
+        :param instruction: The instruction at the index - which may have been released from
+        the instructions of the list-file.
+        """
+        parsing = self._parsings.pop(index, None)
+        if parsing is None:
+            return await self._parse(instruction)
+        return await parsing
+
+    def cancel(self):
+        self._is_cancelled = True
+        for parsing in self._parsings.values():
+            if parsing.done():
+                if not parsing.cancelled():
+                    # Retrieve the exception, if any, so that it is not reported as not retrieved.
+                    parsing.exception()
+            else:
+                parsing.cancel()
+        self._parsings = {}
+
+    def _start_parsing(self, index: int, instruction: main.ProcessorForInclude):
+        parsing = asyncio.ensure_future(self._parse(instruction))
+        parsing.add_done_callback(lambda finished: self._parsing_finished(index, finished))
+        self._parsings[index] = parsing
+        self._last_included_file_index = index
+
+    def _parsing_finished(self, index: int, parsing: asyncio.Future):
+        if parsing.cancelled() or parsing.exception() is not None:
+            return
+        if not parsing.result().may_execute_commands():
+            self._indexes_of_included_files_without_commands.add(index)
+            if not self._is_cancelled:
+                self.start_reading(self._current_index)
+
+    def _preceding_included_file_may_execute_commands(self, current_index: int) -> bool:
+        """
+        Tells if the last included file that has been read ahead has not been evaluated,
+        and may execute commands (that may create or modify the files that follows it).
+
+        An included file is assumed to execute commands until it has been parsed.
+        """
+        index = self._last_included_file_index
+        return (index is not None and
+                index >= current_index and
+                index not in self._indexes_of_included_files_without_commands)
+
+    def _parse(self, instruction: main.ProcessorForInclude):
+        return self._evaluator.run_blocking(instruction.parsed_included_file,
+                                            self._evaluator.parsing_settings,
+                                            self._env)
+
+
+def _result_items_until_failure(result_item_iterable_constructor) -> tuple:
+    """
+    :return: (list of ResultItem:s, None or the ExecutionException that ended the evaluation)
+    """
+    result_items = []
+    try:
+        for result_item in result_item_iterable_constructor():
+            result_items.append(result_item)
+    except main.ExecutionException as ex:
+        return result_items, ex
+    return result_items, None
+
+
+def _text_with_universal_newlines(output: bytes) -> str:
+    """The output as text, as from subprocess with universal_newlines."""
+    text = output.decode(locale.getpreferredencoding(False))
+    return text.replace("\r\n", "\n").replace("\r", "\n")
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+
+###############################################################################
+# A server that executes the program for clients (see daemon_client.py),
+# and keeps parsed list-files and directory listings in memory between
+# executions.
+#
+# Requests are executed one at a time, in the process of the daemon.
+# Only clients that run as the user of the daemon are served, and the socket
+# must be in a directory that only the user can modify.
+# For each request, the current directory, the environment, stdin, stdout
+# and stderr of the process are set to those of the client - both the Python
+# streams (stdout and stderr are sent as frames) and the file descriptors 0-2,
+# that are inherited by commands (SHELL and preprocessors).
+# (A daemon that uses inotify, or that executes requests in parallel,
+# would have to be more careful about this state.)
+#
+# Cached list-files and directory listings are validated by their modification
+# times (and inodes) each time they are used, so that a modified file or directory
+# is read again.
+###############################################################################
+
+import contextlib
+import io
+import json
+import os
+import signal
+import socket
+import sys
+import traceback
+
+from . import daemon_client
+from . import main
+
+
+class _OutputStreamForFrames(io.TextIOBase):
+    """
+    A text stream that sends what is written to it to a client, as frames of a given type.
+    """
+
+    BUFFER_SIZE = 1 << 16
+
+    def __init__(self,
+                 connection: socket.socket,
+                 frame_type: bytes):
+        self._connection = connection
+        self._frame_type = frame_type
+        self._buffer = []
+        self._buffered_size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, s: str) -> int:
+        self._buffer.append(s)
+        self._buffered_size += len(s)
+        if self._buffered_size >= self.BUFFER_SIZE:
+            self.flush()
+        return len(s)
+
+    def flush(self):
+        if self._buffer:
+            data = "".join(self._buffer).encode(daemon_client.ENCODING,
+                                                daemon_client.ENCODING_ERRORS)
+            self._buffer = []
+            self._buffered_size = 0
+            daemon_client.send_frame(self._connection, self._frame_type, data)
+
+
+class Daemon:
+    """
+    Listens on a Unix domain socket, and executes requests.
+    """
+
+    def __init__(self,
+                 socket_path: str):
+        self.socket_path = socket_path
+        self.evaluation_caches = main.EvaluationCaches()
+        self._server_socket = None
+
+    def listen(self):
+        """
+        Creates the socket.
+
+        Exits with an error if another daemon is listening on the socket,
+        or if the socket is not private for the user.
+        A socket file left by a daemon that is no longer running is replaced.
+        """
+        if os.path.dirname(self.socket_path) == daemon_client.default_socket_directory():
+            os.makedirs(os.path.dirname(self.socket_path), mode=0o700, exist_ok=True)
+        non_private_reason = daemon_client.non_private_socket_reason(self.socket_path)
+        if non_private_reason is not None:
+            main.exit_usage(non_private_reason)
+        if os.path.lexists(self.socket_path):
+            if self._is_in_use(self.socket_path):
+                main.exit_usage("A daemon is already running on socket: " +
+                                main.in_double_quotes(self.socket_path))
+            os.unlink(self.socket_path)
+        self._server_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # The socket is created with access only for the user.
+        saved_umask = os.umask(0o177)
+        try:
+            self._server_socket.bind(self.socket_path)
+        finally:
+            os.umask(saved_umask)
+        self._server_socket.listen()
+
+    def serve_forever(self):
+        while True:
+            self.serve_one()
+
+    def serve_one(self):
+        """Waits for, and executes, a single request."""
+        connection, _ = self._server_socket.accept()
+        with connection:
+            try:
+                if not daemon_client.peer_is_the_user(connection):
+                    return
+                self._handle(connection)
+            except (OSError, daemon_client.ProtocolError):
+                # The client has gone away. There is no one to report to.
+                pass
+
+    def close(self):
+        if self._server_socket is not None:
+            self._server_socket.close()
+            self._server_socket = None
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+    def _handle(self, connection: socket.socket):
+        client_fds = daemon_client.receive_file_descriptors(connection)
+        try:
+            frame_type, data = daemon_client.receive_frame(connection)
+            if frame_type != daemon_client.FRAME_REQUEST:
+                raise daemon_client.ProtocolError("Expected a request frame: " + repr(frame_type))
+            request = json.loads(data.decode(daemon_client.ENCODING, daemon_client.ENCODING_ERRORS))
+            stdout = _OutputStreamForFrames(connection, daemon_client.FRAME_STDOUT)
+            stderr = _OutputStreamForFrames(connection, daemon_client.FRAME_STDERR)
+            with _standard_file_descriptors(client_fds):
+                exit_code = self._execute_with_process_state_of_client(request, stdout, stderr)
+        finally:
+            for fd in client_fds:
+                os.close(fd)
+        stdout.flush()
+        stderr.flush()
+        daemon_client.send_frame(connection,
+                                 daemon_client.FRAME_EXIT_CODE,
+                                 str(exit_code).encode(daemon_client.ENCODING))
+
+    def _execute_with_process_state_of_client(self,
+                                              request: dict,
+                                              stdout: io.TextIOBase,
+                                              stderr: io.TextIOBase) -> int:
+        saved_cwd = os.getcwd()
+        saved_environment = dict(os.environ)
+        saved_streams = (sys.stdin, sys.stdout, sys.stderr)
+        try:
+            os.chdir(request["cwd"])
+            os.environ.clear()
+            os.environ.update(request["environment"])
+            # A program run by the request (e.g. by SHELL) that runs filelist
+            # must not wait for this daemon, that is busy with the request.
+            os.environ[daemon_client.NO_DAEMON_ENV_VAR] = "1"
+            sys.stdin = io.StringIO(request["stdin"] or "")
+            sys.stdout = stdout
+            sys.stderr = stderr
+            return self._execute(request["arguments"])
+        finally:
+            sys.stdin, sys.stdout, sys.stderr = saved_streams
+            os.environ.clear()
+            os.environ.update(saved_environment)
+            os.chdir(saved_cwd)
+
+    def _execute(self, arguments: list) -> int:
+        """
+        :return: The exit code.
+        """
+        try:
+            main.main(arguments, self.evaluation_caches)
+            return 0
+        except SystemExit as ex:
+            return main.exit_code_of_system_exit(ex.code)
+        except ConnectionError:
+            raise
+        except Exception:
+            traceback.print_exc()
+            return daemon_client.EXIT_DAEMON_FAILURE
+
+    @staticmethod
+    def _is_in_use(socket_path: str) -> bool:
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(socket_path)
+            return True
+        except OSError:
+            return False
+        finally:
+            probe.close()
+
+
+@contextlib.contextmanager
+def _standard_file_descriptors(fds: list):
+    """
+    Makes file descriptors 0, 1 and 2 (inherited by subprocesses) refer to the given files,
+    and restores them afterwards.
+    """
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved_fds = [os.dup(standard_fd) for standard_fd in (0, 1, 2)]
+    try:
+        for standard_fd, fd in enumerate(fds):
+            os.dup2(fd, standard_fd)
+        yield
+    finally:
+        for standard_fd, saved_fd in enumerate(saved_fds):
+            os.dup2(saved_fd, standard_fd)
+            os.close(saved_fd)
+
+
+class _Terminated(BaseException):
+    """Raised by the handler of SIGTERM - not caught by the execution of a request."""
+    pass
+
+
+def _raise_terminated(signal_number, frame):
+    raise _Terminated()
+
+
+def serve(socket_path: str):
+    """Runs a daemon until it is interrupted or terminated."""
+    daemon = Daemon(socket_path)
+    daemon.listen()
+    signal.signal(signal.SIGTERM, _raise_terminated)
+    try:
+        daemon.serve_forever()
+    except (KeyboardInterrupt, _Terminated):
+        pass
+    finally:
+        daemon.close()
@@ -0,0 +1,319 @@
+# -*- coding: utf-8 -*-
+
+###############################################################################
+# Client of the filelist daemon (see daemon.py), and the protocol used
+# between the client and the daemon.
+#
+# This module is imported before the rest of the program, so it must be
+# cheap to import - it must not import the main module, and modules that
+# are only needed when a daemon is running are imported when needed.
+###############################################################################
+#
+# PROTOCOL
+# --------------------------------------
+# The client connects to the Unix domain socket of the daemon, and sends
+# a file descriptors frame and a single request frame - if the socket, and its directory, belong to the user,
+# and the daemon runs as the user. (The daemon, likewise, only serves clients
+# that run as the user.) The daemon answers with any number of output frames,
+# followed by an exit code frame, and then closes the connection.
+#
+# A frame is: TYPE (1 byte) LENGTH (4 bytes, big endian) DATA (LENGTH bytes)
+#
+# d  file descriptors
+#                No data - stdin, stdout and stderr of the client are passed
+#                as ancillary data (SCM_RIGHTS), for the commands executed by
+#                the daemon (SHELL and preprocessors).
+# r  request     JSON: {"arguments": [str], "cwd": str,
+#                       "environment": {str: str}, "stdin": str or null}
+#                The environment holds only the variables of FORWARDED_ENV_VARS,
+#                and those named by ENVIRONMENT_ENV_VAR.
+# o  stdout      Output, encoded as UTF-8
+# e  stderr      Output, encoded as UTF-8
+# x  exit code   The exit code of the execution, as a decimal number
+###############################################################################
+
+import os
+import sys
+
+SOCKET_ENV_VAR = "FILELIST_DAEMON_SOCKET"
+NO_DAEMON_ENV_VAR = "FILELIST_NO_DAEMON"
+ENVIRONMENT_ENV_VAR = "FILELIST_DAEMON_ENVIRONMENT"
+
+# Environment variables that are given to the daemon, for the commands it executes
+# (SHELL and preprocessors). Other variables are given only if named (separated by
+# space) by ENVIRONMENT_ENV_VAR.
+FORWARDED_ENV_VARS = ("PATH", "HOME", "USER", "LOGNAME", "SHELL", "TMPDIR", "TZ", "LANG", "LANGUAGE")
+FORWARDED_ENV_VAR_PREFIX = "LC_"
+
+DAEMON_OPTION = "--daemon"
+STDIN_ARGUMENT = "-"
+
+FRAME_FILE_DESCRIPTORS = b"d"
+FRAME_REQUEST = b"r"
+FRAME_STDOUT = b"o"
+FRAME_STDERR = b"e"
+FRAME_EXIT_CODE = b"x"
+
+ENCODING = "utf-8"
+ENCODING_ERRORS = "surrogateescape"
+
+EXIT_DAEMON_FAILURE = 1
+
+# The exit code when the reader of stdout has closed it (e.g. "filelist top.list | head").
+EXIT_STDOUT_CLOSED = 0
+
+_FRAME_HEADER_FORMAT = ">cI"
+_FRAME_HEADER_SIZE = 5
+
+
+class ProtocolError(Exception):
+    """The connection was closed, or the other side did not follow the protocol."""
+    pass
+
+
+class _StdoutClosed(Exception):
+    """The reader of stdout has closed it."""
+    pass
+
+
+def discard_further_output_on_stdout():
+    """
+    Redirects stdout to the null device, after the reader of stdout has closed it -
+    so that flushing stdout (e.g. at exit) does not fail.
+    """
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, sys.stdout.fileno())
+    os.close(devnull)
+
+
+def default_socket_path() -> str:
+    """
+    The socket given by the environment, or a socket in a directory that is private for the user.
+    """
+    from_environment = os.environ.get(SOCKET_ENV_VAR)
+    if from_environment:
+        return from_environment
+    return os.path.join(default_socket_directory(), "daemon.sock")
+
+
+def default_socket_directory() -> str:
+    """The directory of the default socket - created by the daemon, with access only for the user."""
+    directory = os.environ.get("XDG_RUNTIME_DIR") or "/tmp"
+    return os.path.join(directory, "filelist-daemon-" + str(os.getuid()))
+
+
+def non_private_socket_reason(socket_path: str):
+    """
+    Checks that the socket, and its directory, belong to the user, and that the directory
+    cannot be modified by others (so that the socket cannot be replaced).
+
+    :return: None if the socket is private, otherwise the reason why it is not.
+    """
+    import stat
+    directory = os.path.dirname(os.path.abspath(socket_path))
+    directory_stat = os.lstat(directory)
+    if not stat.S_ISDIR(directory_stat.st_mode) or directory_stat.st_uid != os.getuid():
+        return "The directory of the socket does not belong to the user: " + directory
+    if directory_stat.st_mode & 0o022:
+        return "The directory of the socket is writable by others: " + directory
+    if os.path.lexists(socket_path):
+        socket_stat = os.lstat(socket_path)
+        if not stat.S_ISSOCK(socket_stat.st_mode) or socket_stat.st_uid != os.getuid():
+            return "The socket does not belong to the user: " + socket_path
+    return None
+
+
+def peer_is_the_user(connection: "socket.socket") -> bool:
+    """
+    Tells if the process at the other side of a connection runs as the user.
+
+    The credentials of the peer are only available on platforms with SO_PEERCRED.
+    On other platforms, the access is restricted by the permissions of the socket only.
+    """
+    import socket
+    if not hasattr(socket, "SO_PEERCRED"):
+        return True
+    import struct
+    credentials = connection.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+    _, uid, _ = struct.unpack("3i", credentials)
+    return uid == os.getuid()
+
+
+def forwarded_environment() -> dict:
+    """The environment variables that are given to the daemon."""
+    names = set(FORWARDED_ENV_VARS)
+    names.update(os.environ.get(ENVIRONMENT_ENV_VAR, "").split())
+    return {name: value
+            for name, value in os.environ.items()
+            if name in names or name.startswith(FORWARDED_ENV_VAR_PREFIX)}
+
+
+def send_frame(connection: "socket.socket",
+               frame_type: bytes,
+               data: bytes):
+    import struct
+    connection.sendall(struct.pack(_FRAME_HEADER_FORMAT, frame_type, len(data)) + data)
+
+
+def receive_frame(connection: "socket.socket") -> tuple:
+    """
+    :return: (frame type, data)
+    """
+    import struct
+    frame_type, length = struct.unpack(_FRAME_HEADER_FORMAT, _receive_exactly(connection, _FRAME_HEADER_SIZE))
+    return frame_type, _receive_exactly(connection, length)
+
+
+def send_file_descriptors(connection: "socket.socket"):
+    """
+    Sends stdin, stdout and stderr of the process.
+
+    A closed stream is sent as the null device.
+    """
+    import socket
+    import struct
+    fds = []
+    null_fds = []
+    try:
+        for fd in (0, 1, 2):
+            try:
+                os.fstat(fd)
+                fds.append(fd)
+            except OSError:
+                null_fds.append(os.open(os.devnull, os.O_RDWR))
+                fds.append(null_fds[-1])
+        socket.send_fds(connection,
+                        [struct.pack(_FRAME_HEADER_FORMAT, FRAME_FILE_DESCRIPTORS, 0)],
+                        fds)
+    finally:
+        for fd in null_fds:
+            os.close(fd)
+
+
+def receive_file_descriptors(connection: "socket.socket") -> list:
+    """
+    :return: The file descriptors of stdin, stdout and stderr of the client (owned by the caller).
+    """
+    import socket
+    import struct
+    header, fds, _, _ = socket.recv_fds(connection, _FRAME_HEADER_SIZE, 3)
+    if len(header) != _FRAME_HEADER_SIZE or len(fds) != 3:
+        for fd in fds:
+            os.close(fd)
+        raise ProtocolError("Expected a file descriptors frame.")
+    frame_type, length = struct.unpack(_FRAME_HEADER_FORMAT, header)
+    if frame_type != FRAME_FILE_DESCRIPTORS or length != 0:
+        for fd in fds:
+            os.close(fd)
+        raise ProtocolError("Expected a file descriptors frame: " + repr(frame_type))
+    return fds
+
+
+def _receive_exactly(connection: "socket.socket",
+                     num_bytes: int) -> bytes:
+    chunks = []
+    while num_bytes > 0:
+        chunk = connection.recv(min(num_bytes, 1 << 16))
+        if not chunk:
+            raise ProtocolError("Connection closed by the other side.")
+        chunks.append(chunk)
+        num_bytes -= len(chunk)
+    return b"".join(chunks)
+
+
+def should_forward(arguments: list) -> bool:
+    if os.environ.get(NO_DAEMON_ENV_VAR):
+        return False
+    import socket
+    if not hasattr(socket, "send_fds"):
+        # Commands executed by the daemon could not use the streams of the client.
+        return False
+    for argument in arguments:
+        if argument == DAEMON_OPTION or argument.startswith(DAEMON_OPTION + "="):
+            return False
+    return True
+
+
+def forward_to_running_daemon(arguments: list):
+    """
+    Executes the program by a running daemon, if there is one.
+
+    The output of the daemon is written to stdout and stderr.
+
+    :param arguments: The command line arguments (without the program name).
+    :return: None if no daemon is running (and nothing has been done),
+    otherwise the exit code of the execution.
+    """
+    if not should_forward(arguments):
+        return None
+    socket_path = default_socket_path()
+    try:
+        if not os.path.exists(socket_path) or non_private_socket_reason(socket_path) is not None:
+            return None
+    except OSError:
+        return None
+    import json
+    import socket
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        try:
+            connection.connect(socket_path)
+            if not peer_is_the_user(connection):
+                return None
+        except OSError:
+            return None
+        stdin_contents = None
+        if STDIN_ARGUMENT in arguments:
+            stdin_contents = sys.stdin.read()
+        request = {"arguments": arguments,
+                   "cwd": os.getcwd(),
+                   "environment": forwarded_environment(),
+                   "stdin": stdin_contents}
+        output_receiver = _OutputReceiver()
+        try:
+            send_file_descriptors(connection)
+            send_frame(connection,
+                       FRAME_REQUEST,
+                       json.dumps(request).encode(ENCODING, ENCODING_ERRORS))
+            return output_receiver.receive(connection)
+        except _StdoutClosed:
+            # Closing the connection makes the daemon stop the execution.
+            discard_further_output_on_stdout()
+            return EXIT_STDOUT_CLOSED
+        except (OSError, ProtocolError, ValueError) as ex:
+            if stdin_contents is None and not output_receiver.has_received_output:
+                return None
+            sys.stderr.write("filelist: lost connection to the daemon: " + str(ex) + os.linesep)
+            return EXIT_DAEMON_FAILURE
+    finally:
+        connection.close()
+
+
+class _OutputReceiver:
+    """Writes the output from the daemon to stdout and stderr."""
+
+    def __init__(self):
+        self.has_received_output = False
+        self._outputs = {FRAME_STDOUT: sys.stdout,
+                         FRAME_STDERR: sys.stderr}
+
+    def receive(self, connection: "socket.socket") -> int:
+        """
+        :return: The exit code.
+        """
+        while True:
+            frame_type, data = receive_frame(connection)
+            if frame_type == FRAME_EXIT_CODE:
+                return int(data)
+            o_stream = self._outputs.get(frame_type)
+            if o_stream is None:
+                raise ProtocolError("Unexpected frame from daemon: " + repr(frame_type))
+            self.has_received_output = True
+            try:
+                o_stream.flush()
+                o_stream.buffer.write(data)
+                o_stream.buffer.flush()
+            except BrokenPipeError:
+                if frame_type != FRAME_STDOUT:
+                    raise
+                raise _StdoutClosed()
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 
+from . import daemon_client
 from . import program_info
 
 
@@ -15,16 +16,18 @@ from . import program_info
 ###############################################################################
 
 
+import array
+import collections
 import copy
+import functools
+import itertools
 import sys
 import os
 import argparse
 import re
-import textwrap
 import fnmatch
 import stat
-import subprocess
-import shlex
+import time
 
 
 ###############################################################################
@@ -61,6 +64,18 @@ def write_lines(o_stream, lines):
         o_stream.write(os.linesep)
 
 
+class ExecutionException(Exception):
+    """
+    Base class for errors that makes the execution of the program fail.
+
+    Sub classes must implement render.
+    """
+
+    def render(self, o_stream):
+        """Writes an error message to the given stream."""
+        raise NotImplementedError()
+
+
 ###############################################################################
 # - constants -
 ###############################################################################
@@ -140,6 +155,24 @@ def parse_tags_list(string: str) -> list:
                        re.split(r"[\s,]+", string)))
 
 
+# Characters that shlex treats specially - quotes, escapes, and white-space
+# that str.split splits on, but shlex does not.
+_ARGUMENTS_THAT_REQUIRE_SHLEX = re.compile(r"[\"'\\]|[^\S \t\r\n]")
+
+
+def split_arguments(arguments: str) -> list:
+    """
+    Splits a string into arguments using shell-style syntax (as shlex.split).
+
+    Strings without quotes and escapes, which are the most common ones,
+    are split without the (comparatively slow) shlex module.
+    """
+    if _ARGUMENTS_THAT_REQUIRE_SHLEX.search(arguments) is None:
+        return arguments.split()
+    import shlex
+    return shlex.split(arguments)
+
+
 ###############################################################################
 # - argparse -
 ###############################################################################
@@ -176,6 +209,89 @@ def raise_exception_instead_of_exiting_on_error(parser: argparse.ArgumentParser,
         argparse.ArgumentParser.error = original_error_handler
 
 
+class SimpleArgumentParser:
+    """
+    A fast parser of the most common forms of arguments that an
+    argparse.ArgumentParser parses.
+
+    Handles
+     - flags (action "store_const" with const True, and default False),
+     - options with one argument, who's values are appended to a list
+       (nargs 1, action "append", and default []),
+     - a single sequence of positional arguments (nargs 1 or "*").
+
+    All other forms (abbreviated or combined options, "--", option arguments
+    that looks like options, ...) and errors are left to the argparse parser,
+    which gives the help texts and the error messages.
+
+    The result is the same as that of the argparse parser.
+    """
+
+    def __init__(self,
+                 flags: dict,
+                 options_with_argument: dict,
+                 positionals_dest: str,
+                 min_num_positionals: int,
+                 max_num_positionals: int):
+        """
+        :param flags: OPTION-STRING -> DEST
+        :param options_with_argument: OPTION-STRING -> (DEST, type (or None))
+        :param positionals_dest: None if there are no positional arguments.
+        :param max_num_positionals: None if there is no maximum number.
+        """
+        self._flags = flags
+        self._options_with_argument = options_with_argument
+        self._positionals_dest = positionals_dest
+        self._min_num_positionals = min_num_positionals
+        self._max_num_positionals = max_num_positionals
+
+    def parse(self, arguments: list) -> argparse.Namespace:
+        """
+        :return: None if the arguments must be parsed by the argparse parser.
+        """
+        values = {}
+        for dest in self._flags.values():
+            values[dest] = False
+        for dest, _ in self._options_with_argument.values():
+            values[dest] = []
+        positionals = []
+        positionals_have_ended = False
+        num_arguments = len(arguments)
+        i = 0
+        while i < num_arguments:
+            argument = arguments[i]
+            if argument.startswith("-"):
+                if positionals:
+                    positionals_have_ended = True
+                dest = self._flags.get(argument)
+                if dest is not None:
+                    values[dest] = True
+                else:
+                    option = self._options_with_argument.get(argument)
+                    if option is None or i + 1 == num_arguments or arguments[i + 1].startswith("-"):
+                        return None
+                    dest, value_type = option
+                    i += 1
+                    value = arguments[i]
+                    values[dest].append([value if value_type is None else value_type(value)])
+            elif positionals_have_ended:
+                return None
+            else:
+                positionals.append(argument)
+            i += 1
+        if self._positionals_dest is None:
+            if positionals:
+                return None
+        else:
+            num_positionals = len(positionals)
+            if num_positionals < self._min_num_positionals:
+                return None
+            if self._max_num_positionals is not None and num_positionals > self._max_num_positionals:
+                return None
+            values[self._positionals_dest] = positionals
+        return argparse.Namespace(**values)
+
+
 ###############################################################################
 # - file positions -
 ###############################################################################
@@ -245,6 +361,179 @@ class SourceReference:
         return self.includes.new_include(self.source_line)
 
 
+###############################################################################
+# - observers -
+###############################################################################
+
+
+class Observer:
+    """
+    Is informed about what the program does, and how long it takes.
+
+    Makes it possible for applications that embed this library to collect
+    metrics. An Observer is given to Command.execute.
+
+    Each method corresponds to an event. The default implementations do nothing.
+
+    Times are in seconds, as given by time.perf_counter.
+    """
+
+    def list_file_parsed(self,
+                         file_name: str,
+                         includes: IncludeFileChain,
+                         start_time: float,
+                         duration: float):
+        """
+        A list-file has been parsed (including reading and pre-processing it).
+
+        :param includes: The chain of inclusions that lead to the file.
+        Empty for a file argument.
+        """
+        pass
+
+    def list_file_used(self,
+                       file_name: str):
+        """
+        A list-file is used - it is either parsed, or taken from the cache of parsed list-files.
+
+        Not informed about stdin.
+        """
+        pass
+
+    def file_argument_processed(self,
+                                file_name: str,
+                                start_time: float,
+                                duration: float):
+        """A list-file given on the command line has been completely processed."""
+        pass
+
+    def instruction_evaluated(self,
+                              processor,
+                              start_time: float,
+                              duration: float):
+        """
+        The ResultItem:s of an instruction (or file-path) have been produced.
+
+        The duration includes the time spent by the consumer of the ResultItem:s,
+        since they are produced lazily. For an include instruction, it includes
+        the evaluation of all instructions in the included file.
+
+        :param processor: The Processor of the instruction.
+        Its location is processor.source.
+        """
+        pass
+
+    def directory_listed(self,
+                         source: SourceReference,
+                         directory_path: str,
+                         num_entries: int,
+                         start_time: float,
+                         duration: float):
+        """The contents of a directory has been read, by a LIST or FIND instruction."""
+        pass
+
+    def path_checked(self,
+                     source: SourceReference,
+                     path: str,
+                     exists: bool,
+                     start_time: float,
+                     duration: float):
+        """The existence of a file-path has been checked."""
+        pass
+
+    def item_emitted(self,
+                     result_item,
+                     rendition: str):
+        """A ResultItem has been rendered for output."""
+        pass
+
+    def subprocess_finished(self,
+                            source_or_none: SourceReference,
+                            command_line: str,
+                            exit_code: int,
+                            start_time: float,
+                            duration: float):
+        """
+        A shell command or preprocessor has finished.
+
+        :param source_or_none: The instruction that executed the command,
+        or None for a preprocessor.
+        """
+        pass
+
+
+class ObserverForMultipleObservers(Observer):
+    """Informs each of a list of Observer:s."""
+
+    def __init__(self,
+                 observers: list):
+        self._observers = observers
+
+    def list_file_parsed(self, file_name, includes, start_time, duration):
+        for observer in self._observers:
+            observer.list_file_parsed(file_name, includes, start_time, duration)
+
+    def list_file_used(self, file_name):
+        for observer in self._observers:
+            observer.list_file_used(file_name)
+
+    def file_argument_processed(self, file_name, start_time, duration):
+        for observer in self._observers:
+            observer.file_argument_processed(file_name, start_time, duration)
+
+    def instruction_evaluated(self, processor, start_time, duration):
+        for observer in self._observers:
+            observer.instruction_evaluated(processor, start_time, duration)
+
+    def directory_listed(self, source, directory_path, num_entries, start_time, duration):
+        for observer in self._observers:
+            observer.directory_listed(source, directory_path, num_entries, start_time, duration)
+
+    def path_checked(self, source, path, exists, start_time, duration):
+        for observer in self._observers:
+            observer.path_checked(source, path, exists, start_time, duration)
+
+    def item_emitted(self, result_item, rendition):
+        for observer in self._observers:
+            observer.item_emitted(result_item, rendition)
+
+    def subprocess_finished(self, source_or_none, command_line, exit_code, start_time, duration):
+        for observer in self._observers:
+            observer.subprocess_finished(source_or_none, command_line, exit_code, start_time, duration)
+
+
+class IteratorInformingObserverOfEvaluation:
+    """
+    Gives the elements of the iterator of an instruction, and informs an Observer
+    when it is exhausted, or fails.
+    """
+    def __init__(self,
+                 observer: Observer,
+                 processor,
+                 start_time: float,
+                 iterator: iter):
+        self._observer = observer
+        self._processor = processor
+        self._start_time = start_time
+        self._iterator = iterator
+        self._is_exhausted = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._is_exhausted:
+            raise StopIteration
+        try:
+            return self._iterator.__next__()
+        except BaseException:
+            self._is_exhausted = True
+            self._observer.instruction_evaluated(self._processor,
+                                                 self._start_time,
+                                                 time.perf_counter() - self._start_time)
+            raise
+
+
 ###############################################################################
 # - classes -
 ###############################################################################
@@ -347,6 +636,25 @@ class FileReferenceEnvironment:
         else:
             return self.fromTopLevelFile + file_name
 
+    def file_names_relative_current_dir_of_process(self,
+                                                   file_names: list) -> list:
+        """file_name_relative_current_dir_of_process of each file name."""
+        return self._file_names_with_prefix(self.fromCurrDir, file_names)
+
+    def file_names_relative_top_level_source_file(self,
+                                                  file_names: list) -> list:
+        """file_name_relative_top_level_source_file of each file name."""
+        return self._file_names_with_prefix(self.fromTopLevelFile, file_names)
+
+    @staticmethod
+    def _file_names_with_prefix(prefix: str,
+                                file_names: list) -> list:
+        if not prefix:
+            return file_names
+        isabs = os.path.isabs
+        return [file_name if isabs(file_name) else prefix + file_name
+                for file_name in file_names]
+
     def _new_for_appended_dir(self,
                               dir_delta: str):
         if dir_delta[-1] != os.path.sep:
@@ -538,6 +846,9 @@ class TagsRenditionSettings:
     def is_prepend(self) -> bool:
         return self._is_prepend
 
+    def is_append(self) -> bool:
+        return self._is_append
+
     def tags_and_path_separator(self) -> str:
         return self.DEFAULT_TAGS_AND_PATH_SEPARATOR
 
@@ -549,6 +860,20 @@ class TagsRenditionSettings:
         return self._concatenate(self._render_tags_string(tags),
                                  path)
 
+    def render_paths(self,
+                     tags: frozenset,
+                     paths: list) -> list:
+        """render_path of each path - with the same tags."""
+        if not self.is_output_tags():
+            return paths
+        tags_string = self._render_tags_string(tags)
+        separator = self.tags_and_path_separator()
+        if self._is_prepend:
+            paths = [tags_string + separator + path for path in paths]
+        if self._is_append:
+            paths = [path + separator + tags_string for path in paths]
+        return paths
+
     def render_print_tags(self,
                           tags: frozenset):
         return self._render_tags_string(tags)
@@ -629,15 +954,16 @@ class RenditionEnvironment(ResultItemsConstructionEnvironment):
     def render_file_path(self,
                          file_name: str,
                          tags: frozenset) -> str:
-        path = self._render_file_name_according_to_settings(file_name)
+        path = self.render_file_name(file_name)
         tags_settings = self.rendition_settings.tags_settings
         if tags_settings.is_output_tags():
             return tags_settings.render_path(tags, path)
         else:
             return path
 
-    def _render_file_name_according_to_settings(self,
-                                                file_name: str) -> str:
+    def render_file_name(self,
+                         file_name: str) -> str:
+        """The file name, rendered according to the settings - without tags."""
         if self.rendition_settings.file_names_are_relative_file_argument_location:
             ret_val = self.file_ref_env.file_name_relative_top_level_source_file(file_name)
         else:
@@ -648,6 +974,20 @@ class RenditionEnvironment(ResultItemsConstructionEnvironment):
             ret_val = os.path.abspath(ret_val)
         return ret_val
 
+    def render_file_paths(self,
+                          file_names: list,
+                          tags: frozenset) -> list:
+        """render_file_path of each file name - with the same tags."""
+        if self.rendition_settings.file_names_are_relative_file_argument_location:
+            paths = self.file_ref_env.file_names_relative_top_level_source_file(file_names)
+        else:
+            paths = self.file_ref_env.file_names_relative_current_dir_of_process(file_names)
+        if self.rendition_settings.normalize_paths:
+            paths = list(map(os.path.normpath, paths))
+        if self.rendition_settings.absolute_paths:
+            paths = list(map(os.path.abspath, paths))
+        return self.rendition_settings.tags_settings.render_paths(tags, paths)
+
 
 class ResultItem:
     """
@@ -693,16 +1033,74 @@ class ParsingSettings:
     def __init__(self,
                  preprocessor_shell_command_or_none: str,
                  line_parsers: list,
-                 instruction_parsers_dict: dict):
+                 instruction_parsers_dict: dict,
+                 observer: Observer = None,
+                 list_file_cache=None,
+                 directory_listing_cache=None,
+                 file_system=None,
+                 result_item_batches: bool = False):
         """
         :param line_parsers: List of LineParser.
 
         :param instruction_parsers_dict: Maps instruction identifiers to
          parsers: str -> InstructionArgumentParser.
+
+        :param observer: None if no one observes the execution.
+        (The observation has no cost in this case.)
+
+        :param list_file_cache: None, or a ListFileCache that holds parsed list-files.
+
+        :param directory_listing_cache: None, or a DirectoryListingCache that holds
+        the contents of directories.
+
+        :param file_system: None, or a FileSystem that answers questions about files
+        and directories, instead of the operating system.
+        (Directories are listed by the directory_listing_cache, if there is one.)
+
+        :param result_item_batches: Tells if instructions may give the paths of many files
+        as a single ResultItemForFilePaths - for consumers that output the rendition of
+        each item as a whole.
+
+        The construct_... attributes tell which kinds of ResultItem:s instructions construct
+        (see new_constructing_only_output_of) - all kinds, by default.
         """
         self.preprocessor_shell_command_or_none = preprocessor_shell_command_or_none
         self.line_parsers = line_parsers
         self.instruction_parsers_dict = instruction_parsers_dict
+        self.observer = observer
+        self.list_file_cache = list_file_cache
+        self.directory_listing_cache = directory_listing_cache
+        self.file_system = FILE_SYSTEM_OF_OPERATING_SYSTEM if file_system is None else file_system
+        self.result_item_batches = result_item_batches
+        self.construct_existing_file_paths = True
+        self.construct_non_existing_file_paths = True
+        self.construct_other_than_file_paths = True
+
+    def new_with_observer(self,
+                          observer: Observer):
+        ret_val = copy.copy(self)
+        ret_val.observer = observer
+        return ret_val
+
+    def new_with_result_item_batches(self):
+        if self.result_item_batches:
+            return self
+        ret_val = copy.copy(self)
+        ret_val.result_item_batches = True
+        return ret_val
+
+    def new_constructing_only_output_of(self,
+                                        rendition_settings: RenditionSettings):
+        """
+        Gives settings with which instructions do not construct the ResultItem:s
+        that would not be output (according to ResultItem.include_in_output) -
+        for consumers that skip such items.
+        """
+        ret_val = copy.copy(self)
+        ret_val.construct_existing_file_paths = rendition_settings.include_existing_in_output
+        ret_val.construct_non_existing_file_paths = rendition_settings.include_non_existing_files
+        ret_val.construct_other_than_file_paths = not rendition_settings.suppress_non_path_output
+        return ret_val
 
     def parser_for_instruction(self,
                                identifier: str):
@@ -744,9 +1142,9 @@ class ResultItemForPrint(ResultItemForOtherThanFilePath):
         return self._string
 
 
-class ResultItemForFilePathExisting(ResultItem):
+class ResultItemForFilePath(ResultItem):
     """
-    An result item that is a file-path who's corresponding file exists.
+    An result item that is a file-path.
     """
     def __init__(self,
                  file_name: str,
@@ -758,36 +1156,74 @@ class ResultItemForFilePathExisting(ResultItem):
         self.file_name = file_name
         self.tags = tags
 
-    def include_in_output(self, env: RenditionEnvironment) -> bool:
-        return env.rendition_settings.include_existing_in_output
-
     def rendition(self,
                   env: RenditionEnvironment) -> str:
         return env.render_file_path(self.file_name,
                                     self.tags)
 
 
-class ResultItemForFilePathNonExisting(ResultItem):
+class ResultItemForFilePathExisting(ResultItemForFilePath):
+    """
+    An result item that is a file-path who's corresponding file exists.
+    """
+
+    def include_in_output(self, env: RenditionEnvironment) -> bool:
+        return env.rendition_settings.include_existing_in_output
+
+
+class ResultItemForFilePathNonExisting(ResultItemForFilePath):
     """
     An result item that is a file-path who's corresponding file does not exists.
     """
+
+    def include_in_output(self, env: RenditionEnvironment) -> bool:
+        return env.rendition_settings.include_non_existing_files
+
+
+class ResultItemForFilePaths(ResultItem):
+    """
+    A batch of result items that are file-paths with the same tags, and who's
+    files all exist, or all do not exist.
+
+    The rendition is the lines of the file-paths.
+    The batch is given only if ParsingSettings.result_item_batches is set.
+    """
+
+    # The maximum number of file-paths of a batch constructed from the file-paths of
+    # instructions (so that evaluation and output are interleaved).
+    MAX_NUM_FILE_PATHS = 1000
+
     def __init__(self,
-                 file_name: str,
+                 file_names: list,
                  tags: frozenset):
         """
-        file_name : the name of the file as specified in the source file -
-        i.e. it is relative the source file.
+        :param file_names: The names of the files - as file_name of ResultItemForFilePath.
         """
-        self.file_name = file_name
+        self.file_names = file_names
         self.tags = tags
 
-    def include_in_output(self, env: RenditionEnvironment) -> bool:
-        return env.rendition_settings.include_non_existing_files
-
     def rendition(self,
                   env: RenditionEnvironment) -> str:
-        return env.render_file_path(self.file_name,
-                                    self.tags)
+        return "\n".join(env.render_file_paths(self.file_names,
+                                               self.tags))
+
+
+class ResultItemForFilePathsExisting(ResultItemForFilePaths):
+    """
+    A batch of file-paths who's corresponding files exist.
+    """
+
+    def include_in_output(self, env: RenditionEnvironment) -> bool:
+        return env.rendition_settings.include_existing_in_output
+
+
+class ResultItemForFilePathsNonExisting(ResultItemForFilePaths):
+    """
+    A batch of file-paths who's corresponding files do not exist.
+    """
+
+    def include_in_output(self, env: RenditionEnvironment) -> bool:
+        return env.rendition_settings.include_non_existing_files
 
 
 ###############################################################################
@@ -810,7 +1246,7 @@ class WithSourceReferenceMixin:
             o_stream.write(os.linesep * 2)
 
 
-class ResultItemConstructionExceptionBase(WithSourceReferenceMixin, Exception):
+class ResultItemConstructionExceptionBase(WithSourceReferenceMixin, ExecutionException):
     """
     Base class for exceptions that indicates failure of an instruction
     to produce one of its ResultItem:s.
@@ -877,6 +1313,14 @@ class ProcessorForListFile(Processor):
     def processors(self) -> list:
         return self._processors
 
+    def may_execute_commands(self) -> bool:
+        """
+        Tells if the evaluation of the file may execute commands (that may create or
+        modify files): if it has a SHELL instruction, or includes other files.
+        """
+        return any(isinstance(processor, (ProcessorForShell, ProcessorForInclude))
+                   for processor in self._processors)
+
     def result_item_iterable(self,
                              parsing_settings: ParsingSettings,
                              env: ResultItemsConstructionEnvironment):
@@ -886,6 +1330,13 @@ class ProcessorForListFile(Processor):
 
 
 class ResultItemIterableForFile:
+    """
+    The ResultItem:s of the instructions of a list-file.
+
+    Unless list-files are cached (and thus may be evaluated more than once),
+    evaluated instructions are released from the list, so that the memory
+    they use can be reclaimed during the rest of the evaluation.
+    """
     def __init__(self,
                  parsing_settings: ParsingSettings,
                  instructions: list,
@@ -894,6 +1345,8 @@ class ResultItemIterableForFile:
         self.parsing_settings = parsing_settings
         self.env = env
         self.curr_result_item_iterable = None
+        self._next_instruction_index = 0
+        self._release_evaluated_instructions = parsing_settings.list_file_cache is None
 
     def __iter__(self):
         return self
@@ -901,16 +1354,43 @@ class ResultItemIterableForFile:
     def __next__(self):
         while True:
             if self.curr_result_item_iterable is None:
-                if not self.instructions:
-                    raise StopIteration
-                instruction = self.instructions.pop(0)
-                self.curr_result_item_iterable = instruction.result_item_iterable(self.parsing_settings,
-                                                                                  self.env)
+                instruction = self._next_instruction()
+                if self.parsing_settings.observer is None:
+                    self.curr_result_item_iterable = instruction.result_item_iterable(self.parsing_settings,
+                                                                                      self.env)
+                else:
+                    self.curr_result_item_iterable = self._observed_result_item_iterable(instruction)
             try:
                 return self.curr_result_item_iterable.__next__()
             except StopIteration:
                 self.curr_result_item_iterable = None
 
+    def _next_instruction(self) -> Processor:
+        if self._next_instruction_index == len(self.instructions):
+            raise StopIteration
+        instruction = self.instructions[self._next_instruction_index]
+        if self._release_evaluated_instructions:
+            self.instructions[self._next_instruction_index] = None
+        self._next_instruction_index += 1
+        return instruction
+
+    def _observed_result_item_iterable(self,
+                                       instruction: Processor):
+        observer = self.parsing_settings.observer
+        start_time = time.perf_counter()
+        try:
+            iterator = instruction.result_item_iterable(self.parsing_settings,
+                                                        self.env)
+        except BaseException:
+            observer.instruction_evaluated(instruction,
+                                           start_time,
+                                           time.perf_counter() - start_time)
+            raise
+        return IteratorInformingObserverOfEvaluation(observer,
+                                                     instruction,
+                                                     start_time,
+                                                     iterator)
+
 
 ###############################################################################
 # - concrete instructions -
@@ -958,6 +1438,8 @@ class ProcessorForPrint(Processor):
     def result_item_iterable(self,
                              parsing_settings: ParsingSettings,
                              env: ResultItemsConstructionEnvironment):
+        if not parsing_settings.construct_other_than_file_paths:
+            return iter([])
         return iter([ResultItemForPrint(self._string)])
 
 
@@ -969,7 +1451,7 @@ class ProcessorForPrint(Processor):
 class ResultItemConstructionForShellException(ResultItemConstructionExceptionBase):
     def __init__(self,
                  source: SourceReference,
-                 called_process_error: subprocess.CalledProcessError):
+                 called_process_error: "subprocess.CalledProcessError"):
         ResultItemConstructionExceptionBase.__init__(self,
                                                      source,
                                                      EXIT_SHELL_COMMAND_EXECUTION_ERROR)
@@ -991,6 +1473,41 @@ class ResultItemConstructionForShellException(ResultItemConstructionExceptionBas
                         ])
 
 
+def check_output_of_shell_command(observer: Observer,
+                                  source_or_none: SourceReference,
+                                  command_line: str,
+                                  **kwargs) -> str:
+    """
+    Corresponds to subprocess.check_output, for a command line executed by the shell,
+    with output as text.
+
+    :param observer: None, or an Observer to inform about the execution.
+    :param source_or_none: The instruction that executes the command, or None
+    """
+    import subprocess
+    if observer is None:
+        return subprocess.check_output(command_line,
+                                       shell=True,
+                                       universal_newlines=True,
+                                       **kwargs)
+    start_time = time.perf_counter()
+    exit_code = 0
+    try:
+        return subprocess.check_output(command_line,
+                                       shell=True,
+                                       universal_newlines=True,
+                                       **kwargs)
+    except subprocess.CalledProcessError as ex:
+        exit_code = ex.returncode
+        raise
+    finally:
+        observer.subprocess_finished(source_or_none,
+                                     command_line,
+                                     exit_code,
+                                     start_time,
+                                     time.perf_counter() - start_time)
+
+
 class ProcessorForShell(Processor):
     """
     An instruction that executes a shell command and interprets it's output a file names.
@@ -1001,24 +1518,44 @@ class ProcessorForShell(Processor):
         Processor.__init__(self, source)
         self._command_line = command_line
 
+    def command_line(self) -> str:
+        return self._command_line
+
     def result_item_iterable(self, parsing_settings: ParsingSettings,
                              env: ResultItemsConstructionEnvironment):
+        import subprocess
         if not env.current_tags_satisfies_tags_filter():
             return iter([])
         try:
-            cwd = env.file_ref_env.fromCurrDir
-            if not cwd:
-                cwd = "."
-            output = subprocess.check_output(self._command_line,
-                                             shell=True,
-                                             cwd=cwd,
-                                             universal_newlines=True)
-            file_names = output.splitlines()
-            return ResultItemIteratorForFilesFromFilePaths(self.source,
-                                                           env,
-                                                           iter(file_names)).__iter__()
+            output = check_output_of_shell_command(parsing_settings.observer,
+                                                   self.source,
+                                                   self._command_line,
+                                                   cwd=self.working_directory(env))
         except subprocess.CalledProcessError as ex:
             raise ResultItemConstructionForShellException(self.source, ex)
+        finally:
+            parsing_settings.file_system.invalidate()
+        return self.result_item_iterable_for_output(parsing_settings, env, output)
+
+    @staticmethod
+    def working_directory(env: ResultItemsConstructionEnvironment) -> str:
+        """The directory in which the command is executed."""
+        cwd = env.file_ref_env.fromCurrDir
+        if not cwd:
+            cwd = "."
+        return cwd
+
+    def result_item_iterable_for_output(self,
+                                        parsing_settings: ParsingSettings,
+                                        env: ResultItemsConstructionEnvironment,
+                                        output: str):
+        """
+        :param output: The output of the successful execution of the command.
+        """
+        return new_result_item_iterator_for_files_from_file_paths(parsing_settings,
+                                                                  self.source,
+                                                                  env,
+                                                                  iter(output.splitlines()))
 
 
 ###############################################################################
@@ -1030,19 +1567,32 @@ class ResultItemIteratorForFilesFromFilePaths:
     """
     An iterator of ResultItemForFile, constructed from an iterable of file-names.
 
-    Produces elements only for the files that passes all file conditions: tags-filtering, existence.
+    Produces elements only for the files that passes all file conditions: tags-filtering, existence,
+    and only of the kinds that the parsing settings tells to construct.
 
     All files are expected to be referenced from the same list-file.
     All files are expected to be given the same tags.
     """
     def __init__(self,
-                 source: SourceReference,
+                 source_of_file,
                  env: ResultItemsConstructionEnvironment,
-                 file_names_rel_list_file: iter):
-        self._source = source
+                 file_names_rel_list_file: iter,
+                 parsing_settings: ParsingSettings):
+        """
+        :param source_of_file: Gives the SourceReference of a file, from its index in file_names_rel_list_file:
+        int -> SourceReference
+        :param parsing_settings: Gives the FileSystem that tells if files exist.
+        """
+        self._source_of_file = source_of_file
         self._env = env
-        self._file_names_rel_list_file = file_names_rel_list_file
+        self._file_names_rel_list_file = enumerate(file_names_rel_list_file)
         self._tags = env.tags().frozen_tags()
+        self._file_system = parsing_settings.file_system
+        self._construct_existing_file_paths = parsing_settings.construct_existing_file_paths
+        self._construct_non_existing_file_paths = parsing_settings.construct_non_existing_file_paths
+        dir_path = env.file_ref_env.fromCurrDir
+        exists_in_directory = self._file_system.exists_in_directory
+        self._file_exists = lambda file_index, file_name: exists_in_directory(dir_path, file_name)
 
     def __iter__(self):
         if not self._env.current_tags_satisfies_tags_filter():
@@ -1051,38 +1601,176 @@ class ResultItemIteratorForFilesFromFilePaths:
             return self
 
     def __next__(self):
-        file_name = self._file_names_rel_list_file.__next__()
-        file_path = self._env.file_ref_env.file_name_relative_current_dir_of_process(file_name)
-        path_exists = os.path.exists(file_path)
-        if path_exists:
-            return ResultItemForFilePathExisting(
-                self._env.file_ref_env.file_name_relative_top_level_source_file(file_name),
-                self._tags)
-        else:
-            if self._env.fail_on_non_existing_file:
-                raise ResultItemConstructionForMissingFileException(self._source, file_path)
-            else:
+        while True:
+            file_index, file_name = self._file_names_rel_list_file.__next__()
+            if self._file_exists(file_index, file_name):
+                if self._construct_existing_file_paths:
+                    return ResultItemForFilePathExisting(
+                        self._env.file_ref_env.file_name_relative_top_level_source_file(file_name),
+                        self._tags)
+            elif self._env.fail_on_non_existing_file:
+                raise ResultItemConstructionForMissingFileException(
+                    self._source_of_file(file_index),
+                    self._env.file_ref_env.file_name_relative_current_dir_of_process(file_name))
+            elif self._construct_non_existing_file_paths:
                 return ResultItemForFilePathNonExisting(
                     self._env.file_ref_env.file_name_relative_top_level_source_file(file_name),
                     self._tags)
 
 
-class ProcessorForFilePath(Processor):
+class ResultItemIteratorForFilesFromFilePathsInformingObserver(ResultItemIteratorForFilesFromFilePaths):
     """
-    An instruction that resolves a single named file.
+    A ResultItemIteratorForFilesFromFilePaths that informs an Observer
+    about each check of the existence of a file.
+    """
+    def __init__(self,
+                 source_of_file,
+                 env: ResultItemsConstructionEnvironment,
+                 file_names_rel_list_file: iter,
+                 parsing_settings: ParsingSettings):
+        ResultItemIteratorForFilesFromFilePaths.__init__(self,
+                                                         source_of_file,
+                                                         env,
+                                                         file_names_rel_list_file,
+                                                         parsing_settings)
+        self._observer = parsing_settings.observer
+        self._file_exists = self._observed_file_exists
+
+    def _observed_file_exists(self, file_index: int, file_name: str) -> bool:
+        start_time = time.perf_counter()
+        path_exists = self._file_system.exists_in_directory(self._env.file_ref_env.fromCurrDir, file_name)
+        self._observer.path_checked(self._source_of_file(file_index),
+                                    self._env.file_ref_env.file_name_relative_current_dir_of_process(file_name),
+                                    path_exists,
+                                    start_time,
+                                    time.perf_counter() - start_time)
+        return path_exists
+
+
+def result_item_batches_for_files_from_file_paths(source_of_file,
+                                                  env: ResultItemsConstructionEnvironment,
+                                                  file_names_rel_list_file: iter,
+                                                  parsing_settings: ParsingSettings):
+    """
+    Gives the ResultItem:s of a ResultItemIteratorForFilesFromFilePaths as
+    ResultItemForFilePaths - one for each run of consecutive files with the same existence.
+
+    :param source_of_file: See ResultItemIteratorForFilesFromFilePaths.
+    """
+    if not env.current_tags_satisfies_tags_filter():
+        return
+    tags = env.tags().frozen_tags()
+    file_ref_env = env.file_ref_env
+    dir_path = file_ref_env.fromCurrDir
+    exists_in_directory = parsing_settings.file_system.exists_in_directory
+    construct_existing_file_paths = parsing_settings.construct_existing_file_paths
+    construct_non_existing_file_paths = parsing_settings.construct_non_existing_file_paths
+    max_num_file_paths = ResultItemForFilePaths.MAX_NUM_FILE_PATHS
+    batch_class = ResultItemForFilePathsExisting
+    file_names = []
+    for file_index, file_name in enumerate(file_names_rel_list_file):
+        if exists_in_directory(dir_path, file_name):
+            if not construct_existing_file_paths:
+                continue
+            file_class = ResultItemForFilePathsExisting
+        else:
+            if env.fail_on_non_existing_file:
+                if file_names:
+                    yield batch_class(file_ref_env.file_names_relative_top_level_source_file(file_names), tags)
+                raise ResultItemConstructionForMissingFileException(
+                    source_of_file(file_index),
+                    file_ref_env.file_name_relative_current_dir_of_process(file_name))
+            if not construct_non_existing_file_paths:
+                continue
+            file_class = ResultItemForFilePathsNonExisting
+        if file_class is not batch_class or len(file_names) == max_num_file_paths:
+            if file_names:
+                yield batch_class(file_ref_env.file_names_relative_top_level_source_file(file_names), tags)
+                file_names = []
+            batch_class = file_class
+        file_names.append(file_name)
+    if file_names:
+        yield batch_class(file_ref_env.file_names_relative_top_level_source_file(file_names), tags)
+
+
+def new_result_item_iterator_for_files_from_file_paths(parsing_settings: ParsingSettings,
+                                                       source: SourceReference,
+                                                       env: ResultItemsConstructionEnvironment,
+                                                       file_names_rel_list_file: iter,
+                                                       source_of_file=None) -> iter:
+    """
+    Gives a ResultItemIteratorForFilesFromFilePaths that is ready for iteration
+    (or its batches, if the parsing settings allows it, and there is no Observer).
+
+    Observation is done only if there is an Observer, so that the common case is as fast as possible.
+
+    :param source: The source of all files, unless source_of_file is given.
+    :param source_of_file: None, or the source of each file (see ResultItemIteratorForFilesFromFilePaths).
+    """
+    if source_of_file is None:
+        source_of_file = lambda file_index: source
+    if parsing_settings.observer is None and parsing_settings.result_item_batches:
+        return result_item_batches_for_files_from_file_paths(source_of_file,
+                                                             env,
+                                                             file_names_rel_list_file,
+                                                             parsing_settings)
+    if parsing_settings.observer is None:
+        iterator = ResultItemIteratorForFilesFromFilePaths(source_of_file,
+                                                           env,
+                                                           file_names_rel_list_file,
+                                                           parsing_settings)
+    else:
+        iterator = ResultItemIteratorForFilesFromFilePathsInformingObserver(source_of_file,
+                                                                            env,
+                                                                            file_names_rel_list_file,
+                                                                            parsing_settings)
+    return iterator.__iter__()
+
+
+class ProcessorForFilePaths(Processor):
+    """
+    An instruction that resolves the named files of consecutive file-path lines.
+
+    The lines of a list-file (with many files) are held by a single instruction,
+    instead of one per line.
+    The source of the instruction is the first line.
+    The sources of the other lines are constructed when they are needed (e.g. for an error message).
     """
     def __init__(self,
                  source: SourceReference,
                  file_name: str):
         Processor.__init__(self, source)
-        self.file_name = file_name
+        self._file_names = [file_name]
+        self._line_numbers = array.array("L", [source.source_line.line.number])
+
+    def file_names(self) -> list:
+        return self._file_names
+
+    def add_file_path_line(self,
+                           file_name: str,
+                           line_number: int):
+        """
+        Adds a file-path line that follows the lines of the instruction.
+        """
+        self._file_names.append(file_name)
+        self._line_numbers.append(line_number)
+
+    def source_of_file(self, file_index: int) -> SourceReference:
+        if file_index == 0:
+            return self.source
+        return SourceReference(self.source.includes,
+                               SourceLineInFile(self.source.source_line.file_name,
+                                                SourceLine(self._line_numbers[file_index],
+                                                           self._file_names[file_index])))
 
     def result_item_iterable(self,
                              parsing_settings: ParsingSettings,
                              env: ResultItemsConstructionEnvironment):
-        return ResultItemIteratorForFilesFromFilePaths(self.source,
-                                                       env,
-                                                       iter([self.file_name])).__iter__()
+        return new_result_item_iterator_for_files_from_file_paths(parsing_settings,
+                                                                  self.source,
+                                                                  env,
+                                                                  iter(self._file_names),
+                                                                  self.source_of_file)
 
 
 ###############################################################################
@@ -1114,10 +1802,15 @@ class FileMatchInfo:
     def __init__(self,
                  path: str,
                  path_rel_dir_argument: str,
-                 base_name: str):
+                 base_name: str,
+                 entry_type: int = None):
+        """
+        :param entry_type: None, or the ENTRY_TYPE_... of the file, if it is known from the directory listing.
+        """
         self._path = path
         self._path_rel_dir_argument = path_rel_dir_argument
         self._base_name = base_name
+        self._entry_type = entry_type
         self._stat_result = None
 
     def path(self):
@@ -1132,6 +1825,12 @@ class FileMatchInfo:
             self._stat_result = os.stat(self.path())
         return self._stat_result
 
+    def file_type_mode(self) -> int:
+        """The file type bits of the mode of the file (following symbolic links)."""
+        if self._entry_type is not None:
+            return ENTRY_TYPE_MODES[self._entry_type]
+        return stat.S_IFMT(self.stat_result()[stat.ST_MODE])
+
 
 class ProcessorForFileSetBase(Processor):
     """
@@ -1148,20 +1847,46 @@ class ProcessorForFileSetBase(Processor):
                              parsing_settings: ParsingSettings,
                              env: ResultItemsConstructionEnvironment):
         dir_path = env.file_ref_env.file_name_relative_current_dir_of_process(self.settings.relative_directory_name)
-        if not os.path.isdir(dir_path):
+        if not parsing_settings.file_system.is_dir(dir_path):
             raise ResultItemConstructionForMissingFileException(self.source, dir_path)
-        if not env.current_tags_satisfies_tags_filter():
+        if not env.current_tags_satisfies_tags_filter() or not parsing_settings.construct_existing_file_paths:
             return iter([])
         self.env_for_dir = env.new_for_directory(self.settings.relative_directory_name)
+        file_base_names, entry_types = self._list_directory(parsing_settings, dir_path)
         if self.settings.sort:
-            return self._sorted_iterable(dir_path, env)
+            return self._sorted_iterable(parsing_settings, file_base_names, entry_types, env)
+        else:
+            return self._unsorted_iterable(parsing_settings, file_base_names, entry_types, env)
+
+    def _list_directory(self,
+                        parsing_settings: ParsingSettings,
+                        dir_path: str) -> tuple:
+        """
+        :return: See list_directory
+        """
+        if parsing_settings.directory_listing_cache is None:
+            list_directory_function = parsing_settings.file_system.list_directory
         else:
-            return self._unsorted_iterable(dir_path, env)
+            list_directory_function = parsing_settings.directory_listing_cache.list_directory
+        observer = parsing_settings.observer
+        if observer is None:
+            return list_directory_function(dir_path)
+        start_time = time.perf_counter()
+        listing = list_directory_function(dir_path)
+        observer.directory_listed(self.source,
+                                  dir_path,
+                                  len(listing[0]),
+                                  start_time,
+                                  time.perf_counter() - start_time)
+        return listing
 
     def _sorted_iterable(self,
-                         dir_path: str,
+                         parsing_settings: ParsingSettings,
+                         file_base_names: list,
+                         entry_types: bytes,
                          env: ResultItemsConstructionEnvironment) -> iter:
-        all_files = [self._new_file_match_info(file_name) for file_name in os.listdir(dir_path)]
+        all_files = [self._new_file_match_info(file_name, entry_type)
+                     for file_name, entry_type in zip(file_base_names, entry_types)]
         matching_base_names = list(map(FileMatchInfo.base_name,
                                    filter(self.settings.file_matcher,
                                           all_files)))
@@ -1169,19 +1894,43 @@ class ProcessorForFileSetBase(Processor):
         # Sorting here lets us sort on base_name, which is faster than sorting on
         # the complete result file name.
         matching_base_names.sort()
-        file_paths = [self._new_file_result(base_name, env)
-                      for base_name in matching_base_names]
-        return iter(file_paths)
+        return self._file_results(parsing_settings, matching_base_names, env)
 
     def _unsorted_iterable(self,
-                           dir_path: str,
+                           parsing_settings: ParsingSettings,
+                           file_base_names: list,
+                           entry_types: bytes,
                            env: ResultItemsConstructionEnvironment) -> iter:
-        for file_base_name in os.listdir(dir_path):
-            if not self.settings.file_matcher(self._new_file_match_info(file_base_name)):
-                continue
-            yield self._new_file_result(file_base_name, env)
+        matching_base_names = (file_base_name
+                               for file_base_name, entry_type in zip(file_base_names, entry_types)
+                               if self.settings.file_matcher(self._new_file_match_info(file_base_name,
+                                                                                       entry_type)))
+        return self._file_results(parsing_settings, matching_base_names, env)
 
-    def _new_file_match_info(self, base_name: str) -> FileMatchInfo:
+    def _file_results(self,
+                      parsing_settings: ParsingSettings,
+                      matching_base_names: iter,
+                      env: ResultItemsConstructionEnvironment) -> iter:
+        if parsing_settings.result_item_batches:
+            return self._file_result_batches(iter(matching_base_names), env)
+        return (self._new_file_result(base_name, env)
+                for base_name in matching_base_names)
+
+    def _file_result_batches(self,
+                             matching_base_names: iter,
+                             env: ResultItemsConstructionEnvironment):
+        file_ref_env = self.env_for_dir.file_ref_env
+        tags = env.tags().frozen_tags()
+        while True:
+            base_names = list(itertools.islice(matching_base_names, ResultItemForFilePaths.MAX_NUM_FILE_PATHS))
+            if not base_names:
+                return
+            yield ResultItemForFilePathsExisting(file_ref_env.file_names_relative_top_level_source_file(base_names),
+                                                 tags)
+
+    def _new_file_match_info(self,
+                             base_name: str,
+                             entry_type: int) -> FileMatchInfo:
         raise NotImplementedError()
 
     def _new_file_result(self,
@@ -1217,9 +1966,12 @@ class ProcessorForDirectoryListing(ProcessorForFileSetBase):
         ProcessorForFileSetBase.__init__(self, source, settings)
 
     def _sorted_iterable(self,
-                         dir_path: str,
+                         parsing_settings: ParsingSettings,
+                         file_base_names: list,
+                         entry_types: bytes,
                          env: ResultItemsConstructionEnvironment) -> iter:
-        all_files = [self._new_file_match_info(file_name) for file_name in os.listdir(dir_path)]
+        all_files = [self._new_file_match_info(file_name, entry_type)
+                     for file_name, entry_type in zip(file_base_names, entry_types)]
         matching_base_names = list(map(FileMatchInfo.base_name,
                                    filter(self.settings.file_matcher,
                                           all_files)))
@@ -1227,22 +1979,26 @@ class ProcessorForDirectoryListing(ProcessorForFileSetBase):
         # Sorting here lets us sort on base_name, which is faster than sorting on
         # the complete result file name.
         matching_base_names.sort()
-        file_paths = [self._new_file_result(base_name, env)
-                      for base_name in matching_base_names]
-        return iter(file_paths)
+        return self._file_results(parsing_settings, matching_base_names, env)
 
     def _unsorted_iterable(self,
-                           dir_path: str,
+                           parsing_settings: ParsingSettings,
+                           file_base_names: list,
+                           entry_types: bytes,
                            env: ResultItemsConstructionEnvironment) -> iter:
-        for file_base_name in os.listdir(dir_path):
-            if not self.settings.file_matcher(self._new_file_match_info(file_base_name)):
-                continue
-            yield self._new_file_result(file_base_name, env)
-
-    def _new_file_match_info(self, base_name: str) -> FileMatchInfo:
+        matching_base_names = (file_base_name
+                               for file_base_name, entry_type in zip(file_base_names, entry_types)
+                               if self.settings.file_matcher(self._new_file_match_info(file_base_name,
+                                                                                       entry_type)))
+        return self._file_results(parsing_settings, matching_base_names, env)
+
+    def _new_file_match_info(self,
+                             base_name: str,
+                             entry_type: int) -> FileMatchInfo:
         return FileMatchInfo(self.env_for_dir.file_ref_env.file_name_relative_current_dir_of_process(base_name),
                              base_name,
-                             base_name)
+                             base_name,
+                             entry_type)
 
     def _new_file_result(self,
                          base_name: str,
@@ -1270,8 +2026,6 @@ class ProcessorForInclude(Processor):
         self._file_name_relative_including_file = file_name_relative_include_file
         self._preserve_current_directory = preserve_current_directory
         self._tag_include_settings = tag_include_settings
-        self._env_for_file = None
-        self._file_processor = None
 
     def result_item_iterable(self,
                              parsing_settings: ParsingSettings,
@@ -1280,6 +2034,15 @@ class ProcessorForInclude(Processor):
         return file_processor.result_item_iterable(parsing_settings,
                                                    env)
 
+    def file_name_relative_including_file(self) -> str:
+        return self._file_name_relative_including_file
+
+    def imports_tags(self) -> bool:
+        """
+        Tells if the evaluation of the included file may modify the tags of the including file.
+        """
+        return self._tag_include_settings.do_import
+
     def file_processor_if_this_is_a_processor_for_include(self,
                                                           parsing_settings: ParsingSettings,
                                                           env: ResultItemsConstructionEnvironment):
@@ -1288,31 +2051,48 @@ class ProcessorForInclude(Processor):
     def _get_file_processor_and_env(self,
                                     parsing_settings: ParsingSettings,
                                     current_env: ResultItemsConstructionEnvironment) -> tuple:
-        if self._file_processor is None:
-            self._set_file_processor_and_env(parsing_settings, current_env)
-        return self._file_processor, self._env_for_file
-
-    def _set_file_processor_and_env(self,
-                                    parsing_settings: ParsingSettings,
-                                    current_env: ResultItemsConstructionEnvironment):
         """
-        Sets self._file_processor, self._env_for_file.
+        Parses the included file (unless it is cached), and gives the environment for it.
+
+        The parsed file is not stored in this object, so that the memory it uses
+        can be released as soon as it has been evaluated.
 
         Raises an exception if the file cannot be accessed correctly.
         """
-        self._env_for_file = current_env.new_for_included_file(self._file_name_relative_including_file,
-                                                               self._preserve_current_directory,
-                                                               self._tag_include_settings)
-        file_path = current_env.file_ref_env.file_name_relative_current_dir_of_process(
-            self._file_name_relative_including_file)
-        if not os.path.isfile(file_path):
-            raise ResultItemConstructionForMissingFileException(self.source, file_path)
-        file_parser = ListFileParser(parsing_settings,
-                                     self.source.as_include_file_chain(),
+        env_for_file = self.env_for_included_file(current_env)
+        return self.parsed_included_file(parsing_settings, current_env), env_for_file
+
+    def env_for_included_file(self,
+                              current_env: ResultItemsConstructionEnvironment) -> ResultItemsConstructionEnvironment:
+        """
+        Gives the environment for the included file.
+
+        Depending on how tags are exported and imported, this may modify the tags of current_env.
+        """
+        return current_env.new_for_included_file(self._file_name_relative_including_file,
+                                                 self._preserve_current_directory,
+                                                 self._tag_include_settings)
+
+    def parsed_included_file(self,
+                             parsing_settings: ParsingSettings,
+                             current_env: ResultItemsConstructionEnvironment) -> ProcessorForListFile:
+        """
+        Parses the included file (unless it is cached).
+
+        Depends only on the directory of current_env - not on its tags.
+
+        Raises an exception if the file cannot be accessed correctly.
+        """
+        file_path = current_env.file_ref_env.file_name_relative_current_dir_of_process(
+            self._file_name_relative_including_file)
+        if not parsing_settings.file_system.is_file(file_path):
+            raise ResultItemConstructionForMissingFileException(self.source, file_path)
+        file_parser = ListFileParser(parsing_settings,
+                                     self.source.as_include_file_chain(),
                                      self._file_name_relative_including_file,
                                      file_path)
         lines_source = LinesSourceForIncludedFile(parsing_settings, file_path, self.source)
-        self._file_processor = file_parser.apply(lines_source)
+        return parsed_list_file(parsing_settings, file_parser, lines_source, file_path)
 
 
 ###############################################################################
@@ -1320,7 +2100,7 @@ class ProcessorForInclude(Processor):
 ###############################################################################
 
 
-class InstructionSyntaxErrorException(WithSourceReferenceMixin, Exception):
+class InstructionSyntaxErrorException(WithSourceReferenceMixin, ExecutionException):
     """A syntactic error in an instruction of a source file."""
     def __init__(self,
                  source: SourceReference,
@@ -1405,17 +2185,68 @@ class InstructionArgumentParser:
 
 
 class InstructionWithArgparseArgumentParser(InstructionArgumentParser):
-    """Argument parser for instructions that uses argparse for parsing the arguments."""
+    """
+    Argument parser for instructions that uses argparse for parsing the arguments.
+
+    The argparse parser is constructed when it is first used,
+    since constructing the parsers of all instructions is a noticeable
+    part of the start up time of the program.
+
+    The most common forms of arguments are parsed by a SimpleArgumentParser,
+    if the sub class gives one, and argparse is only used for other forms.
+
+    The results of parsing are memoized by the argument string, since
+    large list-files tend to contain many identical instructions.
+    The result of _parse_argument must not be modified by its users.
+
+    Sub classes must implement _construct_argparser and _parse_argument.
+    """
+
+    MAX_NUM_MEMOIZED_ARGUMENTS = 10000
 
     def __init__(self,
-                 instruction_name: str):
+                 instruction_name: str,
+                 simple_parser: SimpleArgumentParser = None):
         self.instruction_name = instruction_name
+        self._simple_parser = simple_parser
+        self._parser = None
+        self._parsed_arguments = {}
 
     def arg_parser(self) -> argparse.ArgumentParser:
+        if self._parser is None:
+            self._parser = self._construct_argparser(self.instruction_name)
+        return self._parser
+
+    def _construct_argparser(self, instruction_name_for_help_text: str) -> argparse.ArgumentParser:
+        raise NotImplementedError()
+
+    def _parse_argument(self,
+                        instruction_argument: str):
+        """
+        Parses the argument-part of an instruction.
+
+        Raises InstructionArgumentParserSyntaxErrorException in case of parsing error.
+        """
         raise NotImplementedError()
 
+    def _parse_argument_memoized(self,
+                                 instruction_argument: str):
+        try:
+            return self._parsed_arguments[instruction_argument]
+        except KeyError:
+            pass
+        ret_val = self._parse_argument(instruction_argument)
+        if len(self._parsed_arguments) >= self.MAX_NUM_MEMOIZED_ARGUMENTS:
+            self._parsed_arguments.clear()
+        self._parsed_arguments[instruction_argument] = ret_val
+        return ret_val
+
     def _parse(self,
                arguments: list) -> argparse.Namespace:
+        if self._simple_parser is not None:
+            ret_val = self._simple_parser.parse(arguments)
+            if ret_val is not None:
+                return ret_val
         try:
             return raise_exception_instead_of_exiting_on_error(self.arg_parser(), arguments)
         except ArgumentParsingException as ex:
@@ -1438,6 +2269,12 @@ class InstructionSubCommand:
                       parser: argparse.ArgumentParser):
         raise NotImplementedError()
 
+    def simple_parser(self) -> SimpleArgumentParser:
+        """
+        :return: None if arguments are only parsed by argparse.
+        """
+        return None
+
     def execute(self,
                 parsing_settings: ParsingSettings,
                 source: SourceReference,
@@ -1458,28 +2295,51 @@ class InstructionWithSubCommandsArgumentParser(InstructionWithArgparseArgumentPa
                  description_for_help_text: str):
         InstructionWithArgparseArgumentParser.__init__(self, command_name_for_help_text)
         self.sub_commands = sub_commands
+        self._title_for_help_text = title_for_help_text
+        self._description_for_help_text = description_for_help_text
         self._sub_command_parsers = {}
-        self._parser = argparse.ArgumentParser(prog=command_name_for_help_text,
-                                               add_help=False)
-        self._set_sub_commands(self._parser, title_for_help_text, description_for_help_text)
-
-    def arg_parser(self) -> argparse.ArgumentParser:
-        return self._parser
+        self._simple_sub_command_parsers = {}
+        for sub_command in sub_commands:
+            simple_parser = sub_command.simple_parser()
+            if simple_parser is not None:
+                for name in [sub_command.name] + sub_command.aliases:
+                    self._simple_sub_command_parsers[name] = (sub_command, simple_parser)
 
     def sub_command_parsers(self) -> dict:
         """
         :return: Dict SUB-COMMAND -> argparse.ArgumentParser
         """
+        self.arg_parser()
         return self._sub_command_parsers
 
+    def _construct_argparser(self, instruction_name_for_help_text: str) -> argparse.ArgumentParser:
+        parser = argparse.ArgumentParser(prog=instruction_name_for_help_text,
+                                         add_help=False)
+        return self._set_sub_commands(parser, self._title_for_help_text, self._description_for_help_text)
+
     def apply(self,
               parsing_settings: ParsingSettings,
               source: SourceReference,
               instruction_argument: str):
+        args = self._parse_argument_memoized(instruction_argument)
+        return args.func.execute(parsing_settings, source, args)
 
+    def _parse_argument(self,
+                        instruction_argument: str) -> argparse.Namespace:
         prepared_args = self._split_command_line_and_make_first_string_uppercase(instruction_argument)
-        args = self._parse(prepared_args)
-        return args.func.execute(parsing_settings, source, args)
+        return self._parse(prepared_args)
+
+    def _parse(self,
+               arguments: list) -> argparse.Namespace:
+        if arguments:
+            sub_command_and_parser = self._simple_sub_command_parsers.get(arguments[0])
+            if sub_command_and_parser is not None:
+                sub_command, simple_parser = sub_command_and_parser
+                args = simple_parser.parse(arguments[1:])
+                if args is not None:
+                    args.func = sub_command
+                    return args
+        return InstructionWithArgparseArgumentParser._parse(self, arguments)
 
     def _set_sub_commands(self,
                           parser: argparse.ArgumentParser,
@@ -1499,7 +2359,7 @@ class InstructionWithSubCommandsArgumentParser(InstructionWithArgparseArgumentPa
 
     @staticmethod
     def _split_command_line_and_make_first_string_uppercase(command_line: str):
-        commands = shlex.split(command_line)
+        commands = split_arguments(command_line)
         if commands:
             commands[0] = commands[0].upper()
         return commands
@@ -1633,6 +2493,8 @@ class ProcessorForTagsPrint(Processor):
     def result_item_iterable(self,
                              parsing_settings: ParsingSettings,
                              env: ResultItemsConstructionEnvironment):
+        if not parsing_settings.construct_other_than_file_paths:
+            return iter([])
         return iter([ResultItemForTagsPrint(env.tags().frozen_tags(),
                                             self._prefix,
                                             self._suffix)])
@@ -1653,6 +2515,8 @@ class ProcessorForTagsPrintStack(Processor):
     def result_item_iterable(self,
                              parsing_settings: ParsingSettings,
                              env: ResultItemsConstructionEnvironment):
+        if not parsing_settings.construct_other_than_file_paths:
+            return iter([])
         return iter([ResultItemForTagsPrintStack(env.tags().stack(),
                                                  self._prefix,
                                                  self._suffix)])
@@ -1749,6 +2613,9 @@ class TagsSubCommandForListOfTagsArgumentsBase(InstructionSubCommand):
                             nargs="*",
                             metavar="TAG")
 
+    def simple_parser(self) -> SimpleArgumentParser:
+        return SimpleArgumentParser({}, {}, "tags", 0, None)
+
     def execute(self,
                 parsing_settings: ParsingSettings,
                 source: SourceReference,
@@ -1856,6 +2723,9 @@ class TagsSubCommandForPush(InstructionSubCommand):
                       parser: argparse.ArgumentParser):
         pass
 
+    def simple_parser(self) -> SimpleArgumentParser:
+        return SimpleArgumentParser({}, {}, None, 0, 0)
+
     def execute(self,
                 parsing_settings: ParsingSettings,
                 source: SourceReference,
@@ -1879,6 +2749,9 @@ class TagsSubCommandForPop(InstructionSubCommand):
                       parser: argparse.ArgumentParser):
         pass
 
+    def simple_parser(self) -> SimpleArgumentParser:
+        return SimpleArgumentParser({}, {}, None, 0, 0)
+
     def execute(self,
                 parsing_settings: ParsingSettings,
                 source: SourceReference,
@@ -1952,8 +2825,13 @@ class InstructionArgumentParserForTags(InstructionWithSubCommandsArgumentParser)
 ###############################################################################
 
 
+@functools.lru_cache(maxsize=1024)
 def wildcard_matcher(wildcard: str):
-    """A mather that matches on Unix-style wildcards."""
+    """
+    A mather that matches on Unix-style wildcards.
+
+    Matchers are cached, since the same wildcards are typically used by many instructions.
+    """
     try:
         regex_string = fnmatch.translate(wildcard)
         regex = re.compile(regex_string)
@@ -1965,8 +2843,13 @@ def wildcard_matcher(wildcard: str):
     return f
 
 
+@functools.lru_cache(maxsize=1024)
 def regex_matcher(regex_string: str):
-    """A mather that matches on Regular Expressions."""
+    """
+    A mather that matches on Regular Expressions.
+
+    Matchers are cached, since the same expressions are typically used by many instructions.
+    """
     try:
         regex = re.compile(regex_string)
     except:
@@ -2004,7 +2887,7 @@ class FileType:
 
 def file_type_matcher(expected_type: FileType):
     def f(file: FileMatchInfo) -> bool:
-        return expected_type.mode_predicate(file.stat_result()[stat.ST_MODE])
+        return expected_type.mode_predicate(file.file_type_mode())
     return f
 
 
@@ -2033,6 +2916,23 @@ def list__parse_excludes(list_args: argparse.Namespace) -> list:
         else []
 
 
+def list__simple_argument_parser() -> SimpleArgumentParser:
+    """The common forms of the arguments of LIST and FIND (after DIRECTORY)."""
+    return SimpleArgumentParser({"-s": "sort",
+                                 "--sort": "sort"},
+                                {"-r": ("regex_list", None),
+                                 "--regex": ("regex_list", None),
+                                 "-e": ("exclude_pattern_list", None),
+                                 "--exclude": ("exclude_pattern_list", None),
+                                 "-E": ("exclude_regex_list", None),
+                                 "--exclude-regex": ("exclude_regex_list", None),
+                                 "-t": ("type", FileType),
+                                 "--type": ("type", FileType)},
+                                "patterns",
+                                0,
+                                None)
+
+
 class InstructionArgumentParserForDirectoryListing(InstructionWithArgparseArgumentParser):
     """Parser for listing files in a directory."""
 
@@ -2047,22 +2947,20 @@ class InstructionArgumentParserForDirectoryListing(InstructionWithArgparseArgume
 
     def __init__(self,
                  instruction_name: str):
-        InstructionWithArgparseArgumentParser.__init__(self, instruction_name)
-        self._parser = self._construct_argparser(instruction_name)
+        InstructionWithArgparseArgumentParser.__init__(self,
+                                                       instruction_name,
+                                                       list__simple_argument_parser())
 
     def apply(self,
               parsing_settings: ParsingSettings,
               source: SourceReference,
               instruction_argument: str):
-        list_settings = self._parse_argument(instruction_argument)
+        list_settings = self._parse_argument_memoized(instruction_argument)
         return [ProcessorForDirectoryListing(source, list_settings)]
 
-    def arg_parser(self) -> argparse.ArgumentParser:
-        return self._parser
-
     def _parse_argument(self,
                         instruction_argument: str) -> ListAndFindSettings:
-        arguments = shlex.split(instruction_argument)
+        arguments = split_arguments(instruction_argument)
         if not arguments:
             msg = "A directory must be given (use '.' for current directory)."
             raise InstructionArgumentParserSyntaxErrorException([msg])
@@ -2175,22 +3073,20 @@ class InstructionArgumentParserForFind(InstructionWithArgparseArgumentParser):
 
     def __init__(self,
                  instruction_name: str):
-        InstructionWithArgparseArgumentParser.__init__(self, instruction_name)
-        self._parser = self._construct_argparser(instruction_name)
+        InstructionWithArgparseArgumentParser.__init__(self,
+                                                       instruction_name,
+                                                       list__simple_argument_parser())
 
     def apply(self,
               parsing_settings: ParsingSettings,
               source: SourceReference,
               instruction_argument: str):
-        list_settings = self._parse_argument(instruction_argument)
+        list_settings = self._parse_argument_memoized(instruction_argument)
         return [ProcessorForDirectoryListing(source, list_settings)]
 
-    def arg_parser(self) -> argparse.ArgumentParser:
-        return self._parser
-
     def _parse_argument(self,
                         instruction_argument: str) -> ListAndFindSettings:
-        arguments = shlex.split(instruction_argument)
+        arguments = split_arguments(instruction_argument)
         if not arguments:
             msg = "A directory must be given (use '.' for current directory)."
             raise InstructionArgumentParserSyntaxErrorException([msg])
@@ -2299,14 +3195,25 @@ class InstructionArgumentParserForInclude(InstructionWithArgparseArgumentParser)
 
     def __init__(self,
                  instruction_name: str):
-        InstructionWithArgparseArgumentParser.__init__(self, instruction_name)
-        self._parser = self._construct_argparser(instruction_name)
+        InstructionWithArgparseArgumentParser.__init__(
+            self,
+            instruction_name,
+            SimpleArgumentParser({"-I": "do_not_import_tags",
+                                  "--do-not-import-tags": "do_not_import_tags",
+                                  "-E": "do_not_export_tags",
+                                  "--do-not-export-tags": "do_not_export_tags",
+                                  "-p": "preserve_current_directory",
+                                  "--preserve-current-directory": "preserve_current_directory"},
+                                 {},
+                                 "file",
+                                 1,
+                                 1))
 
     def apply(self,
               parsing_settings: ParsingSettings,
               source: SourceReference,
               instruction_argument: str):
-        args = self._parse_argument(instruction_argument)
+        args = self._parse_argument_memoized(instruction_argument)
         tag_include_settings = TagsSettingsForInclude(not args.do_not_export_tags,
                                                       not args.do_not_import_tags)
         return [ProcessorForInclude(source,
@@ -2314,12 +3221,9 @@ class InstructionArgumentParserForInclude(InstructionWithArgparseArgumentParser)
                                     args.preserve_current_directory,
                                     tag_include_settings)]
 
-    def arg_parser(self) -> argparse.ArgumentParser:
-        return self._parser
-
     def _parse_argument(self,
                         instruction_argument: str) -> argparse.Namespace:
-        return self._parse(shlex.split(instruction_argument))
+        return self._parse(split_arguments(instruction_argument))
 
     def _construct_argparser(self, instruction_name_for_help_text: str) -> argparse.ArgumentParser:
         parser = argparse.ArgumentParser(prog=instruction_name_for_help_text,
@@ -2437,7 +3341,7 @@ class LineParserForFilePath(LineParser):
               source: SourceReference,
               striped_line: str) -> list:
 
-        return [ProcessorForFilePath(source, striped_line)]
+        return [ProcessorForFilePaths(source, striped_line)]
 
 
 ###############################################################################
@@ -2488,224 +3392,2330 @@ class ListFileParser:
 
     def apply(self,
               lines_source: LinesSource) -> ProcessorForListFile:
+        observer = self._parsing_settings.observer
+        if observer is None:
+            return self._apply(lines_source)
+        start_time = time.perf_counter()
+        try:
+            return self._apply(lines_source)
+        finally:
+            observer.list_file_parsed(self.file_name,
+                                      self._includes,
+                                      start_time,
+                                      time.perf_counter() - start_time)
+
+    def _apply(self,
+               lines_source: LinesSource) -> ProcessorForListFile:
         self.line_number = 0
         processors = []
         for line in lines_source:
             self.line = line  # TODO behövs verkligen denna??
             self.line_stripped = line
             self.line_number += 1
-            processors += self._processors_for_line()
+            self._add_processors_for_line(processors)
         return ProcessorForListFile(self.file_name,
                                     self.file_name_relative_including_file,
                                     self._source_reference(),
                                     processors)
 
-    def _processors_for_line(self) -> list:
+    def _add_processors_for_line(self, processors: list):
+        source = self._source_reference()
         for line_parser in self._parsing_settings.line_parsers:
+            if (isinstance(line_parser, LineParserForFilePath) and
+                    processors and
+                    isinstance(processors[-1], ProcessorForFilePaths)):
+                processors[-1].add_file_path_line(self.line_stripped, self.line_number)
+                return
             list_of_processors = line_parser.parse(self._parsing_settings,
-                                                   self._source_reference(),
+                                                   source,
                                                    self.line_stripped)
             if list_of_processors is not None:
-                return list_of_processors
-        raise InstructionLineSyntaxErrorException(self._source_reference())
+                processors += list_of_processors
+                return
+        raise InstructionLineSyntaxErrorException(source)
 
     def _source_reference(self) -> SourceReference:
         return SourceReference(self._includes,
                                self._source_info())
 
+    def cache_key(self) -> tuple:
+        """
+        The properties, except for the contents of the file, that the parsed
+        ProcessorForListFile depends on.
+        """
+        return (self.file_name,
+                self.file_name_relative_including_file,
+                tuple([(include.file_name, include.line.number)
+                       for include in self._includes.from_top_to_bottom()]))
+
     def _source_info(self) -> SourceLineInFile:
         return SourceLineInFile(self.file_name,
                                 SourceLine(self.line_number,
                                            self.line))
 
 
+def parsed_list_file(parsing_settings: ParsingSettings,
+                     file_parser: ListFileParser,
+                     lines_source: LinesSource,
+                     file_path_or_none: str) -> ProcessorForListFile:
+    """
+    Parses a list-file, or gives the cached parse of it.
+
+    :param file_path_or_none: The path of the file, or None for stdin (which is not cached).
+    """
+    if file_path_or_none is None:
+        return file_parser.apply(lines_source)
+    if parsing_settings.observer is not None:
+        parsing_settings.observer.list_file_used(file_path_or_none)
+    if parsing_settings.list_file_cache is None:
+        return file_parser.apply(lines_source)
+    return parsing_settings.list_file_cache.processor_for(file_path_or_none,
+                                                          file_parser,
+                                                          lines_source)
+
+
 ###############################################################################
-# - Command -
+# - file systems -
 ###############################################################################
 
 
-class PreprocessorException(Exception):
-    def __init__(self,
-                 called_process_error: subprocess.CalledProcessError):
-        self._called_process_error = called_process_error
-
-    def render(self, o_stream):
-        write_lines(o_stream,
-                    [
-                        "Preprocessor failed.",
-                        "Command exit code: " + str(self._called_process_error.returncode)
-                    ])
-        if self._called_process_error.output:
-            write_lines(o_stream,
-                        [
-                            "Output from preprocessor:",
-                            self._called_process_error.output,
-                        ])
+# Types of directory entries, as given by list_directory.
+# (The types of symbolic links are the types of the files they refer to.)
+ENTRY_TYPE_OTHER = 0
+ENTRY_TYPE_FILE = 1
+ENTRY_TYPE_DIRECTORY = 2
+ENTRY_TYPE_BROKEN_LINK = 3
 
+# The file type bits of the mode of each ENTRY_TYPE_...
+ENTRY_TYPE_MODES = (0, stat.S_IFREG, stat.S_IFDIR, 0)
 
-class LinesSourceForFileBase(LinesSource):
-    def __init__(self,
-                 parsing_settings: ParsingSettings):
-        self._parsing_settings = parsing_settings
 
-    def _open_file(self):
-        raise NotImplementedError()
+def list_directory(dir_path: str) -> tuple:
+    """
+    Lists a directory, with the type of each entry.
 
-    def __iter__(self):
-        if self._parsing_settings.preprocessor_shell_command_or_none:
-            raw_lines = self._raw_lines_from_processed_file(self._parsing_settings.preprocessor_shell_command_or_none)
-        else:
-            raw_lines = self._raw_lines_directly_from_file()
-        return self._from_raw_lines(raw_lines)
+    The entries are in the same order as those of os.listdir.
 
-    def _raw_lines_directly_from_file(self):
-        # Read all lines from the file so that we can close it before
-        # opening any included files.
-        # This prevents exhausting the number of open files.
-        open_file = self._open_file()
-        raw_lines = open_file.readlines()
-        open_file.close()
-        return raw_lines
+    :return: (list of base names, bytes with the ENTRY_TYPE_... of each entry)
+    """
+    base_names = []
+    entry_types = bytearray()
+    with os.scandir(dir_path) as entries:
+        for entry in entries:
+            base_names.append(entry.name)
+            entry_types.append(_entry_type(entry))
+    return base_names, bytes(entry_types)
 
-    def _raw_lines_from_processed_file(self,
-                                       preprocessor_shell_command: str):
-        open_file = self._open_file()
-        try:
-            output = subprocess.check_output(preprocessor_shell_command,
-                                             shell=True,
-                                             universal_newlines=True,
-                                             stdin=open_file)
-        except subprocess.CalledProcessError as ex:
-            raise PreprocessorException(ex)
-        open_file.close()
-        raw_lines = output.splitlines()
-        return raw_lines
 
-    @staticmethod
-    def _from_raw_lines(raw_lines: list):
-        lines = []
-        for lineWithPossibleNewLine in raw_lines:
-            lines.append(lineWithPossibleNewLine.strip("\n").rstrip())
-        return iter(lines)
+def _entry_type(entry: os.DirEntry) -> int:
+    # The type is known from the listing, except for symbolic links (which must be stat:ed).
+    try:
+        if entry.is_file():
+            return ENTRY_TYPE_FILE
+        if entry.is_dir():
+            return ENTRY_TYPE_DIRECTORY
+        if entry.is_symlink() and not os.path.exists(entry.path):
+            return ENTRY_TYPE_BROKEN_LINK
+    except OSError:
+        pass
+    return ENTRY_TYPE_OTHER
 
 
-class LinesSourceForFileArgument(LinesSourceForFileBase):
+class FileSystem:
     """
-    A LinesSource for file arguments on the command line.
+    Answers questions about files and directories - as the operating system does.
+
+    Sub classes may answer from some other source.
+    Relative paths are relative to the current directory of the process.
     """
-    def __init__(self,
-                 parsing_settings: ParsingSettings,
-                 file_name: str):
-        LinesSourceForFileBase.__init__(self, parsing_settings)
-        self._file_name = file_name
 
-    def _open_file(self):
-        try:
-            return open(self._file_name,
-                        mode="r")
-        except OSError:
-            msg = error_header_line("Cannot open file: " +
-                                    in_double_quotes(self._file_name))
-            write_lines(sys.stderr,
-                        [msg])
-            sys.exit(EXIT_INVALID_ARGUMENTS)
+    def exists(self, path: str) -> bool:
+        """As os.path.exists"""
+        return os.path.exists(path)
 
+    def is_file(self, path: str) -> bool:
+        """As os.path.isfile"""
+        return os.path.isfile(path)
 
-class LinesSourceForStdin(LinesSourceForFileBase):
-    """
-    A LinesSource for file arguments on the command line.
-    """
-    def __init__(self,
-                 parsing_settings: ParsingSettings):
-        LinesSourceForFileBase.__init__(self, parsing_settings)
+    def is_dir(self, path: str) -> bool:
+        """As os.path.isdir"""
+        return os.path.isdir(path)
 
-    def _open_file(self):
-        return sys.stdin
+    def exists_in_directory(self, dir_path: str, file_name: str) -> bool:
+        """
+        As exists(os.path.join(dir_path, file_name))
 
+        :param dir_path: Empty, or a directory path ending with a separator
+        (as the directory of a FileReferenceEnvironment).
+        """
+        return self.exists(os.path.join(dir_path, file_name))
 
-class LinesSourceForNamedFileBase(LinesSourceForFileBase):
-    def __init__(self,
-                 parsing_settings: ParsingSettings,
-                 file_name: str):
-        LinesSourceForFileBase.__init__(self, parsing_settings)
-        self._file_name = file_name
+    def list_directory(self, path: str) -> tuple:
+        """
+        As list_directory.
 
-    def _open_file(self):
-        return self._open(self._file_name)
+        :raises OSError: The directory cannot be listed.
+        """
+        return list_directory(path)
 
-    def _open(self, file_name: str):
-        raise NotImplementedError()
+    def open_text_file(self, path: str):
+        """
+        As open(path, mode="r")
 
+        :raises OSError: The file cannot be opened.
+        """
+        return open(path, mode="r")
 
-class LinesSourceForIncludedFile(LinesSourceForNamedFileBase):
-    """
-    A LinesSource for files used by the include instruction.
+    def invalidate(self):
+        """
+        Informs that files may have been modified by someone else (e.g. by a SHELL command).
+        """
+        pass
+
+    def close(self):
+        """
+        Releases resources. The object must not be used afterwards.
+        """
+        pass
+
+
+FILE_SYSTEM_OF_OPERATING_SYSTEM = FileSystem()
+
+
+class DirectoryFdFileSystem(FileSystem):
     """
-    def __init__(self,
-                 parsing_settings: ParsingSettings,
-                 file_name: str,
-                 source: SourceReference):
-        LinesSourceForNamedFileBase.__init__(self, parsing_settings, file_name)
-        self._source = source
+    A FileSystem that keeps directories open, and looks up files relative to them
+    (with the dir_fd argument of os functions).
 
-    def _open(self, file_name: str):
-        try:
-            return open(file_name, mode="r")
-        except OSError:
-            raise ResultItemConstructionForMissingFileException(self._source, file_name)
+    Since paths of list-files are relative to the directories of list-files, and LIST,
+    the lookup of a file then only resolves the last components of its path -
+    not the directories leading to it, which may be many, and contain "..".
 
+    The number of open directories is limited - the least recently used is closed
+    when another must be opened.
 
-class FileExistenceHandlingSettings:
+    An open directory is the directory that had its path when it was opened,
+    so the object must be invalidated when directories may have been moved or removed.
 
-    def __init__(self,
-                 include_existing_in_output: bool,
-                 program_should_fail_on_non_existing: bool,
-                 include_non_existing_in_output: bool):
-        self.include_existing_in_output = include_existing_in_output
-        self.program_should_fail_on_non_existing = program_should_fail_on_non_existing
-        self.include_non_existing_in_output = include_non_existing_in_output
+    Not thread safe.
+    """
+    DEFAULT_MAX_NUM_OPEN_DIRECTORIES = 64
 
-    @staticmethod
-    def new_fail_on_non_existing():
-        return FileExistenceHandlingSettings(True, True, False)
+    # Directories that cannot be opened (e.g. since they do not exist) are cached
+    # as this fd - files in them are looked up by path.
+    _NO_FD = -1
 
-    @staticmethod
-    def new_ignore_non_existing():
-        return FileExistenceHandlingSettings(True, False, False)
+    _DIRECTORY_OPEN_FLAGS = os.O_RDONLY | getattr(os, "O_DIRECTORY", 0) | getattr(os, "O_CLOEXEC", 0)
 
-    @staticmethod
-    def new_include_non_existing():
-        return FileExistenceHandlingSettings(True, False, True)
+    def __init__(self, max_num_open_directories: int = DEFAULT_MAX_NUM_OPEN_DIRECTORIES):
+        self._max_num_open_directories = max_num_open_directories
+        # Directory path, ending with a separator -> fd
+        self._fds = collections.OrderedDict()
+        self._last_dir_path = None
+        self._last_fd = self._NO_FD
 
     @staticmethod
-    def new_only_non_existing():
-        return FileExistenceHandlingSettings(False, False, True)
+    def is_supported() -> bool:
+        return (hasattr(os, "O_DIRECTORY") and
+                os.stat in os.supports_dir_fd and
+                os.open in os.supports_dir_fd)
+
+    def __len__(self) -> int:
+        """Number of cached directories"""
+        return len(self._fds)
+
+    def exists(self, path: str) -> bool:
+        return self._stat_or_none(path) is not None
+
+    def is_file(self, path: str) -> bool:
+        stat_result = self._stat_or_none(path)
+        return stat_result is not None and stat.S_ISREG(stat_result.st_mode)
+
+    def is_dir(self, path: str) -> bool:
+        stat_result = self._stat_or_none(path)
+        return stat_result is not None and stat.S_ISDIR(stat_result.st_mode)
+
+    def exists_in_directory(self, dir_path: str, file_name: str) -> bool:
+        if not dir_path or not file_name:
+            return os.path.exists(os.path.join(dir_path, file_name))
+        fd = self._directory_fd(dir_path)
+        if fd == self._NO_FD:
+            return os.path.exists(os.path.join(dir_path, file_name))
+        try:
+            os.stat(file_name, dir_fd=fd)
+        except (OSError, ValueError):
+            return False
+        return True
 
+    def open_text_file(self, path: str):
+        dir_path, file_name = self._split(path)
+        if dir_path is None:
+            return open(path, mode="r")
+        fd = self._directory_fd(dir_path)
+        if fd == self._NO_FD:
+            return open(path, mode="r")
+        return open(file_name, mode="r", opener=lambda name, flags: os.open(name, flags, dir_fd=fd))
+
+    def invalidate(self):
+        self.close()
+
+    def close(self):
+        fds = list(self._fds.values())
+        self._fds.clear()
+        self._last_dir_path = None
+        self._last_fd = self._NO_FD
+        for fd in fds:
+            if fd != self._NO_FD:
+                os.close(fd)
+
+    def _stat_or_none(self, path: str):
+        dir_path, file_name = self._split(path)
+        try:
+            if dir_path is None:
+                return os.stat(path)
+            fd = self._directory_fd(dir_path)
+            if fd == self._NO_FD:
+                return os.stat(path)
+            return os.stat(file_name, dir_fd=fd)
+        except (OSError, ValueError):
+            return None
 
-class FileExistenceHandlingModeOptionParser:
-    """Parses the Command Line Option for handling of files depending on existence."""
+    @staticmethod
+    def _split(path: str) -> tuple:
+        """
+        :return: (directory path ending with a separator, base name),
+        or (None, None) if the path should be looked up as a whole
+        """
+        dir_path, file_name = os.path.split(path)
+        if not dir_path or not file_name:
+            return None, None
+        return os.path.join(dir_path, ''), file_name
+
+    def _directory_fd(self, dir_path: str) -> int:
+        if dir_path == self._last_dir_path:
+            return self._last_fd
+        fd = self._fds.get(dir_path)
+        if fd is None:
+            fd = self._open_directory(dir_path)
+        else:
+            self._fds.move_to_end(dir_path)
+        self._last_dir_path = dir_path
+        self._last_fd = fd
+        return fd
+
+    def _open_directory(self, dir_path: str) -> int:
+        if len(self._fds) >= self._max_num_open_directories:
+            _, least_recently_used_fd = self._fds.popitem(last=False)
+            if least_recently_used_fd != self._NO_FD:
+                os.close(least_recently_used_fd)
+        try:
+            fd = os.open(dir_path, self._DIRECTORY_OPEN_FLAGS)
+        except OSError:
+            fd = self._NO_FD
+        self._fds[dir_path] = fd
+        return fd
 
-    _DEFAULT_KEY = "fail"
 
-    _MODES = {
-        "fail": (FileExistenceHandlingSettings.new_fail_on_non_existing(),
-                 "A missing file causes the program to fail (with exit status " +
-                 str(EXIT_FILE_DOES_NOT_EXIST) + ")."),
-        "ignore": (FileExistenceHandlingSettings.new_ignore_non_existing(),
-                   "Missing files are not included in the output."),
-        "include": (FileExistenceHandlingSettings.new_include_non_existing(),
-                    "Missing files are included in the output just as existing files."),
-        "only": (FileExistenceHandlingSettings.new_only_non_existing(),
-                 "Output only missing files."),
-    }
+class TreeFileSystem(FileSystem):
+    """
+    A FileSystem that answers questions about the tree of a directory
+    from listings of its directories, held in memory.
 
-    def mode_keys(self) -> list:
-        return self._MODES.keys()
+    Sub classes give the listings.
 
-    def default_key(self) -> str:
-        return self._DEFAULT_KEY
+    Questions about paths outside of the tree are answered by the operating system,
+    as are questions about paths inside directories without listings
+    (e.g. symbolic links to directories).
+    So are paths with ".." components, since their meaning depends on symbolic links.
 
-    def keys_help_text(self) -> str:
+    Modifications of the tree (e.g. by SHELL) are not seen,
+    and neither is a change of the current directory of the process.
+    """
+    _NON_EXISTING = -1
+
+    def __init__(self, root_dir: str):
+        self._cwd = os.getcwd()
+        self._root = os.path.normpath(os.path.join(self._cwd, root_dir))
+        self._root_prefix = os.path.join(self._root, '')
+        # Relative path of directory ('' for the root) -> listing (see list_directory)
+        self._listings = {}
+        # Relative path of directory -> dict: base name -> ENTRY_TYPE_...
+        # (Constructed on demand.)
+        self._entry_types = {}
+        # Relative paths of directories without listings.
+        self._not_walked = set()
+
+    def __len__(self) -> int:
+        """Number of directories in memory"""
+        return len(self._listings)
+
+    def exists(self, path: str) -> bool:
+        entry_type = self._tree_entry_type(path)
+        if entry_type is None:
+            return os.path.exists(path)
+        return entry_type != self._NON_EXISTING and entry_type != ENTRY_TYPE_BROKEN_LINK
+
+    def is_file(self, path: str) -> bool:
+        entry_type = self._tree_entry_type(path)
+        if entry_type is None:
+            return os.path.isfile(path)
+        return entry_type == ENTRY_TYPE_FILE
+
+    def is_dir(self, path: str) -> bool:
+        entry_type = self._tree_entry_type(path)
+        if entry_type is None:
+            return os.path.isdir(path)
+        return entry_type == ENTRY_TYPE_DIRECTORY
+
+    def list_directory(self, path: str) -> tuple:
+        relative_path = self._path_relative_root(path)
+        if relative_path is not None:
+            listing = self._listings.get(relative_path)
+            if listing is not None:
+                return listing
+        return list_directory(path)
+
+    def _path_relative_root(self, path: str) -> str:
+        """
+        :return: None if the path is not answered from memory
+        """
+        if '..' in path or path.endswith(os.sep) or path.endswith(os.sep + '.'):
+            return None
+        absolute_path = os.path.normpath(os.path.join(self._cwd, path))
+        if absolute_path == self._root:
+            return ''
+        if absolute_path.startswith(self._root_prefix):
+            return absolute_path[len(self._root_prefix):]
+        return None
+
+    def _tree_entry_type(self, path: str) -> int:
+        """
+        :return: ENTRY_TYPE_..., or _NON_EXISTING, or None if the path is not answered from memory
+        """
+        relative_path = self._path_relative_root(path)
+        if relative_path is None:
+            return None
+        if relative_path == '':
+            return ENTRY_TYPE_DIRECTORY
+        relative_dir, base_name = os.path.split(relative_path)
+        entry_types = self._entry_types.get(relative_dir)
+        if entry_types is None:
+            listing = self._listings.get(relative_dir)
+            if listing is None:
+                return None if self._is_inside_directory_not_walked(relative_dir) else self._NON_EXISTING
+            entry_types = dict(zip(listing[0], listing[1]))
+            self._entry_types[relative_dir] = entry_types
+        return entry_types.get(base_name, self._NON_EXISTING)
+
+    def _is_inside_directory_not_walked(self, relative_dir: str) -> bool:
+        while relative_dir not in self._listings:
+            if relative_dir in self._not_walked:
+                return True
+            relative_dir = os.path.dirname(relative_dir)
+        return False
+
+
+class SnapshotFileSystem(TreeFileSystem):
+    """
+    A TreeFileSystem with a snapshot of the tree of a directory,
+    taken once - when the object is constructed.
+
+    The tree is walked by threads, since listing a directory is mostly waiting
+    for the operating system.
+    Symbolic links to directories, and directories that cannot be listed, are not walked.
+    """
+
+    def __init__(self,
+                 root_dir: str,
+                 max_num_threads: int = None):
+        """
+        :param max_num_threads: None for the default of ThreadPoolExecutor.
+        :raises OSError: The root directory cannot be listed.
+        """
+        TreeFileSystem.__init__(self, root_dir)
+        self._walk(max_num_threads)
+
+    def _walk(self, max_num_threads: int):
+        import concurrent.futures
+        root_listing = self._listing_and_linked_directories(self._root)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_num_threads) as executor:
+            pending = {}
+            self._add_listing('', root_listing, executor, pending)
+            while pending:
+                done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    relative_dir = pending.pop(future)
+                    try:
+                        listing = future.result()
+                    except OSError:
+                        self._not_walked.add(relative_dir)
+                        continue
+                    self._add_listing(relative_dir, listing, executor, pending)
+
+    def _add_listing(self,
+                     relative_dir: str,
+                     listing_and_linked_directories: tuple,
+                     executor,
+                     pending: dict):
+        base_names, entry_types, linked_directories = listing_and_linked_directories
+        self._listings[relative_dir] = (base_names, entry_types)
+        for base_name, entry_type in zip(base_names, entry_types):
+            if entry_type == ENTRY_TYPE_DIRECTORY:
+                relative_path = os.path.join(relative_dir, base_name)
+                if base_name in linked_directories:
+                    self._not_walked.add(relative_path)
+                else:
+                    future = executor.submit(self._listing_and_linked_directories,
+                                             os.path.join(self._root, relative_path))
+                    pending[future] = relative_path
+
+    @staticmethod
+    def _listing_and_linked_directories(dir_path: str) -> tuple:
+        """
+        :return: (list of base names, bytes with ENTRY_TYPE_..., set of base names of symbolic links to directories)
+        """
+        base_names = []
+        entry_types = bytearray()
+        linked_directories = set()
+        with os.scandir(dir_path) as entries:
+            for entry in entries:
+                entry_type = _entry_type(entry)
+                base_names.append(entry.name)
+                entry_types.append(entry_type)
+                if entry_type == ENTRY_TYPE_DIRECTORY and entry.is_symlink():
+                    linked_directories.add(entry.name)
+        return base_names, bytes(entry_types), linked_directories
+
+
+class GitIndexFileSystem(TreeFileSystem):
+    """
+    A TreeFileSystem with the files of the index of a git repository (.git/index),
+    so that the working tree is not read.
+
+    The index is parsed directly (versions 2, 3 and 4) - git is not run.
+
+    Files in the index are taken to exist, even if they have been removed from the
+    working tree (without the removal being staged) - except for files that are
+    skip-worktree (not checked out by a sparse checkout).
+    Untracked files that are not ignored exist only if they are included
+    (they are given by "git ls-files", since finding them requires reading the working tree).
+
+    The types of symbolic links are looked up in the working tree.
+    Paths inside symbolic links to directories, inside submodules and inside .git
+    are answered by the operating system.
+    """
+    SIGNATURE = b"DIRC"
+    SUPPORTED_VERSIONS = (2, 3, 4)
+
+    _MODE_TYPE_MASK = 0o170000
+    _MODE_SYMBOLIC_LINK = 0o120000
+    _MODE_GITLINK = 0o160000
+
+    _FLAG_EXTENDED = 0x4000
+    _FLAG_STAGE_MASK = 0x3000
+    _EXTENDED_FLAG_SKIP_WORKTREE = 0x4000
+
+    # Bytes of an entry before the object id: ctime, mtime, dev, ino, mode, uid, gid, size
+    _ENTRY_STAT_SIZE = 40
+    _ENTRY_MODE_OFFSET = 24
+
+    def __init__(self,
+                 work_tree: str,
+                 include_untracked: bool = False):
+        """
+        :param work_tree: The top directory of the working tree of the repository.
+        :param include_untracked: Include untracked files that are not ignored.
+        :raises OSError: The index cannot be read, or git fails to give the untracked files.
+        :raises ValueError: The index is invalid, or of an unsupported version.
+        """
+        TreeFileSystem.__init__(self, work_tree)
+        self._listings[''] = ([], bytearray())
+        # .git is looked up in the working tree, as are paths inside it.
+        self._add_file(".git", None)
+        git_dir = self._git_dir()
+        with open(os.path.join(git_dir, "index"), mode="rb") as f:
+            index = f.read()
+        for path, mode in self._index_entries(index, self._object_id_size(git_dir)):
+            self._add_file(os.fsdecode(path), mode)
+        if include_untracked:
+            for path in self._untracked_files():
+                self._add_file(path, None)
+        for relative_dir, (base_names, entry_types) in self._listings.items():
+            self._listings[relative_dir] = (base_names, bytes(entry_types))
+
+    def _git_dir(self) -> str:
+        git_dir = os.path.join(self._root, ".git")
+        if os.path.isfile(git_dir):
+            # A linked working tree, or a submodule.
+            with open(git_dir, mode="r") as f:
+                contents = f.read()
+            if not contents.startswith("gitdir:"):
+                raise ValueError("Invalid .git file: " + git_dir)
+            git_dir = os.path.join(self._root, contents[len("gitdir:"):].strip())
+        return git_dir
+
+    @staticmethod
+    def _object_id_size(git_dir: str) -> int:
+        common_dir = git_dir
+        try:
+            with open(os.path.join(git_dir, "commondir"), mode="r") as f:
+                common_dir = os.path.join(git_dir, f.read().strip())
+        except OSError:
+            pass
+        try:
+            with open(os.path.join(common_dir, "config"), mode="r") as f:
+                config = f.read()
+        except OSError:
+            return 20
+        if re.search(r"^\s*objectformat\s*=\s*sha256\s*$", config, re.MULTILINE | re.IGNORECASE):
+            return 32
+        return 20
+
+    @classmethod
+    def _index_entries(cls,
+                       index: bytes,
+                       object_id_size: int):
+        """
+        Gives the entries of the index, except those that are skip-worktree.
+        A conflicted file (with entries for multiple stages) is given once.
+
+        :return: Iterator of (path: bytes, mode: int)
+        """
+        import struct
+        if index[:4] != cls.SIGNATURE:
+            raise ValueError("Not a git index")
+        version, num_entries = struct.unpack_from(">II", index, 4)
+        if version not in cls.SUPPORTED_VERSIONS:
+            raise ValueError("Unsupported version of git index: " + str(version))
+        flags_offset = cls._ENTRY_STAT_SIZE + object_id_size
+        mode_struct = struct.Struct(">I")
+        flags_struct = struct.Struct(">H")
+        offset = 12
+        path = b""
+        previous_path = None
+        try:
+            for _ in range(num_entries):
+                mode = mode_struct.unpack_from(index, offset + cls._ENTRY_MODE_OFFSET)[0]
+                flags = flags_struct.unpack_from(index, offset + flags_offset)[0]
+                path_offset = offset + flags_offset + 2
+                extended_flags = 0
+                if flags & cls._FLAG_EXTENDED:
+                    extended_flags = flags_struct.unpack_from(index, path_offset)[0]
+                    path_offset += 2
+                if version == 4:
+                    # The path is given relative the path of the previous entry.
+                    num_bytes_to_remove, path_offset = cls._index_varint(index, path_offset)
+                    path_end = index.index(b"\0", path_offset)
+                    path = path[:len(path) - num_bytes_to_remove] + index[path_offset:path_end]
+                    offset = path_end + 1
+                else:
+                    path_end = index.index(b"\0", path_offset)
+                    path = index[path_offset:path_end]
+                    # Entries are padded with 1-8 NUL bytes, to a multiple of 8 bytes.
+                    offset += ((path_end - offset) + 8) & ~7
+                if extended_flags & cls._EXTENDED_FLAG_SKIP_WORKTREE or path == previous_path:
+                    continue
+                previous_path = path
+                yield path, mode
+        except (struct.error, IndexError):
+            raise ValueError("Truncated git index")
+
+    @staticmethod
+    def _index_varint(index: bytes, offset: int) -> tuple:
+        """
+        :return: (value, offset after the value)
+        """
+        byte = index[offset]
+        offset += 1
+        value = byte & 0x7f
+        while byte & 0x80:
+            byte = index[offset]
+            offset += 1
+            value = ((value + 1) << 7) | (byte & 0x7f)
+        return value, offset
+
+    def _untracked_files(self) -> list:
+        import subprocess
+        try:
+            output = subprocess.check_output(["git", "ls-files", "-z", "--others", "--exclude-standard"],
+                                             cwd=self._root)
+        except subprocess.CalledProcessError as ex:
+            raise OSError("git ls-files failed with exit code " + str(ex.returncode))
+        return [os.fsdecode(path) for path in output.split(b"\0") if path]
+
+    def _add_file(self,
+                  path: str,
+                  mode_or_none: int):
+        """
+        :param path: A path relative the root, with "/" as separator.
+        :param mode_or_none: The mode from the index, or None if the type should
+        be looked up in the working tree.
+        """
+        if path.endswith("/"):
+            # An untracked repository.
+            path = path[:-1]
+            mode_or_none = self._MODE_GITLINK
+        if os.sep != "/":
+            path = path.replace("/", os.sep)
+        relative_dir, _, base_name = path.rpartition(os.sep)
+        listing = self._listings.get(relative_dir)
+        if listing is None:
+            listing = self._add_directory(relative_dir)
+        mode_type = None if mode_or_none is None else mode_or_none & self._MODE_TYPE_MASK
+        if mode_type == self._MODE_GITLINK:
+            entry_type = ENTRY_TYPE_DIRECTORY
+            self._not_walked.add(path)
+        elif mode_type is None or mode_type == self._MODE_SYMBOLIC_LINK:
+            entry_type = self._entry_type_in_working_tree(path)
+            if entry_type == ENTRY_TYPE_DIRECTORY:
+                self._not_walked.add(path)
+        else:
+            entry_type = ENTRY_TYPE_FILE
+        listing[0].append(base_name)
+        listing[1].append(entry_type)
+
+    def _add_directory(self, relative_dir: str) -> tuple:
+        parent_dir, _, base_name = relative_dir.rpartition(os.sep)
+        parent_listing = self._listings.get(parent_dir)
+        if parent_listing is None:
+            parent_listing = self._add_directory(parent_dir)
+        parent_listing[0].append(base_name)
+        parent_listing[1].append(ENTRY_TYPE_DIRECTORY)
+        listing = ([], bytearray())
+        self._listings[relative_dir] = listing
+        return listing
+
+    def _entry_type_in_working_tree(self, path: str) -> int:
+        file_path = os.path.join(self._root, path)
+        try:
+            mode = os.stat(file_path).st_mode
+        except OSError:
+            return ENTRY_TYPE_BROKEN_LINK if os.path.islink(file_path) else ENTRY_TYPE_OTHER
+        if stat.S_ISREG(mode):
+            return ENTRY_TYPE_FILE
+        if stat.S_ISDIR(mode):
+            return ENTRY_TYPE_DIRECTORY
+        return ENTRY_TYPE_OTHER
+
+
+class PathIndexFileSystem(FileSystem):
+    """
+    A FileSystem that answers questions about existence and types from a set of paths
+    of files - e.g. the output of "git ls-files".
+
+    The set is taken to be complete: a path that is not in it does not exist.
+    The directories are the directories of the files (and the current directory).
+    Paths are normalized textually (as os.path.normpath).
+
+    Directories are listed by the operating system.
+    """
+
+    def __init__(self, paths):
+        """
+        :param paths: Iterable of paths of files, relative to the current directory of the process,
+        or absolute. Paths that end with a separator are paths of directories.
+        """
+        self._cwd_prefix = os.path.join(os.getcwd(), '')
+        self._files = set()
+        self._dirs = {os.curdir}
+        for path in paths:
+            key = self._key(path)
+            if path.endswith(os.sep):
+                self._add_dir(key)
+            else:
+                self._files.add(key)
+                self._add_dir(os.path.dirname(key))
+
+    def __len__(self) -> int:
+        """Number of files"""
+        return len(self._files)
+
+    def exists(self, path: str) -> bool:
+        key = self._key(path)
+        return key in self._files or key in self._dirs
+
+    def is_file(self, path: str) -> bool:
+        return self._key(path) in self._files
+
+    def is_dir(self, path: str) -> bool:
+        return self._key(path) in self._dirs
+
+    def _add_dir(self, key: str):
+        dirs = self._dirs
+        while key and key not in dirs:
+            dirs.add(key)
+            key = os.path.dirname(key)
+
+    def _key(self, path: str) -> str:
+        if not path:
+            return path
+        key = os.path.normpath(path)
+        if key.startswith(self._cwd_prefix):
+            return key[len(self._cwd_prefix):]
+        if key == self._cwd_prefix[:-1]:
+            return os.curdir
+        return key
+
+
+def read_path_index(file_name: str) -> list:
+    """
+    Reads paths separated by new-lines, or by NUL characters (if there is one).
+
+    :raises OSError: The file cannot be read.
+    """
+    with open(file_name, mode="rb") as f:
+        contents = f.read()
+    separator = b"\0" if b"\0" in contents else b"\n"
+    return [os.fsdecode(path.rstrip(b"\r") if separator == b"\n" else path)
+            for path in contents.split(separator)
+            if path]
+
+
+###############################################################################
+# - caches -
+###############################################################################
+
+
+class ListFileCache:
+    """
+    Parsed list-files, for a single configuration of ParsingSettings.
+
+    A cached list-file is parsed again if it has been modified since
+    it was parsed - according to its modification time, size and inode.
+
+    Only files are cached - not stdin.
+    """
+
+    def __init__(self,
+                 max_num_files: int = 10000):
+        self._max_num_files = max_num_files
+        self._entries = collections.OrderedDict()
+
+    def processor_for(self,
+                      file_path: str,
+                      file_parser: ListFileParser,
+                      lines_source: LinesSource) -> ProcessorForListFile:
+        """
+        Gives the cached ProcessorForListFile of the file, or parses it
+        (using the given parser and lines source), if it is not cached or has been modified.
+        """
+        try:
+            stat_result = os.stat(file_path)
+        except OSError:
+            return file_parser.apply(lines_source)
+        key = (os.path.abspath(file_path),) + file_parser.cache_key()
+        validity = (stat_result.st_mtime_ns, stat_result.st_size, stat_result.st_ino)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == validity:
+            self._entries.move_to_end(key)
+            return entry[1]
+        processor = file_parser.apply(lines_source)
+        self._entries[key] = (validity, processor)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self._max_num_files:
+            self._entries.popitem(last=False)
+        return processor
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DirectoryListingCache:
+    """
+    Contents of directories - as given by list_directory.
+
+    A cached listing is read again if the modification time, status change time or inode
+    of the directory has changed (which it does when entries are added,
+    removed or renamed).
+
+    The least recently used listings are evicted when the cache is full.
+
+    The cache can be saved to a file, and loaded from it, so that listings are kept
+    between executions (--cache-dir).
+    """
+
+    FILE_FORMAT_VERSION = 2
+
+    # Listings of directories that have been modified this close to the time of listing
+    # are not saved, and not kept between executions - the directory may be modified
+    # again without a change of the modification time, if the resolution of the time
+    # of the file system is coarse.
+    RACY_MODIFICATION_INTERVAL_NS = 2 * 10 ** 9
+
+    def __init__(self,
+                 max_num_directories: int = 10000):
+        self._max_num_directories = max_num_directories
+        # absolute path -> (validity, listing, is racy)
+        self._entries = collections.OrderedDict()
+        self._is_modified = False
+
+    def list_directory(self, dir_path: str) -> tuple:
+        """
+        Gives the same result as list_directory.
+
+        The returned listing must not be modified.
+        """
+        try:
+            stat_result = os.stat(dir_path)
+        except OSError:
+            return list_directory(dir_path)
+        key = os.path.abspath(dir_path)
+        validity = (stat_result.st_mtime_ns, stat_result.st_ctime_ns, stat_result.st_ino)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == validity:
+            self._entries.move_to_end(key)
+            return entry[1]
+        listing = list_directory(dir_path)
+        is_racy = (time.time_ns() - max(stat_result.st_mtime_ns, stat_result.st_ctime_ns) <
+                   self.RACY_MODIFICATION_INTERVAL_NS)
+        self._entries[key] = (validity, listing, is_racy)
+        self._entries.move_to_end(key)
+        self._is_modified = True
+        if len(self._entries) > self._max_num_directories:
+            self._entries.popitem(last=False)
+        return listing
+
+    def forget_racy_listings(self):
+        """
+        Removes the listings of directories that may have been modified without a change
+        of their validity - so that they are read again when they are next used.
+
+        Used at the start of an execution, when the cache is kept between executions.
+        """
+        for key in [key for key, entry in self._entries.items() if entry[2]]:
+            del self._entries[key]
+
+    def load(self, file_name: str):
+        """
+        Loads the listings saved by save.
+
+        A missing or invalid file is ignored.
+        """
+        import marshal
+        try:
+            with open(file_name, mode="rb") as f:
+                version, entries = marshal.load(f)
+            if version != self.FILE_FORMAT_VERSION:
+                return
+            for key, validity, base_names, entry_types in entries:
+                self._entries[key] = (tuple(validity), (base_names, entry_types), False)
+        except (OSError, EOFError, ValueError, TypeError):
+            return
+        while len(self._entries) > self._max_num_directories:
+            self._entries.popitem(last=False)
+        self._is_modified = False
+
+    def save(self, file_name: str):
+        """
+        Saves the listings, if listings have been read since the cache was loaded.
+
+        Failure to save is ignored (since the cache is only an optimization).
+        """
+        if not self._is_modified:
+            return
+        import marshal
+        entries = [(key, entry[0], entry[1][0], entry[1][1])
+                   for key, entry in self._entries.items()
+                   if not entry[2]]
+        tmp_file_name = file_name + "." + str(os.getpid()) + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(file_name) or os.curdir, exist_ok=True)
+            with open(tmp_file_name, mode="wb") as f:
+                marshal.dump((self.FILE_FORMAT_VERSION, entries), f)
+            os.replace(tmp_file_name, file_name)
+        except OSError:
+            return
+        self._is_modified = False
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# The file of a DirectoryListingCache in the directory of --cache-dir.
+DIRECTORY_LISTINGS_CACHE_FILE_NAME = "directory-listings"
+
+
+class EvaluationCaches:
+    """
+    Caches that are kept between executions of the program in the same process.
+
+    Parsed list-files depends on the instruction prefix,
+    so there is one ListFileCache for each prefix.
+    List-files are not cached when a preprocessor is used, since
+    the output of the preprocessor may change without the file being modified.
+    """
+
+    def __init__(self):
+        self._list_file_caches = {}
+        self.directory_listing_cache = DirectoryListingCache()
+
+    def parsing_settings_with_caches(self,
+                                     parsing_settings: ParsingSettings,
+                                     instruction_prefix: str) -> ParsingSettings:
+        """
+        Gives the settings for an execution, with the caches.
+        """
+        self.directory_listing_cache.forget_racy_listings()
+        ret_val = copy.copy(parsing_settings)
+        ret_val.directory_listing_cache = self.directory_listing_cache
+        if parsing_settings.preprocessor_shell_command_or_none is None:
+            ret_val.list_file_cache = self._list_file_caches.setdefault(instruction_prefix,
+                                                                        ListFileCache())
+        return ret_val
+
+
+###############################################################################
+# - output -
+###############################################################################
+
+
+class ResultItemOutput:
+    """
+    Outputs the ResultItem:s that should be output (according to ResultItem.include_in_output).
+    """
+
+    def output(self,
+               result_item: ResultItem,
+               env: RenditionEnvironment):
+        raise NotImplementedError()
+
+    def output_renditions_of_file_paths(self, renditions):
+        """
+        Outputs file-paths that have already been rendered
+        (by a ResultItemOutput that holds them back until the last item - e.g. to sort them).
+
+        :param renditions: Iterable of str.
+        """
+        raise NotImplementedError()
+
+    def finish(self):
+        """
+        Called after the last item has been output.
+
+        Not called if the execution fails.
+        """
+        pass
+
+    def output_of_list_files_is_independent(self) -> bool:
+        """
+        Tells if the output of the items of a list-file is independent of
+        the items of other list-files (so that list-files can be processed separately).
+        """
+        return False
+
+    def accepts_result_item_batches(self) -> bool:
+        """
+        Tells if the items may be ResultItemForFilePaths (see ParsingSettings.result_item_batches).
+        """
+        return False
+
+    def is_complete(self) -> bool:
+        """
+        Tells if no more items will be output, so that the evaluation can stop.
+        """
+        return False
+
+
+class ResultItemOutputForPrinting(ResultItemOutput):
+    """
+    Prints each item on stdout.
+    """
+
+    def output(self,
+               result_item: ResultItem,
+               env: RenditionEnvironment):
+        print(result_item.rendition(env))
+
+    def output_renditions_of_file_paths(self, renditions):
+        for rendition in renditions:
+            print(rendition)
+
+    def output_of_list_files_is_independent(self) -> bool:
+        return True
+
+    def accepts_result_item_batches(self) -> bool:
+        return True
+
+
+class ResultItemOutputInformingObserver(ResultItemOutput):
+    """
+    Informs an Observer about each item, before it is given to another ResultItemOutput.
+    """
+
+    def __init__(self,
+                 observer: Observer,
+                 output: ResultItemOutput):
+        self._observer = observer
+        self._output = output
+
+    def output(self,
+               result_item: ResultItem,
+               env: RenditionEnvironment):
+        self._observer.item_emitted(result_item, result_item.rendition(env))
+        self._output.output(result_item, env)
+
+    def finish(self):
+        self._output.finish()
+
+
+class ResultItemOutputLimitingFilePaths(ResultItemOutput):
+    """
+    Gives each item to another ResultItemOutput, until a maximum number of
+    file-paths have been output - then the output is complete.
+
+    (A batch of file-paths is truncated, so that the maximum is not exceeded.)
+    """
+
+    def __init__(self,
+                 max_num_file_paths: int,
+                 output: ResultItemOutput):
+        self._num_remaining_file_paths = max_num_file_paths
+        self._output = output
+
+    def output(self,
+               result_item: ResultItem,
+               env: RenditionEnvironment):
+        if isinstance(result_item, ResultItemForFilePath):
+            self._num_remaining_file_paths -= 1
+        elif isinstance(result_item, ResultItemForFilePaths):
+            if len(result_item.file_names) > self._num_remaining_file_paths:
+                result_item = type(result_item)(result_item.file_names[:self._num_remaining_file_paths],
+                                                result_item.tags)
+            self._num_remaining_file_paths -= len(result_item.file_names)
+        self._output.output(result_item, env)
+
+    def output_renditions_of_file_paths(self, renditions):
+        self._output.output_renditions_of_file_paths(self._counted(renditions))
+
+    def _counted(self, renditions):
+        for rendition in itertools.islice(renditions, self._num_remaining_file_paths):
+            self._num_remaining_file_paths -= 1
+            yield rendition
+
+    def finish(self):
+        self._output.finish()
+
+    def accepts_result_item_batches(self) -> bool:
+        return self._output.accepts_result_item_batches()
+
+    def is_complete(self) -> bool:
+        return self._num_remaining_file_paths == 0
+
+
+###############################################################################
+# - unique output -
+###############################################################################
+# Repeated file-paths are suppressed while the output is streamed, so the
+# set of paths that have been output must be remembered.
+#
+# To make this scale to very many paths, only a hash of each path is
+# remembered - not the path itself:
+#
+#  - SeenSetOfHashes remembers the 64 bit hash of each path
+#    (about 60 bytes per path, as a Python set of int:s).
+#    Different paths get the same hash with a negligible probability -
+#    about 3 in a million for 10 million paths.
+#
+#  - SeenSetAsBloomFilter remembers the paths in Bloom filters
+#    (about 10 bits per path for a false positive rate of 1 %,
+#    and 1.5 bytes per path for 1 in a million).
+#    A new path is wrongly considered as seen (and not output)
+#    with a probability that is at most the given false positive rate.
+###############################################################################
+
+
+class SeenSet:
+    """
+    The set of keys that have been seen.
+    """
+
+    def add(self, key: str) -> bool:
+        """
+        Adds a key.
+
+        :return: If the key had (probably) been added before.
+        """
+        raise NotImplementedError()
+
+
+class SeenSetOfHashes(SeenSet):
+    """
+    Remembers the hash of the keys.
+    """
+
+    def __init__(self):
+        self._hashes = set()
+
+    def add(self, key: str) -> bool:
+        key_hash = hash(key)
+        if key_hash in self._hashes:
+            return True
+        self._hashes.add(key_hash)
+        return False
+
+
+class BloomFilter:
+    """
+    A Bloom filter with a fixed number of bits, for a given capacity and false positive rate.
+
+    The bit indexes of a key are derived from two hash values, by double hashing.
+    """
+
+    def __init__(self,
+                 capacity: int,
+                 false_positive_rate: float):
+        import math
+        num_bits = max(64, math.ceil(-capacity * math.log(false_positive_rate) / (math.log(2) ** 2)))
+        self.capacity = capacity
+        self.num_keys = 0
+        self._num_bits = num_bits
+        self._num_hashes = max(1, round(num_bits / capacity * math.log(2)))
+        self._bits = bytearray((num_bits + 7) // 8)
+
+    def contains(self,
+                 hash1: int,
+                 hash2: int) -> bool:
+        bits = self._bits
+        num_bits = self._num_bits
+        for i in range(self._num_hashes):
+            index = (hash1 + i * hash2) % num_bits
+            if not bits[index >> 3] & (1 << (index & 7)):
+                return False
+        return True
+
+    def add(self,
+            hash1: int,
+            hash2: int):
+        bits = self._bits
+        num_bits = self._num_bits
+        for i in range(self._num_hashes):
+            index = (hash1 + i * hash2) % num_bits
+            bits[index >> 3] |= 1 << (index & 7)
+        self.num_keys += 1
+
+    def is_full(self) -> bool:
+        return self.num_keys >= self.capacity
+
+
+class SeenSetAsBloomFilter(SeenSet):
+    """
+    Remembers the keys in a growing sequence of Bloom filters ("Scalable Bloom Filters"),
+    so that the number of keys need not be known in advance.
+
+    When a filter is full, a new filter is added, with twice the capacity and
+    half the false positive rate. So the total false positive rate is bounded by
+    the sum of the rates of all filters, which is the given rate.
+    """
+
+    INITIAL_CAPACITY = 1 << 16
+    CAPACITY_GROWTH = 2
+    FALSE_POSITIVE_RATE_TIGHTENING = 0.5
+
+    def __init__(self, false_positive_rate: float):
+        """
+        :param false_positive_rate: The maximum probability that a new key is considered as seen.
+        0 < false_positive_rate < 1.
+        """
+        self._next_false_positive_rate = false_positive_rate * (1 - self.FALSE_POSITIVE_RATE_TIGHTENING)
+        self._filters = []
+        self._add_filter(self.INITIAL_CAPACITY)
+
+    def add(self, key: str) -> bool:
+        hash1, hash2 = self._hashes(key)
+        for bloom_filter in self._filters:
+            if bloom_filter.contains(hash1, hash2):
+                return True
+        last_filter = self._filters[-1]
+        if last_filter.is_full():
+            last_filter = self._add_filter(last_filter.capacity * self.CAPACITY_GROWTH)
+        last_filter.add(hash1, hash2)
+        return False
+
+    def _add_filter(self, capacity: int) -> BloomFilter:
+        ret_val = BloomFilter(capacity, self._next_false_positive_rate)
+        self._next_false_positive_rate *= self.FALSE_POSITIVE_RATE_TIGHTENING
+        self._filters.append(ret_val)
+        return ret_val
+
+    @staticmethod
+    def _hashes(key: str) -> tuple:
+        import hashlib
+        digest = hashlib.blake2b(key.encode(errors="surrogateescape"), digest_size=16).digest()
+        # The second hash must be odd, so that the indexes of a key are not all the same.
+        return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+
+
+class ResultItemOutputSuppressingRepeatedFilePaths(ResultItemOutput):
+    """
+    Gives each item to another ResultItemOutput - except file-paths that have already been output.
+
+    File-paths are compared as rendered, but normalized (so that e.g. "a/./b" and "a/b" are the same),
+    and together with their tags, if tags are output.
+    The first occurrence of a file-path is output.
+    """
+
+    def __init__(self,
+                 seen_set: SeenSet,
+                 output: ResultItemOutput):
+        self._seen_set = seen_set
+        self._output = output
+
+    def output(self,
+               result_item: ResultItem,
+               env: RenditionEnvironment):
+        if isinstance(result_item, ResultItemForFilePath):
+            key = env.rendition_settings.tags_settings.render_path(
+                result_item.tags,
+                os.path.normpath(env.render_file_name(result_item.file_name)))
+            if self._seen_set.add(key):
+                return
+        self._output.output(result_item, env)
+
+    def finish(self):
+        self._output.finish()
+
+    def is_complete(self) -> bool:
+        return self._output.is_complete()
+
+
+###############################################################################
+# - sorted output -
+###############################################################################
+# The file-paths of the whole output are sorted by an external merge sort:
+# the rendered file-paths are collected in memory, and when the collected
+# paths exceed a size limit, they are sorted and written ("spilled") to a
+# temporary file, as a sorted run. When all file-paths have been collected,
+# the runs are merged.
+#
+# A run is a sequence of marshal:ed lists of records - so that paths may
+# contain any character.
+#
+# A record is the rendered output line, if tags are not output, and
+# otherwise (rendered path without tags, rendered output line), so that
+# records are sorted on the path.
+###############################################################################
+
+
+SIZE_SUFFIX_MULTIPLIERS = {
+    "K": 1 << 10,
+    "M": 1 << 20,
+    "G": 1 << 30,
+}
+
+DEFAULT_SORT_BUFFER_SIZE = 256 << 20
+
+
+def parse_size(option_argument: str) -> int:
+    """
+    Parses a number of bytes, with an optional suffix K, M or G (powers of 1024).
+    """
+    number = option_argument
+    multiplier = 1
+    suffix = option_argument[-1:].upper()
+    if suffix in SIZE_SUFFIX_MULTIPLIERS:
+        number = option_argument[:-1]
+        multiplier = SIZE_SUFFIX_MULTIPLIERS[suffix]
+    if not (number.isascii() and number.isdigit()):
+        raise argparse.ArgumentTypeError("invalid size: " + option_argument)
+    return int(number) * multiplier
+
+
+class SortedRuns:
+    """
+    Sorts records that may not fit in memory.
+
+    Records are added in any order, and are given sorted by merged_records.
+    """
+
+    # The approximate memory used by a record, in addition to its strings.
+    RECORD_OVERHEAD = 120
+
+    NUM_RECORDS_PER_CHUNK = 1000
+
+    # The maximum number of runs that are merged at the same time.
+    # When there are more runs, they are first merged into a single run.
+    MAX_NUM_RUNS_TO_MERGE = 64
+
+    def __init__(self, memory_limit: int):
+        """
+        :param memory_limit: The approximate number of bytes of records that are kept in memory.
+        """
+        self._memory_limit = memory_limit
+        self._records = []
+        self._size_of_records = 0
+        self._runs = []
+
+    def add(self,
+            record,
+            size: int):
+        """
+        :param record: A str, or a tuple.
+        :param size: The total length of the strings of the record.
+        """
+        self._records.append(record)
+        self._size_of_records += size + self.RECORD_OVERHEAD
+        if self._size_of_records > self._memory_limit:
+            self._records.sort()
+            self._add_run(self._records)
+            self._records = []
+            self._size_of_records = 0
+
+    def merged_records(self):
+        """
+        Gives all records, sorted.
+
+        The records must not be added after this method is called.
+        """
+        self._records.sort()
+        if not self._runs:
+            return iter(self._records)
+        import heapq
+        return heapq.merge(*[self._records_of_run(run) for run in self._runs],
+                           self._records)
+
+    def close(self):
+        """Removes the temporary files of the runs."""
+        for run in self._runs:
+            run.close()
+        self._runs = []
+
+    def _add_run(self, sorted_records):
+        if len(self._runs) == self.MAX_NUM_RUNS_TO_MERGE:
+            import heapq
+            runs = self._runs
+            self._runs = []
+            self._add_run(heapq.merge(*[self._records_of_run(run) for run in runs]))
+            for run in runs:
+                run.close()
+        import marshal
+        import tempfile
+        run = tempfile.TemporaryFile(prefix="filelist-sort-")
+        self._runs.append(run)
+        chunk = []
+        for record in sorted_records:
+            chunk.append(record)
+            if len(chunk) == self.NUM_RECORDS_PER_CHUNK:
+                marshal.dump(chunk, run)
+                chunk = []
+        if chunk:
+            marshal.dump(chunk, run)
+        run.flush()
+
+    @staticmethod
+    def _records_of_run(run):
+        import marshal
+        run.seek(0)
+        while True:
+            try:
+                chunk = marshal.load(run)
+            except EOFError:
+                return
+            for record in chunk:
+                yield record
+
+
+class ResultItemOutputForSortedFilePaths(ResultItemOutput):
+    """
+    Outputs the file-paths sorted, after the last item.
+
+    Items other than file-paths are given to another ResultItemOutput, directly.
+    """
+
+    def __init__(self,
+                 memory_limit: int,
+                 output: ResultItemOutput,
+                 max_num_file_paths: int = None):
+        """
+        :param memory_limit: The approximate number of bytes used for file-paths,
+        before they are spilled to temporary files.
+        :param max_num_file_paths: None, or the number of (first) sorted file-paths to output.
+        """
+        self._sorted_runs = SortedRuns(memory_limit)
+        self._output = output
+        self._max_num_file_paths = max_num_file_paths
+
+    def output(self,
+               result_item: ResultItem,
+               env: RenditionEnvironment):
+        if not isinstance(result_item, ResultItemForFilePath):
+            self._output.output(result_item, env)
+            return
+        line = result_item.rendition(env)
+        if env.rendition_settings.tags_settings.is_output_tags():
+            path = env.render_file_name(result_item.file_name)
+            self._sorted_runs.add((path, line), len(path) + len(line))
+        else:
+            self._sorted_runs.add(line, len(line))
+
+    def finish(self):
+        try:
+            records = itertools.islice(self._sorted_runs.merged_records(), self._max_num_file_paths)
+            self._output.output_renditions_of_file_paths(
+                record if isinstance(record, str) else record[1]
+                for record in records
+            )
+        finally:
+            self._sorted_runs.close()
+        self._output.finish()
+
+
+###############################################################################
+# - snapshots -
+###############################################################################
+# A snapshot is the set of file-paths output by an execution, together with
+# their tags.
+#
+# The paths are rendered according to the rendition settings, but without tags.
+#
+# The file format is a header line, followed by a line for each path,
+# sorted on the path. To make the file compact, the paths are front coded:
+# each line stores the length of the prefix that the path has in common with
+# the path of the previous line, together with the rest of the path:
+#
+# COMMON-PREFIX-LENGTH TAB TAGS TAB REST-OF-PATH
+#
+# TAGS is a comma separated list (tags cannot contain commas).
+#
+# Paths cannot contain newlines.
+###############################################################################
+
+
+SNAPSHOT_HEADER = "filelist-snapshot 1"
+SNAPSHOT_ENCODING = "utf-8"
+SNAPSHOT_ENCODING_ERRORS = "surrogateescape"
+
+
+class SnapshotException(ExecutionException):
+    """A snapshot file cannot be read."""
+
+    def __init__(self,
+                 file_name: str,
+                 message: str):
+        self.file_name = file_name
+        self.message = message
+
+    def render(self, o_stream):
+        write_lines(o_stream,
+                    [error_header_line("Invalid snapshot file: " + in_double_quotes(self.file_name)),
+                     ERROR_MESSAGE_INDENT_STRING + self.message])
+
+
+class SnapshotPathException(SnapshotException):
+    """A file-path cannot be stored in a snapshot."""
+
+    def __init__(self,
+                 file_name: str,
+                 path: str):
+        super().__init__(file_name, "A file-path contains a newline: " + repr(path))
+
+    def render(self, o_stream):
+        write_lines(o_stream,
+                    [error_header_line("Cannot record file-path in snapshot: " + in_double_quotes(self.file_name)),
+                     ERROR_MESSAGE_INDENT_STRING + self.message])
+
+
+def write_snapshot(o_stream,
+                   sorted_entries):
+    """
+    :param sorted_entries: Iterable of (path, tags), sorted on path, without duplicate paths.
+    """
+    for _ in written_snapshot_entries(o_stream, sorted_entries):
+        pass
+
+
+def written_snapshot_entries(o_stream,
+                             sorted_entries):
+    """
+    Writes a snapshot, one entry at a time, as the entries are consumed.
+
+    :param sorted_entries: Iterable of (path, tags), sorted on path, without duplicate paths.
+    :return: Iterator of the entries, each given after it has been written.
+    """
+    o_stream.write(SNAPSHOT_HEADER + "\n")
+    previous_path = ""
+    for path, tags in sorted_entries:
+        common_prefix_length = len(os.path.commonprefix([previous_path, path]))
+        o_stream.write("".join([str(common_prefix_length),
+                                "\t",
+                                ",".join(sorted(tags)),
+                                "\t",
+                                path[common_prefix_length:],
+                                "\n"]))
+        previous_path = path
+        yield path, tags
+
+
+def snapshot_entries_with_unique_paths(sorted_records):
+    """
+    Merges the tags of records with the same path.
+
+    :param sorted_records: Iterable of (path, tuple of tags), sorted on path.
+    :return: Iterator of (path, tags), sorted on path, without duplicate paths.
+    """
+    for path, records in itertools.groupby(sorted_records, key=lambda record: record[0]):
+        tags = frozenset()
+        for _, tags_of_record in records:
+            tags = tags.union(tags_of_record)
+        yield path, tags
+
+
+def read_snapshot(file_name: str,
+                  i_stream):
+    """
+    Gives the entries of a snapshot, one at a time.
+
+    :return: Iterator of (path, tags), sorted on path.
+    :raises SnapshotException: The snapshot is invalid.
+    """
+    if i_stream.readline().rstrip("\n") != SNAPSHOT_HEADER:
+        raise SnapshotException(file_name, "Not a snapshot file (invalid header line).")
+    path = ""
+    line_number = 1
+    for line in i_stream:
+        line_number += 1
+        try:
+            common_prefix_length_string, tags_string, rest_of_path = line.rstrip("\n").split("\t", 2)
+            common_prefix_length = int(common_prefix_length_string)
+        except ValueError:
+            raise SnapshotException(file_name, "Invalid line " + str(line_number) + ".")
+        if common_prefix_length > len(path):
+            raise SnapshotException(file_name, "Invalid prefix length on line " + str(line_number) + ".")
+        path = path[:common_prefix_length] + rest_of_path
+        yield path, frozenset(tags_string.split(",")) if tags_string else frozenset()
+
+
+def snapshot_changes(previous_entries,
+                     current_entries,
+                     compare_tags: bool):
+    """
+    Merges two sorted sequences of snapshot entries, and gives the differences.
+
+    Only one entry of each sequence is held at a time.
+
+    :param previous_entries: Iterable of (path, tags), sorted on path.
+    :param current_entries: Iterable of (path, tags), sorted on path.
+    :param compare_tags: If True, a path who's tags have changed is reported
+    as removed (with the previous tags) and added (with the current tags).
+    :return: Iterator of (is_added, path, tags), sorted on path.
+    """
+    previous_iterator = iter(previous_entries)
+    current_iterator = iter(current_entries)
+    previous = next(previous_iterator, None)
+    current = next(current_iterator, None)
+    while previous is not None and current is not None:
+        if previous[0] < current[0]:
+            yield False, previous[0], previous[1]
+            previous = next(previous_iterator, None)
+        elif current[0] < previous[0]:
+            yield True, current[0], current[1]
+            current = next(current_iterator, None)
+        else:
+            if compare_tags and previous[1] != current[1]:
+                yield False, previous[0], previous[1]
+                yield True, current[0], current[1]
+            previous = next(previous_iterator, None)
+            current = next(current_iterator, None)
+    while previous is not None:
+        yield False, previous[0], previous[1]
+        previous = next(previous_iterator, None)
+    while current is not None:
+        yield True, current[0], current[1]
+        current = next(current_iterator, None)
+
+
+class ResultItemOutputForSnapshots(ResultItemOutput):
+    """
+    Records the set of file-paths that are output, for writing a snapshot and/or
+    outputting the differences compared to a previous snapshot.
+
+    If there is a previous snapshot, only the differences are output - after the last item -
+    as the path preceded by "+" (added) or "-" (removed).
+    Otherwise, items are output by another ResultItemOutput.
+
+    The file-paths are sorted by SortedRuns, so that they need not fit in memory,
+    and are merged with the previous snapshot, one entry at a time.
+
+    The snapshot is written when all items have been output, so that
+    the previous snapshot and the new snapshot may be the same file.
+    """
+
+    ADDED_PREFIX = "+"
+    REMOVED_PREFIX = "-"
+
+    def __init__(self,
+                 snapshot_file_or_none: str,
+                 previous_snapshot_file_or_none: str,
+                 tags_settings: TagsRenditionSettings,
+                 output: ResultItemOutput,
+                 memory_limit: int = DEFAULT_SORT_BUFFER_SIZE):
+        """
+        :param memory_limit: The approximate number of bytes used for file-paths,
+        before they are spilled to temporary files.
+        """
+        self._snapshot_file_or_none = snapshot_file_or_none
+        self._previous_snapshot_file_or_none = previous_snapshot_file_or_none
+        self._tags_settings = tags_settings
+        self._output = output
+        self._sorted_runs = SortedRuns(memory_limit)
+
+    def output(self,
+               result_item: ResultItem,
+               env: RenditionEnvironment):
+        if isinstance(result_item, ResultItemForFilePath):
+            path = env.render_file_name(result_item.file_name)
+            if "\n" in path:
+                raise SnapshotPathException(self._snapshot_file_or_none or self._previous_snapshot_file_or_none,
+                                            path)
+            tags = tuple(sorted(result_item.tags))
+            self._sorted_runs.add((path, tags), len(path) + sum(map(len, tags)))
+        if self._previous_snapshot_file_or_none is None:
+            self._output.output(result_item, env)
+
+    def finish(self):
+        try:
+            entries = snapshot_entries_with_unique_paths(self._sorted_runs.merged_records())
+            if self._previous_snapshot_file_or_none is None:
+                self._output.finish()
+                if self._snapshot_file_or_none is not None:
+                    self._write_snapshot(lambda written_entries: None, entries)
+            elif self._snapshot_file_or_none is None:
+                self._print_changes(entries)
+            else:
+                self._write_snapshot(self._print_changes, entries)
+        finally:
+            self._sorted_runs.close()
+
+    def _print_changes(self, sorted_entries):
+        file_name = self._previous_snapshot_file_or_none
+        try:
+            i_stream = open(file_name,
+                            encoding=SNAPSHOT_ENCODING,
+                            errors=SNAPSHOT_ENCODING_ERRORS,
+                            newline="\n")
+        except OSError:
+            self._exit_invalid_file("Cannot open file: ", file_name)
+        with i_stream:
+            changes = snapshot_changes(read_snapshot(file_name, i_stream),
+                                       sorted_entries,
+                                       self._tags_settings.is_output_tags())
+            for is_added, path, tags in changes:
+                print((self.ADDED_PREFIX if is_added else self.REMOVED_PREFIX) +
+                      self._tags_settings.render_path(tags, path))
+
+    def _write_snapshot(self,
+                        consume_written_entries,
+                        sorted_entries):
+        """
+        Writes the snapshot, while the entries are consumed by a function.
+
+        :param consume_written_entries: Given an iterable of the entries - each entry
+        is written when it is taken from the iterable. The entries that it does not
+        consume are written afterwards.
+        """
+        tmp_file_name = self._snapshot_file_or_none + ".tmp"
+        try:
+            with open(tmp_file_name,
+                      mode="w",
+                      encoding=SNAPSHOT_ENCODING,
+                      errors=SNAPSHOT_ENCODING_ERRORS,
+                      newline="\n") as o_stream:
+                written_entries = written_snapshot_entries(o_stream, sorted_entries)
+                consume_written_entries(written_entries)
+                for _ in written_entries:
+                    pass
+            os.replace(tmp_file_name, self._snapshot_file_or_none)
+        except BrokenPipeError:
+            # stdout is closed (while the changes are printed).
+            raise
+        except OSError:
+            self._exit_invalid_file("Cannot write file: ", self._snapshot_file_or_none)
+        finally:
+            if os.path.lexists(tmp_file_name):
+                os.remove(tmp_file_name)
+
+    @staticmethod
+    def _exit_invalid_file(message: str,
+                           file_name: str):
+        write_lines(sys.stderr,
+                    [error_header_line(message + in_double_quotes(file_name))])
+        sys.exit(EXIT_INVALID_ARGUMENTS)
+
+
+###############################################################################
+# - dependencies -
+###############################################################################
+# The output of an execution is derived from the list-files and the
+# directories listed by LIST and FIND.
+#
+# These can be written to a dependency file, in the format of Make (which is
+# also read by Ninja), so that a build system can tell when the output may
+# have changed:
+#
+#   TARGET: DEPENDENCY...
+###############################################################################
+
+
+class DependencyRecorder(Observer):
+    """
+    Records the files and directories that the output of an execution is derived from:
+    the list-files that are used, and the directories that are listed by LIST and FIND.
+
+    Each is recorded once, in the order they are first used.
+    """
+
+    def __init__(self):
+        # dict:s are used as sets that preserve the order.
+        self._list_files = {}
+        self._directories = {}
+
+    def list_files(self) -> list:
+        return list(self._list_files)
+
+    def directories(self) -> list:
+        return list(self._directories)
+
+    def list_file_used(self, file_name):
+        self._list_files[os.path.normpath(file_name)] = None
+
+    def directory_listed(self, source, directory_path, num_entries, start_time, duration):
+        self._directories[os.path.normpath(directory_path)] = None
+
+
+DEPFILE_SUFFIX = ".d"
+
+
+def write_depfile(depfile: str,
+                  target: str,
+                  dependency_recorder: DependencyRecorder):
+    """
+    Writes a dependency file, and exits if it cannot be written.
+    """
+    dependencies = dependency_recorder.list_files() + dependency_recorder.directories()
+    lines = [make_escaped(target) + ":" + (" \\" if dependencies else "")]
+    for i, dependency in enumerate(dependencies):
+        lines.append("  " + make_escaped(dependency) + (" \\" if i < len(dependencies) - 1 else ""))
+    tmp_file_name = depfile + ".tmp"
+    try:
+        with open(tmp_file_name, mode="w", newline="\n") as o_stream:
+            write_lines(o_stream, lines)
+        os.replace(tmp_file_name, depfile)
+    except OSError:
+        write_lines(sys.stderr,
+                    [error_header_line("Cannot write file: " + in_double_quotes(depfile))])
+        sys.exit(EXIT_INVALID_ARGUMENTS)
+
+
+def make_escaped(file_name: str) -> str:
+    """
+    Escapes a file name for a rule of Make (and Ninja).
+    """
+    return (file_name
+            .replace("$", "$$")
+            .replace("#", "\\#")
+            .replace(" ", "\\ "))
+
+
+###############################################################################
+# - manifests -
+###############################################################################
+# A manifest is the output of an execution, in a compact binary format.
+# It is output again by --from-manifest, without parsing list-files or
+# accessing the file system (except for reading the manifest, which is
+# memory mapped).
+#
+# File-paths are split into a directory prefix, that is shared by all
+# paths in the directory, and a base name.
+#
+# All integers are little endian.
+# Strings are UTF-8, with surrogate escapes.
+#
+#   HEADER       MANIFEST_MAGIC, flags (u32)
+#   PREFIXES     string table - the directory prefixes of the paths
+#                (including the trailing separator)
+#   TAG SETS     string table - tag sets, as the tags separated by space
+#   LIST-FILES   string table - the list-files that the output is derived from
+#   DIRECTORIES  string table - the directories listed by LIST and FIND
+#   RECORDS      number of records N (u64), followed by N records:
+#                prefix id (u32), tag set id (u32), base name offset (u64)
+#   BASE NAMES   size (u64), followed by the base names of all records,
+#                in the order of the records
+#
+# A string table is: number of strings N (u64), followed by N + 1 offsets
+# (u64) into the data, followed by the data.
+#
+# The base name of a record ends where the base name of the next record
+# begins.
+# A record who's prefix id is MANIFEST_NON_PATH_PREFIX_ID is a line of other
+# output than a file-path (e.g. from PRINT), and its "base name" is the line.
+#
+# Flags: MANIFEST_FLAG_PREPEND_TAGS, MANIFEST_FLAG_APPEND_TAGS.
+###############################################################################
+
+
+MANIFEST_MAGIC = b"filelist-manifest 1\n"
+
+MANIFEST_FLAG_PREPEND_TAGS = 1
+MANIFEST_FLAG_APPEND_TAGS = 2
+
+MANIFEST_NON_PATH_PREFIX_ID = 0xffffffff
+
+MANIFEST_ENCODING = "utf-8"
+MANIFEST_ENCODING_ERRORS = "surrogateescape"
+
+_MANIFEST_FLAGS_FORMAT = "<I"
+_MANIFEST_COUNT_FORMAT = "<Q"
+_MANIFEST_RECORD_FORMAT = "<IIQ"
+
+
+class ManifestException(ExecutionException):
+    """A manifest file cannot be read."""
+
+    def __init__(self,
+                 file_name: str,
+                 message: str):
+        self.file_name = file_name
+        self.message = message
+
+    def render(self, o_stream):
+        write_lines(o_stream,
+                    [error_header_line("Invalid manifest file: " + in_double_quotes(self.file_name)),
+                     ERROR_MESSAGE_INDENT_STRING + self.message])
+
+
+class ResultItemOutputForManifest(ResultItemOutput):
+    """
+    Writes the items to a manifest, instead of outputting them.
+
+    The manifest is written when all items have been output.
+    """
+
+    def __init__(self,
+                 manifest_file: str,
+                 tags_settings: TagsRenditionSettings,
+                 dependency_recorder: DependencyRecorder):
+        """
+        :param dependency_recorder: Must be informed about the execution.
+        """
+        self._manifest_file = manifest_file
+        self._tags_settings = tags_settings
+        self._dependency_recorder = dependency_recorder
+        self._prefix_ids = {}
+        self._tag_set_ids = {}
+        self._record_prefix_ids = array.array("I")
+        self._record_tag_set_ids = array.array("I")
+        self._record_base_name_offsets = array.array("Q")
+        self._base_names = bytearray()
+
+    def output(self,
+               result_item: ResultItem,
+               env: RenditionEnvironment):
+        if isinstance(result_item, ResultItemForFilePath):
+            path = env.render_file_name(result_item.file_name)
+            base_name_start = path.rfind(os.sep) + 1
+            prefix_id = self._prefix_ids.setdefault(path[:base_name_start], len(self._prefix_ids))
+            tag_set_id = self._tag_set_ids.setdefault(self._tags_settings.render_print_tags(result_item.tags),
+                                                      len(self._tag_set_ids))
+            self._add_record(prefix_id, tag_set_id, path[base_name_start:])
+        else:
+            self._add_record(MANIFEST_NON_PATH_PREFIX_ID, 0, result_item.rendition(env))
+
+    def _add_record(self,
+                    prefix_id: int,
+                    tag_set_id: int,
+                    base_name: str):
+        self._record_prefix_ids.append(prefix_id)
+        self._record_tag_set_ids.append(tag_set_id)
+        self._record_base_name_offsets.append(len(self._base_names))
+        self._base_names += base_name.encode(MANIFEST_ENCODING, MANIFEST_ENCODING_ERRORS)
+
+    def finish(self):
+        tmp_file_name = self._manifest_file + ".tmp"
+        try:
+            with open(tmp_file_name, mode="wb") as o_stream:
+                self._write(o_stream)
+            os.replace(tmp_file_name, self._manifest_file)
+        except OSError:
+            write_lines(sys.stderr,
+                        [error_header_line("Cannot write file: " + in_double_quotes(self._manifest_file))])
+            sys.exit(EXIT_INVALID_ARGUMENTS)
+
+    def _write(self, o_stream):
+        import struct
+        flags = 0
+        if self._tags_settings.is_prepend():
+            flags |= MANIFEST_FLAG_PREPEND_TAGS
+        if self._tags_settings.is_append():
+            flags |= MANIFEST_FLAG_APPEND_TAGS
+        o_stream.write(MANIFEST_MAGIC)
+        o_stream.write(struct.pack(_MANIFEST_FLAGS_FORMAT, flags))
+        for strings in [list(self._prefix_ids),
+                        list(self._tag_set_ids),
+                        self._dependency_recorder.list_files(),
+                        self._dependency_recorder.directories()]:
+            _write_manifest_string_table(o_stream, strings)
+        num_records = len(self._record_prefix_ids)
+        o_stream.write(struct.pack(_MANIFEST_COUNT_FORMAT, num_records))
+        record_struct = struct.Struct(_MANIFEST_RECORD_FORMAT)
+        records = bytearray(num_records * record_struct.size)
+        for i, record in enumerate(zip(self._record_prefix_ids,
+                                       self._record_tag_set_ids,
+                                       self._record_base_name_offsets)):
+            record_struct.pack_into(records, i * record_struct.size, *record)
+        o_stream.write(records)
+        o_stream.write(struct.pack(_MANIFEST_COUNT_FORMAT, len(self._base_names)))
+        o_stream.write(self._base_names)
+
+
+def _write_manifest_string_table(o_stream,
+                                 strings: list):
+    import struct
+    encoded_strings = [s.encode(MANIFEST_ENCODING, MANIFEST_ENCODING_ERRORS)
+                       for s in strings]
+    offsets = [0]
+    for encoded_string in encoded_strings:
+        offsets.append(offsets[-1] + len(encoded_string))
+    o_stream.write(struct.pack("<" + str(len(offsets) + 1) + "Q", len(strings), *offsets))
+    o_stream.write(b"".join(encoded_strings))
+
+
+class Manifest:
+    """
+    A manifest file, that is memory mapped.
+
+    The file must be closed by close.
+    """
+
+    def __init__(self, file_name: str):
+        """
+        :raises FileArgumentException: The file cannot be opened.
+        :raises ManifestException: The file is not a valid manifest.
+        """
+        import mmap
+        import struct
+        self.file_name = file_name
+        try:
+            with open(file_name, mode="rb") as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            # ValueError: The file is empty.
+            if os.path.isfile(file_name):
+                raise ManifestException(file_name, "Not a manifest file.")
+            raise FileArgumentException(file_name)
+        try:
+            self._read_sections()
+        except (ValueError, struct.error):
+            self.close()
+            raise ManifestException(file_name, "Not a manifest file, or the file is corrupt.")
+
+    def close(self):
+        self._mmap.close()
+
+    def list_files(self) -> list:
+        """The list-files that the output is derived from."""
+        return self._list_files
+
+    def directories(self) -> list:
+        """The directories listed by LIST and FIND, that the output is derived from."""
+        return self._directories
+
+    def lines(self):
+        """
+        Gives the output lines, one at a time.
+
+        :raises ManifestException: The file is corrupt.
+        """
+        import struct
+        tags_settings = TagsRenditionSettings(bool(self._flags & MANIFEST_FLAG_PREPEND_TAGS),
+                                              bool(self._flags & MANIFEST_FLAG_APPEND_TAGS))
+        tag_sets = [frozenset(tags_string.split()) for tags_string in self._tag_sets]
+        prefixes = self._prefixes
+        data = self._mmap
+        base_names_start = self._base_names_start
+
+        def line(record: tuple, base_name_end: int) -> str:
+            prefix_id, tag_set_id, base_name_start = record
+            base_name = data[base_names_start + base_name_start:
+                             base_names_start + base_name_end].decode(MANIFEST_ENCODING,
+                                                                      MANIFEST_ENCODING_ERRORS)
+            if prefix_id == MANIFEST_NON_PATH_PREFIX_ID:
+                return base_name
+            return tags_settings.render_path(tag_sets[tag_set_id], prefixes[prefix_id] + base_name)
+
+        record_struct = struct.Struct(_MANIFEST_RECORD_FORMAT)
+        previous_record = None
+        try:
+            for position in range(self._records_start, self._records_end, record_struct.size):
+                record = record_struct.unpack_from(data, position)
+                if previous_record is not None:
+                    yield line(previous_record, record[2])
+                previous_record = record
+            if previous_record is not None:
+                yield line(previous_record, self._base_names_size)
+        except IndexError:
+            raise ManifestException(self.file_name, "The file is corrupt.")
+
+    def _read_sections(self):
+        import struct
+        data = self._mmap
+        if data[:len(MANIFEST_MAGIC)] != MANIFEST_MAGIC:
+            raise ValueError("invalid header")
+        position = len(MANIFEST_MAGIC)
+        self._flags, = struct.unpack_from(_MANIFEST_FLAGS_FORMAT, data, position)
+        position += struct.calcsize(_MANIFEST_FLAGS_FORMAT)
+        self._prefixes, position = self._read_string_table(position)
+        self._tag_sets, position = self._read_string_table(position)
+        self._list_files, position = self._read_string_table(position)
+        self._directories, position = self._read_string_table(position)
+        num_records, = struct.unpack_from(_MANIFEST_COUNT_FORMAT, data, position)
+        self._records_start = position + 8
+        self._records_end = self._records_start + num_records * struct.calcsize(_MANIFEST_RECORD_FORMAT)
+        self._base_names_size, = struct.unpack_from(_MANIFEST_COUNT_FORMAT, data, self._records_end)
+        self._base_names_start = self._records_end + 8
+        if self._base_names_start + self._base_names_size != len(data):
+            raise ValueError("invalid size")
+
+    def _read_string_table(self, position: int) -> tuple:
+        """
+        :return: (list of strings, position after the table)
+        """
+        import struct
+        data = self._mmap
+        num_strings, = struct.unpack_from(_MANIFEST_COUNT_FORMAT, data, position)
+        offsets = struct.unpack_from("<" + str(num_strings + 1) + "Q", data, position + 8)
+        start = position + 8 * (num_strings + 2)
+        end = start + offsets[-1]
+        if end > len(data):
+            raise ValueError("invalid string table")
+        strings = [data[start + offsets[i]:start + offsets[i + 1]].decode(MANIFEST_ENCODING,
+                                                                        MANIFEST_ENCODING_ERRORS)
+                   for i in range(num_strings)]
+        return strings, end
+
+
+def output_manifest(file_name: str):
+    """
+    Outputs the lines of a manifest.
+
+    :raises FileArgumentException: The file cannot be opened.
+    :raises ManifestException: The file is not a valid manifest.
+    """
+    manifest = Manifest(file_name)
+    try:
+        write = sys.stdout.write
+        chunk = []
+        for line in manifest.lines():
+            chunk.append(line)
+            if len(chunk) == 1000:
+                chunk.append("")
+                write("\n".join(chunk))
+                chunk = []
+        if chunk:
+            chunk.append("")
+            write("\n".join(chunk))
+    finally:
+        manifest.close()
+
+
+###############################################################################
+# - Command -
+###############################################################################
+
+
+class FileArgumentException(ExecutionException):
+    """A list-file given as argument to the program cannot be opened."""
+
+    def __init__(self,
+                 file_name: str):
+        self.file_name = file_name
+
+    def render(self, o_stream):
+        write_lines(o_stream,
+                    [error_header_line("Cannot open file: " +
+                                       in_double_quotes(self.file_name))])
+
+
+class PreprocessorException(ExecutionException):
+    def __init__(self,
+                 called_process_error: "subprocess.CalledProcessError"):
+        self._called_process_error = called_process_error
+
+    def render(self, o_stream):
+        write_lines(o_stream,
+                    [
+                        "Preprocessor failed.",
+                        "Command exit code: " + str(self._called_process_error.returncode)
+                    ])
+        if self._called_process_error.output:
+            write_lines(o_stream,
+                        [
+                            "Output from preprocessor:",
+                            self._called_process_error.output,
+                        ])
+
+
+class LinesSourceForFileBase(LinesSource):
+    def __init__(self,
+                 parsing_settings: ParsingSettings):
+        self._parsing_settings = parsing_settings
+
+    def _open_file(self):
+        raise NotImplementedError()
+
+    def __iter__(self):
+        if self._parsing_settings.preprocessor_shell_command_or_none:
+            raw_lines = self._raw_lines_from_processed_file(self._parsing_settings.preprocessor_shell_command_or_none)
+        else:
+            raw_lines = self._raw_lines_directly_from_file()
+        return self._from_raw_lines(raw_lines)
+
+    def _raw_lines_directly_from_file(self):
+        # Read all lines from the file so that we can close it before
+        # opening any included files.
+        # This prevents exhausting the number of open files.
+        open_file = self._open_file()
+        raw_lines = open_file.readlines()
+        open_file.close()
+        return raw_lines
+
+    def _raw_lines_from_processed_file(self,
+                                       preprocessor_shell_command: str):
+        import subprocess
+        open_file = self._open_file()
+        try:
+            output = check_output_of_shell_command(self._parsing_settings.observer,
+                                                   None,
+                                                   preprocessor_shell_command,
+                                                   stdin=open_file)
+        except subprocess.CalledProcessError as ex:
+            raise PreprocessorException(ex)
+        finally:
+            # The preprocessor may have modified files and directories, as SHELL may.
+            self._parsing_settings.file_system.invalidate()
+        open_file.close()
+        raw_lines = output.splitlines()
+        return raw_lines
+
+    @staticmethod
+    def _from_raw_lines(raw_lines: list):
+        lines = []
+        for lineWithPossibleNewLine in raw_lines:
+            lines.append(lineWithPossibleNewLine.strip("\n").rstrip())
+        return iter(lines)
+
+
+class LinesSourceForFileArgument(LinesSourceForFileBase):
+    """
+    A LinesSource for file arguments on the command line.
+    """
+    def __init__(self,
+                 parsing_settings: ParsingSettings,
+                 file_name: str):
+        LinesSourceForFileBase.__init__(self, parsing_settings)
+        self._file_name = file_name
+
+    def _open_file(self):
+        try:
+            return open(self._file_name,
+                        mode="r")
+        except OSError:
+            raise FileArgumentException(self._file_name)
+
+
+class LinesSourceForStdin(LinesSourceForFileBase):
+    """
+    A LinesSource for file arguments on the command line.
+    """
+    def __init__(self,
+                 parsing_settings: ParsingSettings):
+        LinesSourceForFileBase.__init__(self, parsing_settings)
+
+    def _open_file(self):
+        return sys.stdin
+
+
+class LinesSourceForNamedFileBase(LinesSourceForFileBase):
+    def __init__(self,
+                 parsing_settings: ParsingSettings,
+                 file_name: str):
+        LinesSourceForFileBase.__init__(self, parsing_settings)
+        self._file_name = file_name
+
+    def _open_file(self):
+        return self._open(self._file_name)
+
+    def _open(self, file_name: str):
+        raise NotImplementedError()
+
+
+class LinesSourceForIncludedFile(LinesSourceForNamedFileBase):
+    """
+    A LinesSource for files used by the include instruction.
+    """
+    def __init__(self,
+                 parsing_settings: ParsingSettings,
+                 file_name: str,
+                 source: SourceReference):
+        LinesSourceForNamedFileBase.__init__(self, parsing_settings, file_name)
+        self._source = source
+
+    def _open(self, file_name: str):
+        try:
+            return self._parsing_settings.file_system.open_text_file(file_name)
+        except OSError:
+            raise ResultItemConstructionForMissingFileException(self._source, file_name)
+
+
+class FileExistenceHandlingSettings:
+
+    def __init__(self,
+                 include_existing_in_output: bool,
+                 program_should_fail_on_non_existing: bool,
+                 include_non_existing_in_output: bool):
+        self.include_existing_in_output = include_existing_in_output
+        self.program_should_fail_on_non_existing = program_should_fail_on_non_existing
+        self.include_non_existing_in_output = include_non_existing_in_output
+
+    @staticmethod
+    def new_fail_on_non_existing():
+        return FileExistenceHandlingSettings(True, True, False)
+
+    @staticmethod
+    def new_ignore_non_existing():
+        return FileExistenceHandlingSettings(True, False, False)
+
+    @staticmethod
+    def new_include_non_existing():
+        return FileExistenceHandlingSettings(True, False, True)
+
+    @staticmethod
+    def new_only_non_existing():
+        return FileExistenceHandlingSettings(False, False, True)
+
+
+class FileExistenceHandlingModeOptionParser:
+    """Parses the Command Line Option for handling of files depending on existence."""
+
+    _DEFAULT_KEY = "fail"
+
+    _MODES = {
+        "fail": (FileExistenceHandlingSettings.new_fail_on_non_existing(),
+                 "A missing file causes the program to fail (with exit status " +
+                 str(EXIT_FILE_DOES_NOT_EXIST) + ")."),
+        "ignore": (FileExistenceHandlingSettings.new_ignore_non_existing(),
+                   "Missing files are not included in the output."),
+        "include": (FileExistenceHandlingSettings.new_include_non_existing(),
+                    "Missing files are included in the output just as existing files."),
+        "only": (FileExistenceHandlingSettings.new_only_non_existing(),
+                 "Output only missing files."),
+    }
+
+    def mode_keys(self) -> list:
+        return self._MODES.keys()
+
+    def default_key(self) -> str:
+        return self._DEFAULT_KEY
+
+    def keys_help_text(self) -> str:
         return " ".join([in_double_quotes(key) + ": " + val[1]
                          for key, val in self._MODES.items()])
 
@@ -2727,15 +5737,64 @@ class Command:
                 program_should_fail_on_non_existing_file: bool,
                 tags_condition: TagsCondition,
                 rendition_settings: RenditionSettings,
-                parsing_settings: ParsingSettings):
+                parsing_settings: ParsingSettings,
+                observer: Observer = None):
+        """
+        :param observer: None, or an Observer that is informed about the execution.
+        """
+        if observer is not None:
+            parsing_settings = parsing_settings.new_with_observer(observer)
+        list_files = self.parsed_list_files(file_names,
+                                            forward_tags,
+                                            stdin_paths_are_relative_empty,
+                                            program_should_fail_on_non_existing_file,
+                                            tags_condition,
+                                            rendition_settings,
+                                            parsing_settings)
+        for file_number, file_name, file_processor, env in list_files:
+            if observer is None:
+                self.process_list_file(file_number, file_processor, parsing_settings, env)
+            else:
+                start_time = time.perf_counter()
+                try:
+                    self.process_list_file(file_number, file_processor, parsing_settings, env)
+                finally:
+                    observer.file_argument_processed(file_name,
+                                                     start_time,
+                                                     time.perf_counter() - start_time)
+            if self.is_complete():
+                break
+        self.finish()
+
+    @staticmethod
+    def parsed_list_files(file_names: list,
+                          forward_tags: bool,
+                          stdin_paths_are_relative_empty: list,
+                          program_should_fail_on_non_existing_file: bool,
+                          tags_condition: TagsCondition,
+                          rendition_settings: RenditionSettings,
+                          parsing_settings: ParsingSettings):
+        """
+        Parses the list-files, one at a time.
+
+        A file is parsed when the previous file has been processed
+        (since tags may be forwarded from the previous file).
+
+        :return: Iterator of (file number, file name, ProcessorForListFile, RenditionEnvironment),
+        where the file name is the name used for parsing and rendition.
+        """
         file_number = 1
+        env = None
         for file_name in file_names:
-            lines_source = self._line_source_for(parsing_settings, file_name)
-            parsing_and_rendition_file_name = self._parsing_and_rendition_file_name(stdin_paths_are_relative_empty,
-                                                                                    file_name)
+            lines_source = Command._line_source_for(parsing_settings, file_name)
+            parsing_and_rendition_file_name = Command._parsing_and_rendition_file_name(stdin_paths_are_relative_empty,
+                                                                                       file_name)
             file_parser = ListFileParser.for_top_level(parsing_settings,
                                                        parsing_and_rendition_file_name)
-            file_processor = file_parser.apply(lines_source)
+            file_processor = parsed_list_file(parsing_settings,
+                                              file_parser,
+                                              lines_source,
+                                              None if file_name == COMMAND_LINE_ARGUMENT_FOR_STDIN else file_name)
             tags = Tags.new_empty()
             if file_number > 1 and forward_tags:
                 tags = env.tags()
@@ -2744,7 +5803,7 @@ class Command:
                                                           tags_condition,
                                                           rendition_settings,
                                                           tags)
-            self.process_list_file(file_number, file_processor, parsing_settings, env)
+            yield file_number, parsing_and_rendition_file_name, file_processor, env
             file_number += 1
 
     @staticmethod
@@ -2762,6 +5821,25 @@ class Command:
                           env: RenditionEnvironment):
         raise NotImplementedError()
 
+    def finish(self):
+        """
+        Called after all files have been processed successfully.
+        """
+        pass
+
+    def is_complete(self) -> bool:
+        """
+        Tells if the command is done, so that the remaining files need not be processed.
+        """
+        return False
+
+    def list_files_can_be_processed_separately(self) -> bool:
+        """
+        Tells if the output of a list-file (when tags are not forwarded)
+        is independent of the other list-files.
+        """
+        return False
+
     @staticmethod
     def _parsing_and_rendition_file_name(stdin_paths_are_relative_empty: list,
                                          file_name):
@@ -2776,15 +5854,185 @@ class ProgramMainFunctionalityCommand(Command):
     """
     Command that implements the main functionality of this program.
     """
+    def __init__(self,
+                 output: ResultItemOutput = None):
+        """
+        :param output: None means that items are printed.
+        """
+        self._output = ResultItemOutputForPrinting() if output is None else output
+
     def process_list_file(self,
                           file_number: int,
                           file_processor: ProcessorForListFile,
                           parsing_settings: ParsingSettings,
                           env: RenditionEnvironment):
-        for result_item in file_processor.result_item_iterable(parsing_settings,
-                                                               env):
+        output = self._output
+        if parsing_settings.observer is not None:
+            output = ResultItemOutputInformingObserver(parsing_settings.observer, output)
+        parsing_settings = parsing_settings.new_constructing_only_output_of(env.rendition_settings)
+        if output.accepts_result_item_batches():
+            parsing_settings = parsing_settings.new_with_result_item_batches()
+        result_items = file_processor.result_item_iterable(parsing_settings,
+                                                           env)
+        for result_item in result_items:
             if result_item.include_in_output(env):
-                print(result_item.rendition(env))
+                output.output(result_item, env)
+                if self._output.is_complete():
+                    # The rest of the list-file is not evaluated.
+                    return
+
+    def finish(self):
+        self._output.finish()
+
+    def is_complete(self) -> bool:
+        return self._output.is_complete()
+
+    def list_files_can_be_processed_separately(self) -> bool:
+        return self._output.output_of_list_files_is_independent()
+
+
+class ProgramMainFunctionalityCommandWithIncludesInWorkers(ProgramMainFunctionalityCommand):
+    """
+    The main functionality, with the INCLUDE instructions of the list-files given on the
+    command line evaluated by worker processes, in parallel.
+
+    Includes that import tags are evaluated in this process, since they may modify
+    the tags of the including file. So are all other instructions - in order, since
+    they may modify the tags that are exported to following includes.
+
+    Only includes whose evaluation cannot execute commands are evaluated by workers:
+    the included file has neither SHELL nor INCLUDE instructions, and no preprocessor
+    is used. Other includes, and SHELL instructions, are evaluated in this process when
+    all preceding includes have been evaluated - so that commands are executed in the
+    order of the instructions, as when the includes are evaluated in this process.
+
+    A worker parses the list-file itself, evaluates the include (with the tags of the
+    including file when the include was reached), and gives the rendered output.
+    The output is output in the order of the instructions, and the execution stops
+    at the first instruction that fails - as when the includes are evaluated in
+    this process.
+    """
+
+    def __init__(self,
+                 executor,
+                 num_jobs: int,
+                 arguments: list,
+                 file_names: list):
+        """
+        :param executor: A concurrent.futures.Executor.
+        :param arguments: The command line arguments of the program (for the workers).
+        :param file_names: The list-files given on the command line.
+        """
+        ProgramMainFunctionalityCommand.__init__(self)
+        self._executor = executor
+        self._max_num_pending_chunks = 2 * num_jobs
+        self._arguments = arguments
+        self._file_names = file_names
+
+    def process_list_file(self,
+                          file_number: int,
+                          file_processor: ProcessorForListFile,
+                          parsing_settings: ParsingSettings,
+                          env: RenditionEnvironment):
+        file_name = self._file_names[file_number - 1]
+        if file_name == COMMAND_LINE_ARGUMENT_FOR_STDIN:
+            ProgramMainFunctionalityCommand.process_list_file(self,
+                                                              file_number,
+                                                              file_processor,
+                                                              parsing_settings,
+                                                              env)
+            return
+        parsing_settings = parsing_settings.new_constructing_only_output_of(
+            env.rendition_settings).new_with_result_item_batches()
+        pending_chunks = collections.deque()
+        try:
+            for instruction_index, instruction in enumerate(file_processor.processors()):
+                if self._can_be_evaluated_by_worker(instruction, parsing_settings, env):
+                    pending_chunks.append(self._executor.submit(evaluate_include_in_worker,
+                                                                self._arguments,
+                                                                file_name,
+                                                                instruction_index,
+                                                                copy.deepcopy(env.tags())))
+                else:
+                    if isinstance(instruction, (ProcessorForInclude, ProcessorForShell)):
+                        # Commands must not be executed before the preceding includes are evaluated.
+                        self._output_chunks(pending_chunks, 0)
+                    try:
+                        self._process_instruction(instruction, parsing_settings, env, pending_chunks)
+                    except ExecutionException:
+                        # The output of the preceding instructions must be output before the error.
+                        self._output_chunks(pending_chunks, 0)
+                        raise
+                self._output_chunks(pending_chunks, self._max_num_pending_chunks)
+            self._output_chunks(pending_chunks, 0)
+        finally:
+            # Pending includes are not evaluated if the execution stops (by failure, or
+            # because stdout has been closed by its reader).
+            for chunk in pending_chunks:
+                if not isinstance(chunk, tuple):
+                    chunk.cancel()
+
+    @staticmethod
+    def _can_be_evaluated_by_worker(instruction: Processor,
+                                    parsing_settings: ParsingSettings,
+                                    env: RenditionEnvironment) -> bool:
+        if not isinstance(instruction, ProcessorForInclude) or instruction.imports_tags():
+            return False
+        if parsing_settings.preprocessor_shell_command_or_none is not None:
+            return False
+        try:
+            included_file = instruction.parsed_included_file(parsing_settings, env)
+        except ExecutionException:
+            # Reported when the include is evaluated in this process.
+            return False
+        return not included_file.may_execute_commands()
+
+    @staticmethod
+    def _process_instruction(instruction: Processor,
+                             parsing_settings: ParsingSettings,
+                             env: RenditionEnvironment,
+                             pending_chunks: collections.deque):
+        """
+        Evaluates an instruction in this process - the output is printed directly,
+        unless there is output from preceding instructions that is not yet output.
+        """
+        if not pending_chunks:
+            for result_item in instruction.result_item_iterable(parsing_settings, env):
+                if result_item.include_in_output(env):
+                    print(result_item.rendition(env))
+        else:
+            lines = []
+            try:
+                for result_item in instruction.result_item_iterable(parsing_settings, env):
+                    if result_item.include_in_output(env):
+                        lines.append(result_item.rendition(env) + "\n")
+            finally:
+                pending_chunks.append(("".join(lines), "", 0))
+
+    @staticmethod
+    def _output_chunks(pending_chunks: collections.deque,
+                       max_num_pending_chunks: int):
+        """
+        Outputs the chunks that are ready, in order, and waits for chunks
+        until at most the given number of chunks are pending.
+
+        A chunk is a tuple (output on stdout, output on stderr, exit code), or a Future of such a tuple.
+        Exits if a chunk has a non-zero exit code.
+        """
+        while pending_chunks:
+            chunk = pending_chunks[0]
+            if not isinstance(chunk, tuple):
+                if len(pending_chunks) <= max_num_pending_chunks and not chunk.done():
+                    return
+                chunk = chunk.result()
+            pending_chunks.popleft()
+            stdout_contents, stderr_contents, exit_code = chunk
+            sys.stdout.write(stdout_contents)
+            if stderr_contents:
+                sys.stdout.flush()
+                sys.stderr.write(stderr_contents)
+            if exit_code != 0:
+                sys.exit(exit_code)
 
 
 class Node:
@@ -2929,7 +6177,7 @@ class PrintInclusionHierarchyCommand(Command):
 class InstructionDescription:
     """Detailed description of an instruction."""
     def render_as_lines(self,
-                        wrapper: textwrap.TextWrapper) -> list:
+                        wrapper: "textwrap.TextWrapper") -> list:
         """Renders the description as a list of lines."""
         raise NotImplementedError()
 
@@ -2952,7 +6200,7 @@ class InstructionDescriptionExplicit(InstructionDescription):
         self.long_description = long_description
 
     def render_as_lines(self,
-                        wrapper: textwrap.TextWrapper) -> list:
+                        wrapper: "textwrap.TextWrapper") -> list:
         """Renders the description as a list of lines."""
         ret_val = []
         ret_val += self._render_arguments_syntax(wrapper)
@@ -2962,7 +6210,7 @@ class InstructionDescriptionExplicit(InstructionDescription):
         return ret_val
 
     def _render_arguments_syntax(self,
-                                 wrapper: textwrap.TextWrapper) -> list:
+                                 wrapper: "textwrap.TextWrapper") -> list:
         syntax = self.arguments_syntax
         if not syntax:
             syntax = "<none>"
@@ -2972,12 +6220,14 @@ class InstructionDescriptionExplicit(InstructionDescription):
         return wrapper.wrap(self.one_line_description)
 
     def _render_arguments(self, wrapper):
+        import textwrap
         ret_val = []
         for (identifier, description) in self.arguments:
             ret_val += wrapper.wrap(identifier + " - " + textwrap.dedent(description))
         return ret_val
 
     def _render_long_description(self, wrapper):
+        import textwrap
         if self.long_description:
             return wrapper.wrap(textwrap.dedent(self.long_description))
         else:
@@ -2989,13 +6239,13 @@ class ArgparseParserHelpTextMixin:
     SUB_COMMAND_DETAILS_INDENT = "  "
 
     @staticmethod
-    def string_as_lines(wrapper: textwrap.TextWrapper,
+    def string_as_lines(wrapper: "textwrap.TextWrapper",
                         lines_string: str):
         return [wrapper.initial_indent + line
                 for line in lines_string.splitlines()]
 
     @staticmethod
-    def string_as_lines_add_indent_to_non_first_line(wrapper: textwrap.TextWrapper,
+    def string_as_lines_add_indent_to_non_first_line(wrapper: "textwrap.TextWrapper",
                                                      lines_string: str):
         lines = lines_string.splitlines()
         ret_val = []
@@ -3016,7 +6266,7 @@ class InstructionDescriptionForInstructionWithArgparseParser(InstructionDescript
         self._parser = parser
 
     def render_as_lines(self,
-                        wrapper: textwrap.TextWrapper) -> list:
+                        wrapper: "textwrap.TextWrapper") -> list:
         return self.string_as_lines(wrapper,
                                     self._parser.arg_parser().format_help())
 
@@ -3029,7 +6279,7 @@ class InstructionDescriptionForInstructionWithSubCommands(InstructionDescription
         self._parser = parser
 
     def render_as_lines(self,
-                        wrapper: textwrap.TextWrapper) -> list:
+                        wrapper: "textwrap.TextWrapper") -> list:
         ret_val = self.string_as_lines(wrapper,
                                      self._parser.arg_parser().format_help())
         for sub_command in sorted(self._parser.sub_command_parsers().keys()):
@@ -3041,13 +6291,13 @@ class InstructionDescriptionForInstructionWithSubCommands(InstructionDescription
         return ret_val
 
     @staticmethod
-    def string_as_lines(wrapper: textwrap.TextWrapper,
+    def string_as_lines(wrapper: "textwrap.TextWrapper",
                         lines_string: str):
         return [wrapper.initial_indent + line
                 for line in lines_string.splitlines()]
 
     @staticmethod
-    def string_as_lines_add_indent_to_non_first_line(wrapper: textwrap.TextWrapper,
+    def string_as_lines_add_indent_to_non_first_line(wrapper: "textwrap.TextWrapper",
                                                      lines_string: str):
         lines = lines_string.splitlines()
         ret_val = []
@@ -3091,7 +6341,7 @@ class InstructionConfiguration:
                                         argument_parser)
 
     def render_as_lines(self,
-                        wrapper: textwrap.TextWrapper) -> list:
+                        wrapper: "textwrap.TextWrapper") -> list:
         """Renders the description as a list of lines."""
         saved_initial_indent = wrapper.initial_indent
         ret_val = []
@@ -3240,7 +6490,7 @@ instruction_configurations = [
 ]
 
 
-def instruction_configurations_lines(wrapper: textwrap.TextWrapper) -> list:
+def instruction_configurations_lines(wrapper: "textwrap.TextWrapper") -> list:
     lines = []
     for i_config in instruction_configurations:
         lines += i_config.render_as_lines(wrapper)
@@ -3248,6 +6498,7 @@ def instruction_configurations_lines(wrapper: textwrap.TextWrapper) -> list:
 
 
 def program_description():
+    import textwrap
     top_level_wrapper = textwrap.TextWrapper(initial_indent="",
                                              subsequent_indent="")
 
@@ -3279,6 +6530,115 @@ def instruction_identifier_to_parser_dict() -> dict:
     return ret_val
 
 
+###############################################################################
+# - tracing -
+###############################################################################
+
+
+class TraceRecorder(Observer):
+    """
+    Records a timeline of events in the Chrome Trace Event Format.
+
+    The written file can be viewed in about:tracing or Perfetto.
+
+    Every event is recorded as a "complete" event (with a duration).
+    Events nest according to their times - e.g. the events of an included
+    file are nested inside the event of the include instruction.
+    """
+
+    def __init__(self):
+        self._events = []
+        self._pid = os.getpid()
+        self._start_time = time.perf_counter()
+
+    def write(self, o_stream):
+        """Writes the trace as JSON."""
+        import json
+        json.dump({"traceEvents": self._events,
+                   "displayTimeUnit": "ms"},
+                  o_stream)
+
+    def list_file_parsed(self, file_name, includes, start_time, duration):
+        self._add_event("parse",
+                        "parse " + file_name,
+                        {"file": file_name,
+                         "includes": self._arg_for_includes(includes)},
+                        start_time,
+                        duration)
+
+    def file_argument_processed(self, file_name, start_time, duration):
+        self._add_event("process",
+                        "process " + file_name,
+                        {"file": file_name},
+                        start_time,
+                        duration)
+
+    def instruction_evaluated(self, processor, start_time, duration):
+        if isinstance(processor, ProcessorForInclude):
+            file_name = processor.file_name_relative_including_file()
+            args = self._args_for_source(processor.source)
+            args["included-file"] = file_name
+            self._add_event("include",
+                            "include " + file_name,
+                            args,
+                            start_time,
+                            duration)
+
+    def directory_listed(self, source, directory_path, num_entries, start_time, duration):
+        args = self._args_for_source(source)
+        args["directory"] = directory_path
+        args["entries"] = num_entries
+        self._add_event("directory",
+                        "list " + directory_path,
+                        args,
+                        start_time,
+                        duration)
+
+    def subprocess_finished(self, source_or_none, command_line, exit_code, start_time, duration):
+        if source_or_none is None:
+            name = "preprocessor"
+            args = {}
+        else:
+            name = "SHELL"
+            args = self._args_for_source(source_or_none)
+        args["command"] = command_line
+        args["exit-code"] = exit_code
+        self._add_event("subprocess",
+                        name,
+                        args,
+                        start_time,
+                        duration)
+
+    def _add_event(self,
+                   category: str,
+                   name: str,
+                   args: dict,
+                   start_time: float,
+                   duration: float):
+        self._events.append({"ph": "X",
+                             "cat": category,
+                             "name": name,
+                             "args": args,
+                             "pid": self._pid,
+                             "tid": 0,
+                             "ts": self._microseconds(start_time - self._start_time),
+                             "dur": self._microseconds(duration)})
+
+    @staticmethod
+    def _microseconds(seconds: float) -> float:
+        return seconds * 1000000
+
+    @staticmethod
+    def _arg_for_includes(includes: IncludeFileChain) -> list:
+        return [include.file_name + ":" + str(include.line.number)
+                for include in includes.from_top_to_bottom()]
+
+    def _args_for_source(self, source: SourceReference) -> dict:
+        return {"file": source.source_line.file_name,
+                "line": source.source_line.line.number,
+                "includes": self._arg_for_includes(source.includes)}
+
+
 ###############################################################################
 # - main -
 ###############################################################################
@@ -3305,7 +6665,31 @@ class CommandLineParseResult:
                  tags_condition: TagsCondition,
                  file_existence_handling_settings: FileExistenceHandlingSettings,
                  rendition_settings: RenditionSettings,
-                 preprocessor_shell_command: str):
+                 preprocessor_shell_command: str,
+                 trace_file_or_none: str,
+                 daemon_socket_or_none: str,
+                 num_jobs: int,
+                 arguments: list,
+                 manifest_to_output_or_none: str = None,
+                 dependency_recorder_or_none: DependencyRecorder = None,
+                 depfile_or_none: str = None,
+                 depfile_target: str = None,
+                 cache_dir_or_none: str = None,
+                 snapshot_root_or_none: str = None,
+                 existence_index_or_none: str = None,
+                 git_work_tree_or_none: str = None,
+                 include_untracked_git_files: bool = False):
+        """
+        :param arguments: The command line arguments that have been parsed.
+        :param manifest_to_output_or_none: A manifest that should be output (instead of list-files).
+        :param dependency_recorder_or_none: Must be informed about the execution, if not None.
+        :param depfile_or_none: A dependency file that should be written, of the dependencies
+        recorded by dependency_recorder_or_none.
+        :param cache_dir_or_none: A directory where caches are kept between executions.
+        :param snapshot_root_or_none: A directory whose tree is answered from a SnapshotFileSystem.
+        :param existence_index_or_none: A file with the paths of a PathIndexFileSystem.
+        :param git_work_tree_or_none: A working tree whose files are answered from a GitIndexFileSystem.
+        """
         self.command = command
         self.instruction_prefix = instruction_prefix
         self.file_names = file_names
@@ -3315,6 +6699,19 @@ class CommandLineParseResult:
         self.tags_condition = tags_condition
         self.rendition_settings = rendition_settings
         self.preprocessor_shell_command = preprocessor_shell_command
+        self.trace_file_or_none = trace_file_or_none
+        self.daemon_socket_or_none = daemon_socket_or_none
+        self.num_jobs = num_jobs
+        self.arguments = arguments
+        self.manifest_to_output_or_none = manifest_to_output_or_none
+        self.dependency_recorder_or_none = dependency_recorder_or_none
+        self.depfile_or_none = depfile_or_none
+        self.depfile_target = depfile_target
+        self.cache_dir_or_none = cache_dir_or_none
+        self.snapshot_root_or_none = snapshot_root_or_none
+        self.existence_index_or_none = existence_index_or_none
+        self.git_work_tree_or_none = git_work_tree_or_none
+        self.include_untracked_git_files = include_untracked_git_files
 
     def exit_if_invalid(self):
         """
@@ -3324,6 +6721,9 @@ class CommandLineParseResult:
 
         self.check_stdin_is_given_at_most_once()
         self.check_instruction_prefix()
+        self.check_no_files_are_given_to_daemon()
+        self.check_no_files_are_given_with_manifest()
+        self.check_num_jobs()
 
     def check_stdin_is_given_at_most_once(self):
         stdin_list = list(filter(lambda x: x == COMMAND_LINE_ARGUMENT_FOR_STDIN,
@@ -3337,6 +6737,49 @@ class CommandLineParseResult:
         if LineParserForIgnoredLine.is_comment_line(self.instruction_prefix):
             exit_usage("The instruction prefix may not match as a comment line.")
 
+    def check_no_files_are_given_to_daemon(self):
+        if self.daemon_socket_or_none and self.file_names:
+            exit_usage("Files cannot be given together with --daemon.")
+
+    def check_no_files_are_given_with_manifest(self):
+        if self.manifest_to_output_or_none and self.file_names:
+            exit_usage("Files cannot be given together with --from-manifest.")
+
+    def check_num_jobs(self):
+        if self.num_jobs < 1:
+            exit_usage("The number of jobs must be at least 1.")
+
+    def list_files_can_be_processed_in_parallel(self) -> bool:
+        """
+        Tells if the list-files can be processed in parallel, by separate processes.
+
+        This is not possible if tags are forwarded between files, if a file is read
+        from stdin, or if the output of a file depends on the other files.
+        """
+        return (self.num_jobs > 1 and
+                len(self.file_names) > 1 and
+                not self.forward_tags and
+                not self.has_file_system_in_memory() and
+                COMMAND_LINE_ARGUMENT_FOR_STDIN not in self.file_names and
+                self.command.list_files_can_be_processed_separately())
+
+    def includes_can_be_evaluated_in_parallel(self) -> bool:
+        """
+        Tells if the includes of the list-files can be evaluated in parallel, by separate processes
+        (if the list-files themselves cannot be processed in parallel).
+        """
+        return (self.num_jobs > 1 and
+                not self.has_file_system_in_memory() and
+                self.command.list_files_can_be_processed_separately())
+
+    def has_file_system_in_memory(self) -> bool:
+        """
+        Tells if questions about files are answered from memory (that is not shared with other processes).
+        """
+        return (self.snapshot_root_or_none is not None or
+                self.existence_index_or_none is not None or
+                self.git_work_tree_or_none is not None)
+
 
 def parse_tags_condition(tags_condition_setup: TagsConditionSetup,
                          right_operand_or_empty: list,
@@ -3369,9 +6812,32 @@ def filter_tags_operators_list_for_help_text():
                       for o in sorted(TagsConditionSetup.OPERATORS.keys())])
 
 
-def parse_command_line() -> CommandLineParseResult:
-    parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter,
-                                     description=program_description())
+class ArgumentParserWithLazyDescription(argparse.ArgumentParser):
+    """
+    An ArgumentParser who's description is constructed when the help text is formatted.
+
+    Constructing the description of all instructions is a noticeable part of
+    the start up time of the program.
+    """
+
+    def __init__(self,
+                 description_constructor,
+                 **kwargs):
+        argparse.ArgumentParser.__init__(self, **kwargs)
+        self._description_constructor = description_constructor
+
+    def format_help(self):
+        if self.description is None:
+            self.description = self._description_constructor()
+        return argparse.ArgumentParser.format_help(self)
+
+
+def parse_command_line(arguments: list = None) -> CommandLineParseResult:
+    """
+    :param arguments: The command line arguments, or None for the arguments of the process.
+    """
+    parser = ArgumentParserWithLazyDescription(program_description,
+                                               formatter_class=argparse.RawDescriptionHelpFormatter)
     filter_tags_long_option = "--filter-tags"
     filter_tags_operator_long_option = "--operator-for-filter-tags"
     filter_tags_negate_operator_long_option = "--negate-operator-for-filter-tags"
@@ -3379,6 +6845,10 @@ def parse_command_line() -> CommandLineParseResult:
     all_filter_operator_names = tags_condition_setup.all_operator_names()
 
     stdin_paths_are_relative_long_option = "--stdin-paths-are-relative"
+    diff_against_long_option = "--diff-against"
+    compile_manifest_long_option = "--compile-manifest"
+    depfile_long_option = "--depfile"
+    unique_false_positive_rate_long_option = "--unique-false-positive-rate"
 
     file_existence_handling_mode_parser = FileExistenceHandlingModeOptionParser()
 
@@ -3535,7 +7005,6 @@ def parse_command_line() -> CommandLineParseResult:
                         action="store_const",
                         dest="command",
                         const=PrintInclusionHierarchyCommand(TreePrinterForSimpleLayout(), False, False),
-                        default=ProgramMainFunctionalityCommand(),
                         help="""\
                         Prints the file inclusion hierarchy.
                         The normal output is suppressed.""")
@@ -3547,10 +7016,219 @@ def parse_command_line() -> CommandLineParseResult:
                         Prints the file inclusion hierarchy,
                         in a pretty layout.
                         The normal output is suppressed.""")
+    parser.add_argument("--snapshot",
+                        metavar="FILE",
+                        nargs=1,
+                        help="""\
+                        Writes the set of output file-paths, together with their tags, to FILE.
+                        The file can be given to """ + diff_against_long_option +
+                        """ of a later execution.""")
+    parser.add_argument(diff_against_long_option,
+                        metavar="FILE",
+                        nargs=1,
+                        help="""\
+                        Outputs only the differences between the output file-paths and those
+                        in the snapshot FILE (written by --snapshot):
+                        file-paths that have been added, preceded by "+",
+                        and file-paths that have been removed, preceded by "-".
+                        The differences are output sorted on file-path.
+                        If tags are output (-t, -T), a file-path who's tags have changed
+                        is output as both removed and added.
+                        Output other than file-paths is suppressed.
+                        FILE may be the same file as that of --snapshot.""")
+    parser.add_argument(compile_manifest_long_option,
+                        metavar="FILE",
+                        nargs=1,
+                        help="""\
+                        Writes the output to the manifest FILE, in a compact binary format,
+                        instead of outputting it.
+                        The manifest is output by --from-manifest.
+                        Cannot be used together with --snapshot, --diff-against and --sort-output.""")
+    parser.add_argument("--from-manifest",
+                        metavar="FILE",
+                        nargs=1,
+                        help="""\
+                        Outputs the manifest FILE (written by """ + compile_manifest_long_option + """).
+                        The output is that of the execution that wrote the manifest,
+                        which is output without parsing any list-files or accessing the file system.
+                        No files may be given, and options for the output are ignored.""")
+    parser.add_argument(depfile_long_option,
+                        metavar="FILE",
+                        nargs=1,
+                        help="""\
+                        Writes a dependency file, in the format of Make (and Ninja), when the execution
+                        has succeeded. It lists the list-files and the directories listed by LIST and
+                        FIND, that the output is derived from - so that a build system can skip the
+                        execution if none of them have changed.
+                        (The output of SHELL and preprocessors, and the existence of file-paths,
+                        are not included.)""")
+    parser.add_argument("--depfile-target",
+                        metavar="TARGET",
+                        nargs=1,
+                        help="""\
+                        The target of the rule in the dependency file (""" + depfile_long_option + """).
+                        Default: the manifest of """ + compile_manifest_long_option + """, if given,
+                        otherwise FILE of """ + depfile_long_option + """ without the suffix ".d".""")
+    parser.add_argument("--unique",
+                        default=False,
+                        action="store_true",
+                        help="""\
+                        Suppresses file-paths that have already been output, so that each file-path
+                        is output only the first time it occurs.
+                        File-paths are compared as output, but normalized (see --normalize-paths),
+                        and together with their tags, if tags are output.
+
+                        Only a 64 bit hash of each file-path is remembered.
+                        Different file-paths get the same hash - so that one of them is
+                        suppressed - with a negligible probability
+                        (about 3 in a million for 10 million file-paths).""")
+    parser.add_argument(unique_false_positive_rate_long_option,
+                        metavar="RATE",
+                        nargs=1,
+                        type=false_positive_rate,
+                        help="""\
+                        As --unique, but remembers the file-paths in Bloom filters,
+                        which needs much less memory: about 10 bits per file-path for RATE 0.01,
+                        and 1.5 bytes per file-path for RATE 0.000001.
+                        A file-path that has not been output is wrongly suppressed
+                        with a probability of at most RATE (0 < RATE < 1).""")
+    parser.add_argument("--sort-output",
+                        default=False,
+                        action="store_true",
+                        help="""\
+                        Outputs the file-paths of all files sorted on path, after all files have been processed.
+                        Other output (e.g. from PRINT) is output directly.
+
+                        When the file-paths exceed the memory given by --sort-buffer-size,
+                        they are sorted and written to temporary files, which are merged at the end.
+                        Together with --unique, the output is sorted and without repeated file-paths.""")
+    parser.add_argument("--sort-buffer-size",
+                        metavar="SIZE",
+                        nargs=1,
+                        type=parse_size,
+                        default=[DEFAULT_SORT_BUFFER_SIZE],
+                        help="""\
+                        The approximate memory used for sorting file-paths (--sort-output, --snapshot
+                        and --diff-against), in bytes, or with suffix K, M or G.
+                        Default: """ + str(DEFAULT_SORT_BUFFER_SIZE >> 20) + """M.""")
+    parser.add_argument("--limit",
+                        metavar="N",
+                        nargs=1,
+                        type=positive_integer,
+                        help="""\
+                        Outputs at most N file-paths.
+                        The execution stops when N file-paths have been output:
+                        no more list-files are read, and no more SHELL commands are executed.
+                        Together with --unique, N different file-paths are output.
+                        Together with --sort-output, the first N file-paths in sorted order
+                        are output (and all list-files are processed).""")
+    parser.add_argument("-j", "--jobs",
+                        metavar="N",
+                        nargs=1,
+                        type=int,
+                        default=[1],
+                        help="""\
+                        Processes up to N list-files given on the command line in parallel,
+                        in separate processes.
+                        The output is the same as when the files are processed one at a time:
+                        the output of each file is output in the order of the files, and the
+                        execution stops at the first file that fails.
+
+                        Files are processed one at a time if --forward-tags, --snapshot,
+                        --diff-against, --unique, --sort-output, --limit, --snapshot-root,
+                        --existence-index, --git-index, --trace or an inclusion hierarchy option
+                        is used, or if a file is read from stdin.
+
+                        When files are processed one at a time, the INCLUDE instructions of
+                        the files are instead evaluated in parallel (except for
+                        includes that import tags, includes of files with SHELL or INCLUDE
+                        instructions, and includes when a preprocessor is used, and except for --snapshot, --diff-against,
+                        --unique, --sort-output, --limit, --snapshot-root, --existence-index,
+                        --git-index, --trace and the inclusion hierarchy options).""")
+    parser.add_argument("--cache-dir",
+                        metavar="DIR",
+                        nargs=1,
+                        help="""\
+                        Keeps the listings of directories (LIST, FIND) in DIR between executions.
+                        A listing is read again if the directory has been modified.
+                        The cache holds the most recently used directories.
+                        The directory is created if it does not exist.
+                        Not used by a server (--daemon), which keeps listings in memory.""")
+    parser.add_argument("--snapshot-root",
+                        metavar="DIR",
+                        nargs=1,
+                        help="""\
+                        Reads the tree of directory DIR once, in parallel, before the list-files
+                        are evaluated.
+                        Questions about the existence and type of files, and the contents of
+                        directories, inside DIR are then answered from memory.
+                        Files outside of DIR, and inside symbolic links to directories, are
+                        looked up as usual.
+                        Modifications of the tree during the execution (e.g. by SHELL) are not seen.""")
+    parser.add_argument("--existence-index",
+                        metavar="FILE",
+                        nargs=1,
+                        help="""\
+                        Takes the files that exist to be those listed in FILE (e.g. the output of
+                        "git ls-files"), instead of looking them up.
+                        The directories that exist are the directories of these files.
+                        The paths are separated by new-lines, or by NUL characters
+                        (e.g. "git ls-files -z"), and are relative to the current directory.
+                        Paths are normalized textually before they are looked up.
+                        Directories are still listed (LIST, FIND) as usual.""")
+    parser.add_argument("--git-index",
+                        metavar="DIR",
+                        nargs=1,
+                        help="""\
+                        Takes the files inside the git working tree DIR to be those of the
+                        index of the repository (.git/index), instead of reading the working tree.
+                        Existence, types and the contents of directories (LIST, FIND) are
+                        answered from the index, which is read once.
+                        Files that have been removed but whose removal is not staged still exist.
+                        Untracked files do not exist, unless --git-untracked is given.
+                        Files outside of DIR, and inside submodules, are looked up as usual.""")
+    parser.add_argument("--git-untracked",
+                        action="store_true",
+                        help="""\
+                        Also includes untracked files that are not ignored, with --git-index
+                        (as given by "git ls-files --others --exclude-standard").""")
+    parser.add_argument("--trace",
+                        metavar="FILE",
+                        nargs=1,
+                        help="""\
+                        Records a timeline of the parsing of list-files, the evaluation of
+                        includes, directory listings and executions of shell commands and
+                        preprocessors.
+                        The timeline is written to FILE in the Chrome Trace Event Format,
+                        which can be viewed in Perfetto or about:tracing.""")
+    parser.add_argument("--daemon",
+                        metavar="SOCKET",
+                        nargs="?",
+                        const="",
+                        help="""\
+                        Runs as a server that executes the program for clients,
+                        and keeps parsed list-files and directory listings in memory between executions.
+                        A list-file or directory is read again when it has been modified.
+                        The server listens on the Unix domain socket SOCKET.
+                        The default socket is given by the environment variable """ +
+                        daemon_client.SOCKET_ENV_VAR + """, or a file in a directory (private for the user)
+                        in $XDG_RUNTIME_DIR or /tmp.
+                        The directory of the socket must not be writable by other users,
+                        and only clients that run as the same user are served.
+
+                        When a server is running, the program forwards executions to it.
+                        Set the environment variable """ + daemon_client.NO_DAEMON_ENV_VAR +
+                        """ to prevent this.
+                        Only some environment variables (e.g. PATH, HOME and locale settings)
+                        are given to the server, for SHELL and preprocessors -
+                        other variables must be named (separated by space) by the environment variable """ +
+                        daemon_client.ENVIRONMENT_ENV_VAR + ".")
     parser.add_argument("--version",
                         action="version",
                         version="%(prog)s " + program_info.VERSION_STRING)
-    args = parser.parse_args()
+    if arguments is None:
+        arguments = sys.argv[1:]
+    args = parser.parse_args(arguments)
     tags_condition = parse_tags_condition(tags_condition_setup,
                                           args.filter_tags,
                                           args.operator_for_filter_tags[0],
@@ -3564,7 +7242,45 @@ def parse_command_line() -> CommandLineParseResult:
                                            TagsRenditionSettings(args.prepend_tags,
                                                                  args.append_tags),
                                            args.suppress_non_path_output)
-    return CommandLineParseResult(args.command,
+    command = args.command
+    dependency_recorder = None
+    if len([option for option in (args.snapshot_root, args.existence_index, args.git_index) if option]) > 1:
+        parser.error("Only one of --snapshot-root, --existence-index and --git-index can be used")
+    if args.git_untracked and not args.git_index:
+        parser.error("--git-untracked can only be used together with --git-index")
+    if command is not None and (args.snapshot or args.diff_against or args.unique or args.sort_output):
+        parser.error("An inclusion hierarchy option cannot be used together with " +
+                     "--snapshot, --diff-against, --unique or --sort-output")
+    if args.limit and (command is not None or args.compile_manifest or args.snapshot or args.diff_against):
+        parser.error("--limit cannot be used together with " +
+                     "--snapshot, --diff-against, " + compile_manifest_long_option +
+                     " or an inclusion hierarchy option")
+    if args.compile_manifest or args.depfile:
+        dependency_recorder = DependencyRecorder()
+    if args.compile_manifest:
+        if command is not None or args.snapshot or args.diff_against or args.sort_output:
+            parser.error(compile_manifest_long_option + " cannot be used together with " +
+                         "--snapshot, --diff-against, --sort-output or an inclusion hierarchy option")
+        command = ProgramMainFunctionalityCommand(
+            result_item_output(None,
+                               None,
+                               rendition_settings,
+                               seen_set(args.unique, args.unique_false_positive_rate),
+                               None,
+                               ResultItemOutputForManifest(args.compile_manifest[0],
+                                                           rendition_settings.tags_settings,
+                                                           dependency_recorder)))
+    if command is None:
+        command = ProgramMainFunctionalityCommand(result_item_output(args.snapshot[0] if args.snapshot else None,
+                                                                     args.diff_against[0] if args.diff_against else None,
+                                                                     rendition_settings,
+                                                                     seen_set(args.unique,
+                                                                              args.unique_false_positive_rate),
+                                                                     args.sort_buffer_size[0] if args.sort_output else None,
+                                                                     None,
+                                                                     args.limit[0] if args.limit else None,
+                                                                     args.sort_buffer_size[0]))
+    return CommandLineParseResult(command,
                                   args.instruction_prefix[0],
                                   args.files,
                                   args.forward_tags,
@@ -3572,22 +7288,291 @@ def parse_command_line() -> CommandLineParseResult:
                                   tags_condition,
                                   file_existence_handling_settings,
                                   rendition_settings,
-                                  args.preprocessor)
+                                  args.preprocessor,
+                                  args.trace[0] if args.trace else None,
+                                  daemon_socket(args.daemon),
+                                  args.jobs[0],
+                                  arguments,
+                                  args.from_manifest[0] if args.from_manifest else None,
+                                  dependency_recorder,
+                                  args.depfile[0] if args.depfile else None,
+                                  depfile_target(args.depfile_target,
+                                                 args.compile_manifest,
+                                                 args.depfile),
+                                  args.cache_dir[0] if args.cache_dir else None,
+                                  args.snapshot_root[0] if args.snapshot_root else None,
+                                  args.existence_index[0] if args.existence_index else None,
+                                  args.git_index[0] if args.git_index else None,
+                                  args.git_untracked)
+
+
+def result_item_output(snapshot_file_or_none: str,
+                       previous_snapshot_file_or_none: str,
+                       rendition_settings: RenditionSettings,
+                       seen_set_or_none: SeenSet = None,
+                       sort_buffer_size_or_none: int = None,
+                       final_output_or_none: ResultItemOutput = None,
+                       max_num_file_paths_or_none: int = None,
+                       snapshot_sort_buffer_size: int = DEFAULT_SORT_BUFFER_SIZE) -> ResultItemOutput:
+    """
+    :param seen_set_or_none: Not None if repeated file-paths should be suppressed.
+    :param sort_buffer_size_or_none: Not None if file-paths should be output sorted.
+    :param snapshot_sort_buffer_size: The memory used for sorting the file-paths of snapshots.
+    :param final_output_or_none: The output of the items, or None for printing them.
+    :param max_num_file_paths_or_none: Not None if the number of output file-paths is limited.
+    """
+    output = ResultItemOutputForPrinting() if final_output_or_none is None else final_output_or_none
+    if sort_buffer_size_or_none is not None:
+        output = ResultItemOutputForSortedFilePaths(sort_buffer_size_or_none, output, max_num_file_paths_or_none)
+    elif max_num_file_paths_or_none is not None:
+        output = ResultItemOutputLimitingFilePaths(max_num_file_paths_or_none, output)
+    if seen_set_or_none is not None:
+        output = ResultItemOutputSuppressingRepeatedFilePaths(seen_set_or_none, output)
+    if snapshot_file_or_none is None and previous_snapshot_file_or_none is None:
+        return output
+    return ResultItemOutputForSnapshots(snapshot_file_or_none,
+                                        previous_snapshot_file_or_none,
+                                        rendition_settings.tags_settings,
+                                        output,
+                                        snapshot_sort_buffer_size)
+
+
+def seen_set(unique: bool,
+             false_positive_rate_option_value) -> SeenSet:
+    """
+    :param false_positive_rate_option_value: The value of --unique-false-positive-rate (None if not given).
+    :return: None if repeated file-paths should not be suppressed.
+    """
+    if false_positive_rate_option_value is not None:
+        return SeenSetAsBloomFilter(false_positive_rate_option_value[0])
+    if unique:
+        return SeenSetOfHashes()
+    return None
+
+
+def false_positive_rate(option_argument: str) -> float:
+    try:
+        ret_val = float(option_argument)
+    except ValueError:
+        ret_val = None
+    if ret_val is None or not 0 < ret_val < 1:
+        raise argparse.ArgumentTypeError("not a number between 0 and 1: " + option_argument)
+    return ret_val
+
+
+def positive_integer(option_argument: str) -> int:
+    try:
+        ret_val = int(option_argument)
+    except ValueError:
+        ret_val = None
+    if ret_val is None or ret_val < 1:
+        raise argparse.ArgumentTypeError("not a positive integer: " + option_argument)
+    return ret_val
+
+
+def depfile_target(target_option_value,
+                   compile_manifest_option_value,
+                   depfile_option_value) -> str:
+    """
+    :return: None if no dependency file should be written.
+    """
+    if depfile_option_value is None:
+        return None
+    if target_option_value is not None:
+        return target_option_value[0]
+    if compile_manifest_option_value is not None:
+        return compile_manifest_option_value[0]
+    depfile = depfile_option_value[0]
+    return depfile[:-len(DEPFILE_SUFFIX)] if depfile.endswith(DEPFILE_SUFFIX) else depfile
+
+
+def daemon_socket(daemon_option_value) -> str:
+    """
+    :param daemon_option_value: The value of the --daemon option (None if not given).
+    :return: None if the program should not run as a daemon.
+    """
+    if daemon_option_value is None:
+        return None
+    return daemon_option_value if daemon_option_value else daemon_client.default_socket_path()
 
 
-def main():
-    parse_result = parse_command_line()
+def write_trace(trace_file: str,
+                trace_recorder: TraceRecorder):
+    try:
+        with open(trace_file, mode="w") as o_stream:
+            trace_recorder.write(o_stream)
+    except OSError:
+        write_lines(sys.stderr,
+                    [error_header_line("Cannot write trace file: " +
+                                       in_double_quotes(trace_file))])
+
+
+def main(arguments: list = None,
+         evaluation_caches: EvaluationCaches = None):
+    """
+    :param arguments: The command line arguments, or None for the arguments of the process.
+    :param evaluation_caches: None, or caches that are kept between executions (by the daemon).
+    """
+    parse_result = parse_command_line(arguments)
     parse_result.exit_if_invalid()
+    if parse_result.daemon_socket_or_none:
+        from . import daemon
+        daemon.serve(parse_result.daemon_socket_or_none)
+    elif parse_result.manifest_to_output_or_none:
+        exit_on_execution_exception(lambda: output_manifest(parse_result.manifest_to_output_or_none))
+    else:
+        trace_recorder = TraceRecorder() if parse_result.trace_file_or_none else None
+        try:
+            execute(parse_result,
+                    observer_of([trace_recorder, parse_result.dependency_recorder_or_none]),
+                    evaluation_caches)
+        finally:
+            if trace_recorder is not None:
+                write_trace(parse_result.trace_file_or_none, trace_recorder)
+        if parse_result.depfile_or_none:
+            write_depfile(parse_result.depfile_or_none,
+                          parse_result.depfile_target,
+                          parse_result.dependency_recorder_or_none)
+
+
+def main_of_program():
+    """
+    Executes the program, with the command line arguments of the process.
+
+    If the reader of stdout closes it (e.g. "filelist top.list | head"), the
+    execution stops at the next output, and the program exits quietly.
+    """
+    try:
+        main()
+        sys.stdout.flush()
+    except BrokenPipeError:
+        daemon_client.discard_further_output_on_stdout()
+        sys.exit(daemon_client.EXIT_STDOUT_CLOSED)
+
+
+def observer_of(observers_or_none: list) -> Observer:
+    """
+    :param observers_or_none: Observer:s, or None:s.
+    :return: None if there are no Observer:s.
+    """
+    observers = [observer for observer in observers_or_none if observer is not None]
+    if not observers:
+        return None
+    if len(observers) == 1:
+        return observers[0]
+    return ObserverForMultipleObservers(observers)
+
+
+def execute(parse_result: CommandLineParseResult,
+            observer: Observer,
+            evaluation_caches: EvaluationCaches = None):
+    if observer is None and evaluation_caches is None:
+        if parse_result.list_files_can_be_processed_in_parallel():
+            execute_in_parallel(parse_result)
+            return
+        if parse_result.includes_can_be_evaluated_in_parallel():
+            execute_with_includes_in_parallel(parse_result)
+            return
+    execute_command(parse_result, parse_result.command, observer, evaluation_caches)
+
+
+def parsing_settings_for(parse_result: CommandLineParseResult) -> ParsingSettings:
+    return ParsingSettings(parse_result.preprocessor_shell_command,
+                           system_line_parsers(parse_result.instruction_prefix),
+                           instruction_identifier_to_parser_dict())
+
+
+def execute_command(parse_result: CommandLineParseResult,
+                    command: Command,
+                    observer: Observer,
+                    evaluation_caches: EvaluationCaches = None):
+    """
+    Executes a command, and exits with an error message if the execution fails.
+    """
+    parsing_settings = parsing_settings_for(parse_result)
+    listings_are_in_memory = (parse_result.snapshot_root_or_none is not None or
+                              parse_result.git_work_tree_or_none is not None)
+    cache_file_or_none = None
+    if evaluation_caches is not None:
+        parsing_settings = evaluation_caches.parsing_settings_with_caches(parsing_settings,
+                                                                          parse_result.instruction_prefix)
+    elif not listings_are_in_memory:
+        # Listings are shared by all instructions of the execution.
+        parsing_settings.directory_listing_cache = DirectoryListingCache()
+        if parse_result.cache_dir_or_none:
+            cache_file_or_none = os.path.join(parse_result.cache_dir_or_none, DIRECTORY_LISTINGS_CACHE_FILE_NAME)
+            parsing_settings.directory_listing_cache.load(cache_file_or_none)
+    if listings_are_in_memory:
+        parsing_settings.directory_listing_cache = None
+    if parse_result.snapshot_root_or_none is not None:
+        parsing_settings.file_system = snapshot_file_system(parse_result.snapshot_root_or_none)
+    elif parse_result.git_work_tree_or_none is not None:
+        parsing_settings.file_system = git_index_file_system(parse_result.git_work_tree_or_none,
+                                                             parse_result.include_untracked_git_files)
+    elif parse_result.existence_index_or_none is not None:
+        parsing_settings.file_system = existence_index_file_system(parse_result.existence_index_or_none)
+    elif DirectoryFdFileSystem.is_supported():
+        parsing_settings.file_system = DirectoryFdFileSystem()
+    try:
+        exit_on_execution_exception(lambda: command.execute(
+            parse_result.file_names,
+            parse_result.forward_tags,
+            parse_result.stdin_paths_are_relative_or_empty,
+            parse_result.file_existence_handling_settings.program_should_fail_on_non_existing,
+            parse_result.tags_condition,
+            parse_result.rendition_settings,
+            parsing_settings,
+            observer))
+    finally:
+        parsing_settings.file_system.close()
+        if cache_file_or_none is not None:
+            parsing_settings.directory_listing_cache.save(cache_file_or_none)
+
+
+def snapshot_file_system(root_dir: str) -> SnapshotFileSystem:
+    """
+    Reads the tree of a directory, and exits with an error message if it cannot be listed.
+    """
     try:
-        parse_result.command.execute(parse_result.file_names,
-                                     parse_result.forward_tags,
-                                     parse_result.stdin_paths_are_relative_or_empty,
-                                     parse_result.file_existence_handling_settings.program_should_fail_on_non_existing,
-                                     parse_result.tags_condition,
-                                     parse_result.rendition_settings,
-                                     ParsingSettings(parse_result.preprocessor_shell_command,
-                                                     system_line_parsers(parse_result.instruction_prefix),
-                                                     instruction_identifier_to_parser_dict()))
+        return SnapshotFileSystem(root_dir)
+    except OSError:
+        write_lines(sys.stderr,
+                    [error_header_line("Cannot list directory: " + in_double_quotes(root_dir))])
+        sys.exit(EXIT_INVALID_ARGUMENTS)
+
+
+def git_index_file_system(work_tree: str,
+                          include_untracked: bool) -> GitIndexFileSystem:
+    """
+    Reads the index of a git repository, and exits with an error message if it cannot be read.
+    """
+    try:
+        return GitIndexFileSystem(work_tree, include_untracked)
+    except (OSError, ValueError) as ex:
+        write_lines(sys.stderr,
+                    [error_header_line("Cannot read the git index of " + in_double_quotes(work_tree) + ": " +
+                                       (ex.strerror if isinstance(ex, OSError) and ex.strerror else str(ex)))])
+        sys.exit(EXIT_INVALID_ARGUMENTS)
+
+
+def existence_index_file_system(file_name: str) -> PathIndexFileSystem:
+    """
+    Reads the paths of an existence index, and exits with an error message if it cannot be read.
+    """
+    try:
+        return PathIndexFileSystem(read_path_index(file_name))
+    except OSError:
+        write_lines(sys.stderr,
+                    [error_header_line("Cannot open file: " + in_double_quotes(file_name))])
+        sys.exit(EXIT_INVALID_ARGUMENTS)
+
+
+def exit_on_execution_exception(action):
+    """
+    Executes an action, and exits with an error message if it raises an ExecutionException.
+    """
+    try:
+        action()
     except InstructionSyntaxErrorException as ex:
         ex.render(sys.stderr)
         sys.exit(EXIT_SYNTAX)
@@ -3599,3 +7584,184 @@ def main():
     except PreprocessorException as ex:
         ex.render(sys.stderr)
         sys.exit(EXIT_PRE_PROCESSING)
+
+    except (FileArgumentException, SnapshotException, ManifestException) as ex:
+        ex.render(sys.stderr)
+        sys.exit(EXIT_INVALID_ARGUMENTS)
+
+
+def execute_in_parallel(parse_result: CommandLineParseResult):
+    """
+    Processes each list-file in a separate worker process, and outputs the results
+    in the order of the files.
+
+    The output and exit code are the same as those of processing the files one at a time:
+    the output of each file is output when all preceding files have been output, and if a file
+    fails, its output and error message is output and the program exits.
+    If the reader of stdout closes it, the program exits without waiting for the workers.
+    """
+    import concurrent.futures
+    num_workers = min(parse_result.num_jobs, len(parse_result.file_names))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=num_workers) as executor:
+        futures = [executor.submit(execute_list_file_in_worker, parse_result.arguments, file_name)
+                   for file_name in parse_result.file_names]
+        try:
+            for future in futures:
+                while not concurrent.futures.wait([future], timeout=0.1).done:
+                    if reader_of_stdout_has_closed_it():
+                        raise BrokenPipeError()
+                stdout_contents, stderr_contents, exit_code = future.result()
+                sys.stdout.write(stdout_contents)
+                if stderr_contents:
+                    sys.stdout.flush()
+                    sys.stderr.write(stderr_contents)
+                if exit_code != 0:
+                    sys.exit(exit_code)
+        except BaseException:
+            terminate_worker_processes(executor, futures)
+            raise
+        finally:
+            for future in futures:
+                future.cancel()
+
+
+def reader_of_stdout_has_closed_it() -> bool:
+    """
+    Tells if stdout is a pipe whose reader has closed it - without writing to it.
+
+    Only known on platforms with poll(), which reports this as an error of the pipe.
+    """
+    import io
+    import select
+    if not hasattr(select, "poll"):
+        return False
+    try:
+        file_descriptor = sys.stdout.fileno()
+    except (AttributeError, io.UnsupportedOperation):
+        return False
+    poller = select.poll()
+    poller.register(file_descriptor, 0)
+    return any(events & select.POLLERR for _, events in poller.poll(0))
+
+
+def terminate_worker_processes(executor: "concurrent.futures.ProcessPoolExecutor",
+                               futures: list = ()):
+    """
+    Stops the work of worker processes, when the program exits before all of it is
+    done (a list-file has failed, or the reader of stdout has closed it) - so that
+    the pool does not wait for the work, and no more commands (SHELL, preprocessors)
+    are executed by the workers.
+
+    :param futures: Futures of the work, that are cancelled unless already running.
+    """
+    for future in futures:
+        future.cancel()
+    # The pool has no public method for this.
+    for process in list((executor._processes or {}).values()):
+        process.terminate()
+
+
+def execute_list_file_in_worker(arguments: list,
+                                file_name: str) -> tuple:
+    """
+    Processes a single list-file, in a worker process of execute_in_parallel.
+
+    :param arguments: The command line arguments of the program.
+    :return: (output on stdout, output on stderr, exit code)
+    """
+    parse_result = parse_command_line(arguments)
+    parse_result.file_names = [file_name]
+    parse_result.num_jobs = 1
+    return output_and_exit_code_of(lambda: execute(parse_result, None))
+
+
+def execute_with_includes_in_parallel(parse_result: CommandLineParseResult):
+    """
+    Processes the list-files with their includes evaluated by worker processes
+    (see ProgramMainFunctionalityCommandWithIncludesInWorkers).
+    """
+    import concurrent.futures
+    with concurrent.futures.ProcessPoolExecutor(max_workers=parse_result.num_jobs) as executor:
+        command = ProgramMainFunctionalityCommandWithIncludesInWorkers(executor,
+                                                                       parse_result.num_jobs,
+                                                                       parse_result.arguments,
+                                                                       parse_result.file_names)
+        try:
+            execute_command(parse_result, command, None)
+        except BaseException:
+            terminate_worker_processes(executor)
+            raise
+
+
+# The parsed list-file of the last include evaluated by a worker process:
+# (arguments, file name) -> (CommandLineParseResult, ParsingSettings, list of Processor:s)
+_list_file_of_worker = {}
+
+
+def evaluate_include_in_worker(arguments: list,
+                               file_name: str,
+                               instruction_index: int,
+                               tags: Tags) -> tuple:
+    """
+    Evaluates an include of a list-file given on the command line,
+    in a worker process of execute_with_includes_in_parallel.
+
+    :param arguments: The command line arguments of the program.
+    :param instruction_index: The index of the include in the instructions of the list-file.
+    :param tags: The tags of the list-file when the include was reached.
+    :return: (output on stdout, output on stderr, exit code)
+    """
+    def evaluate():
+        key = (tuple(arguments), file_name)
+        if key not in _list_file_of_worker:
+            _list_file_of_worker.clear()
+            parse_result = parse_command_line(arguments)
+            parsing_settings = parsing_settings_for(parse_result).new_constructing_only_output_of(
+                parse_result.rendition_settings).new_with_result_item_batches()
+            file_parser = ListFileParser.for_top_level(parsing_settings, file_name)
+            file_processor = file_parser.apply(LinesSourceForFileArgument(parsing_settings, file_name))
+            _list_file_of_worker[key] = (parse_result, parsing_settings, file_processor.processors())
+        parse_result, parsing_settings, instructions = _list_file_of_worker[key]
+        env = RenditionEnvironment.for_top_level_file(
+            file_name,
+            parse_result.file_existence_handling_settings.program_should_fail_on_non_existing,
+            parse_result.tags_condition,
+            parse_result.rendition_settings,
+            tags)
+        for result_item in instructions[instruction_index].result_item_iterable(parsing_settings, env):
+            if result_item.include_in_output(env):
+                print(result_item.rendition(env))
+
+    return output_and_exit_code_of(lambda: exit_on_execution_exception(evaluate))
+
+
+def output_and_exit_code_of(action) -> tuple:
+    """
+    Executes an action that outputs on stdout and stderr, and that may exit.
+
+    :return: (output on stdout, output on stderr, exit code)
+    """
+    import contextlib
+    import io
+    stdout = io.StringIO()
+    stderr = io.StringIO()
+    with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+        try:
+            action()
+            exit_code = 0
+        except SystemExit as ex:
+            exit_code = exit_code_of_system_exit(ex.code)
+    return stdout.getvalue(), stderr.getvalue(), exit_code
+
+
+def exit_code_of_system_exit(code) -> int:
+    """
+    Translates the code of SystemExit to an exit code, like the interpreter does
+    (a code that is not an int is written to stderr).
+    """
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    sys.stderr.write(str(code) + os.linesep)
+    return 1
@@ -0,0 +1,315 @@
+"""
+Benchmarks of filelist, on synthetic workloads.
+
+Measures parsing of list-files, evaluation of includes, directory listings,
+tags and shell commands, rendition of paths, the start up time of the program,
+and end-to-end runs of the program.
+
+Results are written as JSON, and can be compared to the results of a previous run
+(a baseline). The exit code is non-zero if any benchmark is slower than the baseline,
+by more than a tolerance.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import workloads
+
+SRC_DIR = Path(__file__).resolve().parent.parent.parent / 'src'
+PROGRAM = SRC_DIR / 'filelist.py'
+
+sys.path.insert(0, str(SRC_DIR))
+
+# Runs of the program must not be forwarded to a running daemon.
+PROGRAM_ENVIRONMENT = dict(os.environ, FILELIST_NO_DAEMON='1')
+
+from filelist_lib import main as fl
+
+
+###############################################################################
+# - utilities for running filelist in-process -
+###############################################################################
+
+
+def new_parsing_settings() -> fl.ParsingSettings:
+    return fl.ParsingSettings(None,
+                              fl.system_line_parsers(fl.DEFAULT_INSTRUCTION_PREFIX),
+                              fl.instruction_identifier_to_parser_dict())
+
+
+def new_rendition_environment(list_file: str) -> fl.RenditionEnvironment:
+    rendition_settings = fl.RenditionSettings(False, True, False, False, False,
+                                              fl.TagsRenditionSettings(False, False),
+                                              False)
+    return fl.RenditionEnvironment.for_top_level_file(list_file,
+                                                      True,
+                                                      fl.TagsCondition.new_for_no_condition(),
+                                                      rendition_settings,
+                                                      fl.Tags.new_empty())
+
+
+def parse(list_file: str) -> fl.ProcessorForListFile:
+    parsing_settings = new_parsing_settings()
+    return fl.ListFileParser.for_top_level(parsing_settings, list_file).apply(
+        fl.LinesSourceForFileArgument(parsing_settings, list_file))
+
+
+def result_items(list_file: str) -> list:
+    parsing_settings = new_parsing_settings()
+    return list(parse(list_file).result_item_iterable(parsing_settings,
+                                                      new_rendition_environment(list_file)))
+
+
+###############################################################################
+# - benchmarks -
+###############################################################################
+
+
+class Benchmark:
+    """
+    A benchmark of a workload.
+
+    The measured function gives the number of items it has produced.
+    The preparation is done once, before the measurements, and is not measured.
+    """
+
+    def __init__(self,
+                 name: str,
+                 workload: str,
+                 measured: Callable[[str, object], int],
+                 preparation: Callable[[str], object] = lambda list_file: None):
+        self.name = name
+        self.workload = workload
+        self.measured = measured
+        self.preparation = preparation
+
+
+def _parse(list_file: str, prepared) -> int:
+    return len(parse(list_file).processors())
+
+
+def _evaluate(list_file: str, prepared) -> int:
+    return len(result_items(list_file))
+
+
+def _render(list_file: str, prepared) -> int:
+    env = new_rendition_environment(list_file)
+    lines = [item.rendition(env)
+             for item in prepared
+             if item.include_in_output(env)]
+    return len(lines)
+
+
+def _execute_main_command(list_file: str, prepared) -> int:
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        fl.ProgramMainFunctionalityCommand().execute([list_file],
+                                                     False,
+                                                     [],
+                                                     True,
+                                                     fl.TagsCondition.new_for_no_condition(),
+                                                     new_rendition_environment(list_file).rendition_settings,
+                                                     new_parsing_settings())
+    return output.getvalue().count('\n')
+
+
+def _run_program(list_file: str, prepared) -> int:
+    output = subprocess.run([sys.executable, str(PROGRAM), list_file],
+                            stdout=subprocess.PIPE,
+                            env=PROGRAM_ENVIRONMENT,
+                            check=True).stdout
+    return output.count(b'\n')
+
+
+def _run_interpreter(list_file: str, prepared) -> int:
+    """The start up time of the interpreter itself - for comparison with that of the program."""
+    subprocess.run([sys.executable, '-c', 'pass'],
+                   check=True)
+    return 0
+
+
+BENCHMARKS = [
+    Benchmark('parse/plain-paths', 'plain-paths', _parse),
+    Benchmark('parse/tags-churn', 'tags-churn', _parse),
+    Benchmark('evaluate/plain-paths', 'plain-paths', _evaluate),
+    Benchmark('evaluate/include-tree', 'include-tree', _evaluate),
+    Benchmark('evaluate/tags-churn', 'tags-churn', _evaluate),
+    Benchmark('evaluate/large-directory', 'large-directory', _evaluate),
+    Benchmark('evaluate/shell-lines', 'shell-lines', _evaluate),
+    Benchmark('render/plain-paths', 'plain-paths', _render, result_items),
+    Benchmark('render/large-directory', 'large-directory', _render, result_items),
+    Benchmark('in-process/include-tree', 'include-tree', _execute_main_command),
+    Benchmark('startup/interpreter', 'empty-list', _run_interpreter),
+    Benchmark('startup/empty-list', 'empty-list', _run_program),
+    Benchmark('cli/plain-paths', 'plain-paths', _run_program),
+    Benchmark('cli/include-tree', 'include-tree', _run_program),
+]
+
+
+def generate_workloads(root: Path, scale: float) -> Dict[str, str]:
+    """
+    :return: Maps workload names to list-files.
+    """
+
+    def scaled(n: int) -> int:
+        return max(1, int(n * scale))
+
+    return {
+        'plain-paths': workloads.plain_paths(root, scaled(20000)),
+        'include-tree': workloads.include_tree(root, 4, 4, scaled(20)),
+        'tags-churn': workloads.tags_churn(root, scaled(5000)),
+        'large-directory': workloads.large_directory(root, scaled(20000)),
+        'shell-lines': workloads.shell_lines(root, scaled(100)),
+        'empty-list': workloads.empty_list(root),
+    }
+
+
+def measure(benchmark: Benchmark,
+            list_file: str,
+            repeat: int) -> dict:
+    prepared = benchmark.preparation(list_file)
+    times = []
+    num_items = 0
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        num_items = benchmark.measured(list_file, prepared)
+        times.append(time.perf_counter() - start_time)
+    return {
+        'seconds': min(times),
+        'median-seconds': statistics.median(times),
+        'items': num_items,
+    }
+
+
+def run_benchmarks(benchmarks: List[Benchmark],
+                   workload_list_files: Dict[str, str],
+                   repeat: int) -> dict:
+    results = {}
+    for benchmark in benchmarks:
+        results[benchmark.name] = measure(benchmark,
+                                          workload_list_files[benchmark.workload],
+                                          repeat)
+        _msg('{:<28} {:>10.4f} s {:>10} items'.format(benchmark.name,
+                                                      results[benchmark.name]['seconds'],
+                                                      results[benchmark.name]['items']))
+    return results
+
+
+###############################################################################
+# - comparison with baseline -
+###############################################################################
+
+
+def compare(baseline: dict,
+            current: dict,
+            tolerance: float) -> List[str]:
+    """
+    Prints a comparison of benchmarks that exist in both the baseline and the current results.
+
+    :return: Names of benchmarks that are slower than the baseline, by more than the tolerance.
+    """
+    regressions = []
+    _msg('')
+    _msg('{:<28} {:>10} {:>10} {:>8}'.format('benchmark', 'baseline', 'current', 'ratio'))
+    for name, current_result in current.items():
+        if name not in baseline:
+            continue
+        baseline_seconds = baseline[name]['seconds']
+        ratio = current_result['seconds'] / baseline_seconds if baseline_seconds else 1.0
+        is_regression = ratio > 1.0 + tolerance
+        if is_regression:
+            regressions.append(name)
+        _msg('{:<28} {:>10.4f} {:>10.4f} {:>8.2f}{}'.format(name,
+                                                            baseline_seconds,
+                                                            current_result['seconds'],
+                                                            ratio,
+                                                            '  REGRESSION' if is_regression else ''))
+    return regressions
+
+
+###############################################################################
+# - main -
+###############################################################################
+
+
+def _msg(msg: str):
+    sys.stderr.write(msg + os.linesep)
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale',
+                        type=float,
+                        default=1.0,
+                        help='Multiplies the size of the workloads (default 1.0).')
+    parser.add_argument('--repeat',
+                        type=int,
+                        default=5,
+                        help='Number of measurements of each benchmark. The fastest is reported (default 5).')
+    parser.add_argument('--filter',
+                        metavar='SUBSTRING',
+                        help='Run only benchmarks who\'s name contains SUBSTRING.')
+    parser.add_argument('--output',
+                        metavar='FILE',
+                        type=Path,
+                        help='Write the results as JSON to FILE.')
+    parser.add_argument('--baseline',
+                        metavar='FILE',
+                        type=Path,
+                        help='Compare with the results in FILE (written by --output of a previous run).')
+    parser.add_argument('--tolerance',
+                        type=float,
+                        default=0.15,
+                        help='Allowed relative slow-down compared to the baseline (default 0.15).')
+    parser.add_argument('--work-dir',
+                        metavar='DIR',
+                        type=Path,
+                        help='Generate the workloads in DIR, instead of in a temporary directory.')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    benchmarks = [benchmark
+                  for benchmark in BENCHMARKS
+                  if args.filter is None or args.filter in benchmark.name]
+    original_cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix='filelist-benchmark-') as tmp_dir:
+        work_dir = args.work_dir.resolve() if args.work_dir else Path(tmp_dir)
+        _msg('Generating workloads in: ' + str(work_dir))
+        workload_list_files = generate_workloads(work_dir, args.scale)
+        os.chdir(str(work_dir))
+        try:
+            results = run_benchmarks(benchmarks, workload_list_files, args.repeat)
+        finally:
+            os.chdir(original_cwd)
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'scale': args.scale,
+        'benchmarks': results,
+    }
+    if args.output:
+        with args.output.open('w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    if args.baseline:
+        with args.baseline.open() as f:
+            baseline = json.load(f)
+        if compare(baseline['benchmarks'], results, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
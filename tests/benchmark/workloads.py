@@ -0,0 +1,117 @@
+"""
+Generators of synthetic workloads - list-files together with the files they refer to.
+
+Each generator creates its files under a given root directory, and gives
+the name of the top level list-file, relative the root directory.
+"""
+
+from pathlib import Path
+from typing import List
+
+MAX_FILES_PER_DIR = 1000
+
+
+def _write_lines(path: Path, lines: List[str]):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(''.join([line + '\n' for line in lines]))
+
+
+def _make_files(directory: Path, base_names: List[str]):
+    directory.mkdir(parents=True, exist_ok=True)
+    for base_name in base_names:
+        (directory / base_name).touch()
+
+
+def _file_names(num_files: int, suffix: str = '.txt') -> List[str]:
+    return ['file-' + str(n) + suffix for n in range(num_files)]
+
+
+def empty_list(root: Path) -> str:
+    """An empty list-file - for measuring the start up time of the program."""
+    _write_lines(root / 'empty-list' / 'top.list', [])
+    return 'empty-list/top.list'
+
+
+def plain_paths(root: Path, num_paths: int) -> str:
+    """A single list-file with num_paths paths of existing files, in sub directories."""
+    lines = []
+    for dir_number in range(0, num_paths, MAX_FILES_PER_DIR):
+        dir_name = 'dir-' + str(dir_number // MAX_FILES_PER_DIR)
+        base_names = _file_names(min(MAX_FILES_PER_DIR, num_paths - dir_number))
+        _make_files(root / 'plain-paths' / dir_name, base_names)
+        lines.extend([dir_name + '/' + base_name for base_name in base_names])
+    _write_lines(root / 'plain-paths' / 'top.list', lines)
+    return 'plain-paths/top.list'
+
+
+def include_tree(root: Path,
+                 depth: int,
+                 fanout: int,
+                 paths_per_file: int) -> str:
+    """
+    A tree of list-files, each in a directory of its own.
+
+    Each list-file contains paths_per_file paths, and includes fanout list-files
+    (except for the list-files at the given depth).
+    """
+    base_names = _file_names(paths_per_file)
+
+    def make_node(directory: Path, level: int):
+        _make_files(directory, base_names)
+        lines = list(base_names)
+        if level < depth:
+            for child in range(fanout):
+                child_dir_name = 'node-' + str(child)
+                lines.append('@INCLUDE ' + child_dir_name + '/node.list')
+                make_node(directory / child_dir_name, level + 1)
+        _write_lines(directory / 'node.list', lines)
+
+    make_node(root / 'include-tree', 0)
+    return 'include-tree/node.list'
+
+
+def tags_churn(root: Path, num_blocks: int) -> str:
+    """A list-file that modifies the tags before every path."""
+    directory = root / 'tags-churn'
+    base_names = _file_names(min(num_blocks, MAX_FILES_PER_DIR))
+    _make_files(directory, base_names)
+    lines = []
+    for n in range(num_blocks):
+        base_name = base_names[n % len(base_names)]
+        lines.extend(['@TAGS PUSH',
+                      '@TAGS SET tag-a tag-' + str(n % 17),
+                      base_name,
+                      '@TAGS ADD tag-b,tag-c',
+                      base_name,
+                      '@TAGS REMOVE tag-a',
+                      base_name,
+                      '@TAGS POP',
+                      ])
+    _write_lines(directory / 'top.list', lines)
+    return 'tags-churn/top.list'
+
+
+def large_directory(root: Path, num_entries: int) -> str:
+    """A list-file that lists a single directory, with num_entries files, in different ways."""
+    directory = root / 'large-directory'
+    num_headers = num_entries // 2
+    _make_files(directory / 'big', _file_names(num_headers, '.h'))
+    _make_files(directory / 'big', _file_names(num_entries - num_headers, '.c'))
+    _write_lines(directory / 'top.list',
+                 ['@LIST big',
+                  '@LIST big *.h',
+                  '@LIST big -s -r "^file-1.*\\.c$"',
+                  '@LIST big -t f -e "*-2*"',
+                  ])
+    return 'large-directory/top.list'
+
+
+def shell_lines(root: Path, num_lines: int) -> str:
+    """A list-file with num_lines SHELL instructions, each giving a single path."""
+    directory = root / 'shell-lines'
+    base_names = _file_names(min(num_lines, MAX_FILES_PER_DIR))
+    _make_files(directory, base_names)
+    _write_lines(directory / 'top.list',
+                 ['@SHELL echo ' + base_names[n % len(base_names)]
+                  for n in range(num_lines)])
+    return 'shell-lines/top.list'
@@ -0,0 +1,145 @@
+"""
+Tests that the memory used by representative workloads stays within budgets.
+
+Each workload is run in-process through Command.execute, under tracemalloc.
+The peak of traced memory is compared to a budget for the peak, and to a
+budget per emitted path.
+
+A budget is exceeded if the measured value is larger than the budget by more than
+a tolerance. The tolerance is a fraction of the budget, and can be set via the
+environment variable FILELIST_MEMORY_TOLERANCE (default 0.25).
+
+Set the environment variable FILELIST_MEMORY_REPORT to print the measured values
+(useful when budgets must be updated).
+"""
+
+import os
+import sys
+import tempfile
+import tracemalloc
+import unittest
+from pathlib import Path
+
+TESTS_DIR = Path(__file__).resolve().parent.parent
+
+sys.path.insert(0, str(TESTS_DIR / 'unit'))
+sys.path.insert(0, str(TESTS_DIR / 'benchmark'))
+
+import workloads
+from filelist_test_utils import main, new_parsing_settings, new_rendition_settings
+
+TOLERANCE = float(os.environ.get('FILELIST_MEMORY_TOLERANCE', '0.25'))
+
+
+class Budget(tuple):
+    def __new__(cls,
+                peak_bytes: int,
+                bytes_per_path: int):
+        return tuple.__new__(cls, (peak_bytes, bytes_per_path))
+
+    @property
+    def peak_bytes(self) -> int:
+        return self[0]
+
+    @property
+    def bytes_per_path(self) -> int:
+        return self[1]
+
+
+class LineCountingOutput:
+    """A replacement for stdout that counts lines, without storing them."""
+
+    def __init__(self):
+        self.num_lines = 0
+
+    def write(self, s: str):
+        self.num_lines += s.count('\n')
+
+    def flush(self):
+        pass
+
+
+def execute(list_file: str) -> int:
+    """
+    Executes the main functionality on a list-file.
+
+    :return: Number of output lines.
+    """
+    existence = main.FileExistenceHandlingSettings.new_fail_on_non_existing()
+    output = LineCountingOutput()
+    original_stdout = sys.stdout
+    sys.stdout = output
+    try:
+        main.ProgramMainFunctionalityCommand().execute([list_file],
+                                                       False,
+                                                       [],
+                                                       existence.program_should_fail_on_non_existing,
+                                                       main.TagsCondition.new_for_no_condition(),
+                                                       new_rendition_settings(existence),
+                                                       new_parsing_settings())
+    finally:
+        sys.stdout = original_stdout
+    return output.num_lines
+
+
+class MemoryBudgetTestBase(unittest.TestCase):
+    tmp_dir = None
+    original_cwd = None
+
+    @classmethod
+    def setUpClass(cls):
+        cls.original_cwd = os.getcwd()
+        cls.tmp_dir = tempfile.TemporaryDirectory(prefix='filelist-memory-')
+        os.chdir(cls.tmp_dir.name)
+
+    @classmethod
+    def tearDownClass(cls):
+        os.chdir(cls.original_cwd)
+        cls.tmp_dir.cleanup()
+
+    def _assert_within_budget(self,
+                              list_file: str,
+                              budget: Budget):
+        # Modules and instruction parsers are loaded lazily, the first time they are used.
+        # This is done once per process, so it is not part of the budget.
+        execute(list_file)
+        tracemalloc.start()
+        try:
+            num_paths = execute(list_file)
+            peak_bytes = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        bytes_per_path = peak_bytes // max(1, num_paths)
+        if os.environ.get('FILELIST_MEMORY_REPORT'):
+            sys.stderr.write('{}: peak {} bytes, {} paths, {} bytes/path\n'.format(self.id(),
+                                                                                 peak_bytes,
+                                                                                 num_paths,
+                                                                                 bytes_per_path))
+        self.assertLessEqual(peak_bytes,
+                             budget.peak_bytes * (1 + TOLERANCE),
+                             'peak memory')
+        self.assertLessEqual(bytes_per_path,
+                             budget.bytes_per_path * (1 + TOLERANCE),
+                             'memory per emitted path')
+
+
+class TestPlainPaths(MemoryBudgetTestBase):
+    def test(self):
+        list_file = workloads.plain_paths(Path('.'), 20000)
+        self._assert_within_budget(list_file, Budget(11000000, 550))
+
+
+class TestIncludeTree(MemoryBudgetTestBase):
+    def test(self):
+        list_file = workloads.include_tree(Path('.'), 4, 4, 20)
+        self._assert_within_budget(list_file, Budget(50000, 8))
+
+
+class TestLargeDirectory(MemoryBudgetTestBase):
+    def test(self):
+        list_file = workloads.large_directory(Path('.'), 20000)
+        self._assert_within_budget(list_file, Budget(5500000, 115))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,21 @@
+"""
+Reads a trace in the Chrome Trace Event Format from stdin,
+and checks that it contains complete events of the categories given as arguments.
+"""
+
+import json
+import sys
+
+trace = json.load(sys.stdin)
+
+categories = set()
+for event in trace["traceEvents"]:
+    if event["ph"] != "X":
+        sys.exit("Not a complete event: " + str(event))
+    if event["dur"] < 0:
+        sys.exit("Negative duration: " + str(event))
+    categories.add(event["cat"])
+
+missing_categories = set(sys.argv[1:]) - categories
+if missing_categories:
+    sys.exit("Missing categories: " + str(sorted(missing_categories)))
@@ -0,0 +1,73 @@
+"""
+Utilities for tests that use filelist_lib in-process.
+
+Importing this module makes filelist_lib importable from the source directory.
+"""
+
+import contextlib
+import io
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parent.parent.parent / 'src'
+
+if str(SRC_DIR) not in sys.path:
+    sys.path.insert(0, str(SRC_DIR))
+
+from filelist_lib import main
+
+
+@contextlib.contextmanager
+def tmp_dir_as_cwd(files: dict):
+    """
+    Creates a temporary directory with the given files, and makes it the current directory.
+
+    :param files: Maps relative file names to contents.
+    """
+    original_cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix='filelist-test-') as tmp_dir:
+        for file_name, contents in files.items():
+            path = Path(tmp_dir) / file_name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(contents)
+        os.chdir(tmp_dir)
+        try:
+            yield Path(tmp_dir)
+        finally:
+            os.chdir(original_cwd)
+
+
+def new_parsing_settings(preprocessor: str = None) -> main.ParsingSettings:
+    return main.ParsingSettings(preprocessor,
+                                main.system_line_parsers(main.DEFAULT_INSTRUCTION_PREFIX),
+                                main.instruction_identifier_to_parser_dict())
+
+
+def new_rendition_settings(existence: main.FileExistenceHandlingSettings) -> main.RenditionSettings:
+    return main.RenditionSettings(False,
+                                  existence.include_existing_in_output,
+                                  existence.include_non_existing_in_output,
+                                  False,
+                                  False,
+                                  main.TagsRenditionSettings(False, False),
+                                  False)
+
+
+def execute_main_command(file_names: list,
+                         observer: main.Observer = None,
+                         existence: main.FileExistenceHandlingSettings =
+                         main.FileExistenceHandlingSettings.new_fail_on_non_existing()) -> str:
+    """Executes the main functionality, and gives the output on stdout."""
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        main.ProgramMainFunctionalityCommand().execute(file_names,
+                                                       False,
+                                                       [],
+                                                       existence.program_should_fail_on_non_existing,
+                                                       main.TagsCondition.new_for_no_condition(),
+                                                       new_rendition_settings(existence),
+                                                       new_parsing_settings(),
+                                                       observer)
+    return output.getvalue()
@@ -0,0 +1,191 @@
+import asyncio
+import io
+import unittest
+
+from filelist_test_utils import tmp_dir_as_cwd
+
+from filelist_lib import api
+
+FILES = {
+    'top.list': '\n'.join(['existing.txt',
+                           '@PRINT a message',
+                           '@TAGS SET t1',
+                           'dir/./existing.txt',
+                           'non-existing.txt',
+                           '']),
+    'existing.txt': '',
+    'dir/existing.txt': '',
+}
+
+
+FILES_WITH_INCLUDES = {
+    'top.list': '\n'.join(['@TAGS SET t1',
+                           '@INCLUDE dir/included.list',
+                           '@INCLUDE -I dir/included.list',
+                           '@INCLUDE dir/tags.list',
+                           '@SHELL echo existing.txt; echo non-existing.txt',
+                           '@INCLUDE -E dir/included.list',
+                           '@LIST dir -s *.txt',
+                           'existing.txt',
+                           'non-existing.txt',
+                           '@INCLUDE -p dir/included.list',
+                           '']),
+    'existing.txt': '',
+    'dir/included.list': '\n'.join(['existing.txt',
+                                     '@TAGS ADD t2',
+                                     'non-existing.txt',
+                                     '@LIST . -t f',
+                                     '']),
+    'dir/tags.list': '@TAGS ADD t3\n',
+    'dir/existing.txt': '',
+    'dir/other.txt': '',
+}
+
+
+def paths(file_paths) -> list:
+    return [file_path.path for file_path in file_paths]
+
+
+def async_paths(files: list, **kwargs) -> list:
+    """
+    :return: The paths given by aiter_paths, and the exception that ended the iteration, or None.
+    """
+    async def paths_and_exception():
+        file_paths = []
+        try:
+            async for file_path in api.aiter_paths(files, **kwargs):
+                file_paths.append(file_path)
+        except api.ExecutionException as ex:
+            return file_paths, ex
+        return file_paths, None
+
+    return asyncio.run(paths_and_exception())
+
+
+def sync_paths(files: list, **kwargs) -> list:
+    file_paths = []
+    try:
+        for file_path in api.iter_paths(files, **kwargs):
+            file_paths.append(file_path)
+    except api.ExecutionException as ex:
+        return file_paths, ex
+    return file_paths, None
+
+
+def rendered(ex: api.ExecutionException) -> str:
+    output = io.StringIO()
+    ex.render(output)
+    return output.getvalue()
+
+
+class TestIterPaths(unittest.TestCase):
+    def test_paths_and_tags_are_given_without_other_output(self):
+        with tmp_dir_as_cwd(FILES):
+            actual = list(api.iter_paths(['top.list'], missing='include'))
+        self.assertEqual(['existing.txt', 'dir/./existing.txt', 'non-existing.txt'], paths(actual))
+        self.assertEqual([frozenset(), frozenset(['t1']), frozenset(['t1'])],
+                         [file_path.tags for file_path in actual])
+        self.assertEqual([True, True, False],
+                         [file_path.exists for file_path in actual])
+
+    def test_normalize(self):
+        with tmp_dir_as_cwd(FILES):
+            actual = list(api.iter_paths(['top.list'], missing='ignore', normalize=True))
+        self.assertEqual(['existing.txt', 'dir/existing.txt'], paths(actual))
+
+    def test_tags_condition(self):
+        with tmp_dir_as_cwd(FILES):
+            actual = list(api.iter_paths(['top.list'],
+                                         tags_condition=api.new_tags_condition(['t1']),
+                                         missing='ignore'))
+        self.assertEqual(['dir/./existing.txt'], paths(actual))
+
+    def test_paths_are_given_lazily_before_missing_file_error(self):
+        with tmp_dir_as_cwd(FILES):
+            iterator = api.iter_paths(['top.list'])
+            self.assertEqual('existing.txt', next(iterator).path)
+            self.assertEqual('dir/./existing.txt', next(iterator).path)
+            with self.assertRaises(api.ResultItemConstructionForMissingFileException):
+                next(iterator)
+
+    def test_non_existing_file_argument_raises_exception(self):
+        with tmp_dir_as_cwd(FILES):
+            with self.assertRaises(api.FileArgumentException):
+                list(api.iter_paths(['non-existing.list']))
+
+    def test_syntax_error_raises_exception(self):
+        with tmp_dir_as_cwd({'top.list': '@NON-EXISTING-INSTRUCTION\n'}):
+            with self.assertRaises(api.InstructionSyntaxErrorException):
+                list(api.iter_paths(['top.list']))
+
+    def test_invalid_arguments_are_reported_directly(self):
+        with self.assertRaises(ValueError):
+            api.iter_paths(['top.list'], missing='invalid')
+        with self.assertRaises(ValueError):
+            api.new_tags_condition(['t'], 'invalid-operator')
+
+
+class TestAiterPaths(unittest.TestCase):
+    def _assert_same_as_iter_paths(self, files: dict, max_concurrency: int = 8, **kwargs):
+        # Each evaluation has its own directory, since shell commands may create files.
+        with tmp_dir_as_cwd(files):
+            expected_paths, expected_exception = sync_paths(['top.list'], **kwargs)
+        with tmp_dir_as_cwd(files):
+            actual_paths, actual_exception = async_paths(['top.list'], max_concurrency=max_concurrency, **kwargs)
+        self.assertEqual([(p.path, p.tags, p.exists) for p in expected_paths],
+                         [(p.path, p.tags, p.exists) for p in actual_paths])
+        self.assertIs(type(expected_exception), type(actual_exception))
+        if expected_exception is not None:
+            self.assertEqual(rendered(expected_exception), rendered(actual_exception))
+        return actual_paths
+
+    def test_same_paths_as_iter_paths(self):
+        for max_concurrency in [1, 4]:
+            actual = self._assert_same_as_iter_paths(FILES_WITH_INCLUDES,
+                                                     missing='include',
+                                                     max_concurrency=max_concurrency)
+            self.assertEqual(28, len(actual))
+
+    def test_same_paths_before_missing_file_error_as_iter_paths(self):
+        self._assert_same_as_iter_paths(FILES_WITH_INCLUDES)
+
+    def test_same_shell_command_error_as_iter_paths(self):
+        files = dict(FILES_WITH_INCLUDES)
+        files['top.list'] = 'existing.txt\n@SHELL echo output; exit 3\nexisting.txt\n'
+        self._assert_same_as_iter_paths(files)
+
+    def test_same_missing_included_file_error_as_iter_paths(self):
+        files = dict(FILES_WITH_INCLUDES)
+        files['top.list'] = 'existing.txt\n@INCLUDE non-existing.list\n@INCLUDE dir/included.list\n'
+        self._assert_same_as_iter_paths(files, missing='include')
+
+    def test_file_created_by_shell_command_is_included(self):
+        files = {'top.list': '@SHELL echo existing.txt > created.list\n@INCLUDE created.list\n',
+                 'existing.txt': ''}
+        actual = self._assert_same_as_iter_paths(files)
+        self.assertEqual(['existing.txt'], paths(actual))
+
+    def test_file_created_by_shell_command_of_included_file_is_included(self):
+        files = {'top.list': '@INCLUDE gen.list\n@INCLUDE created.list\n',
+                 'gen.list': '@SHELL sleep 0.3; echo existing.txt > created.list\n',
+                 'existing.txt': ''}
+        actual = self._assert_same_as_iter_paths(files)
+        self.assertEqual(['existing.txt'], paths(actual))
+
+    def test_file_created_by_preprocessor_of_included_file_is_included(self):
+        files = {'top.list': '@INCLUDE gen.list\n@INCLUDE created.list\n',
+                 'gen.list': '# generate\n',
+                 'existing.txt': ''}
+        preprocessor = ('sh -c \'input=$(cat); case "$input" in'
+                        ' *generate*) sleep 0.3; echo existing.txt > created.list;;'
+                        ' *) printf "%s\\n" "$input";; esac\'')
+        actual = self._assert_same_as_iter_paths(files, preprocessor=preprocessor)
+        self.assertEqual(['existing.txt'], paths(actual))
+
+    def test_invalid_arguments_are_reported_directly(self):
+        with self.assertRaises(ValueError):
+            api.aiter_paths(['top.list'], max_concurrency=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import os
+import subprocess
+import sys
+import time
+import unittest
+
+from filelist_test_utils import SRC_DIR, tmp_dir_as_cwd
+
+PROGRAM = SRC_DIR / 'filelist.py'
+
+NUM_FILES = 100000
+
+FILES = {
+    'top.list': '\n'.join(['file.txt'] * NUM_FILES +
+                          ['@SHELL touch shell-command-was-executed',
+                           '']),
+    'file.txt': '',
+}
+
+SHELL_COMMAND_DURATION = 1
+
+FILES_FOR_JOBS = {
+    'first.list': '\n'.join(['file.txt'] * NUM_FILES + ['']),
+    'second.list': '\n'.join(['@SHELL sleep ' + str(SHELL_COMMAND_DURATION),
+                              '@SHELL touch shell-command-was-executed',
+                              '']),
+    'file.txt': '',
+}
+
+
+class TestClosedStdout(unittest.TestCase):
+    def _run_until_stdout_is_closed(self, arguments: list) -> subprocess.Popen:
+        environment = dict(os.environ, FILELIST_NO_DAEMON='1')
+        with subprocess.Popen([sys.executable, str(PROGRAM)] + arguments,
+                              stdout=subprocess.PIPE,
+                              stderr=subprocess.PIPE,
+                              env=environment) as process:
+            self.assertEqual(b'file.txt\n', process.stdout.readline())
+            process.stdout.close()
+            _, stderr = process.communicate()
+        self.assertEqual(b'', stderr)
+        self.assertEqual(0, process.returncode)
+        return process
+
+    def test_execution_stops_and_program_exits_quietly(self):
+        with tmp_dir_as_cwd(FILES):
+            self._run_until_stdout_is_closed(['top.list'])
+            self.assertFalse(os.path.exists('shell-command-was-executed'))
+
+    def test_worker_processes_are_stopped(self):
+        with tmp_dir_as_cwd(FILES_FOR_JOBS):
+            self._run_until_stdout_is_closed(['-j', '2', 'first.list', 'second.list'])
+            # The command following the running one must not be executed.
+            time.sleep(SHELL_COMMAND_DURATION + 0.5)
+            self.assertFalse(os.path.exists('shell-command-was-executed'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import unittest
+
+from filelist_test_utils import main, new_parsing_settings, new_rendition_settings, tmp_dir_as_cwd, \
+    execute_main_command
+
+FILES = {
+    'top.list': '\n'.join(['existing.txt',
+                           'non-existing.txt',
+                           '@PRINT a message',
+                           '@TAGS PRINT',
+                           '@LIST dir',
+                           '']),
+    'existing.txt': '',
+    'dir/existing.txt': '',
+}
+
+
+class RecordingObserver(main.Observer):
+    def __init__(self):
+        self.events = []
+
+    def directory_listed(self, source, directory_path, num_entries, start_time, duration):
+        self.events.append(('listed', directory_path))
+
+    def path_checked(self, source, path, exists, start_time, duration):
+        self.events.append(('checked', path))
+
+
+def result_items(file_name: str,
+                 parsing_settings: main.ParsingSettings,
+                 existence: main.FileExistenceHandlingSettings) -> list:
+    file_processor = main.ListFileParser.for_top_level(parsing_settings, file_name).apply(
+        main.LinesSourceForFileArgument(parsing_settings, file_name))
+    env = main.RenditionEnvironment.for_top_level_file(file_name,
+                                                       existence.program_should_fail_on_non_existing,
+                                                       main.TagsCondition.new_for_no_condition(),
+                                                       new_rendition_settings(existence),
+                                                       main.Tags.new_empty())
+    return list(file_processor.result_item_iterable(parsing_settings, env))
+
+
+class TestOnlyItemsThatAreOutputAreConstructed(unittest.TestCase):
+    def test_all_items_are_constructed_by_default(self):
+        existence = main.FileExistenceHandlingSettings.new_include_non_existing()
+        with tmp_dir_as_cwd(FILES):
+            items = result_items('top.list', new_parsing_settings(), existence)
+        self.assertEqual(['ResultItemForFilePathExisting',
+                          'ResultItemForFilePathNonExisting',
+                          'ResultItemForPrint',
+                          'ResultItemForTagsPrint',
+                          'ResultItemForFilePathExisting'],
+                         [type(item).__name__ for item in items])
+
+    def test_non_existing_files_are_not_constructed_if_ignored(self):
+        existence = main.FileExistenceHandlingSettings.new_ignore_non_existing()
+        parsing_settings = new_parsing_settings().new_constructing_only_output_of(new_rendition_settings(existence))
+        with tmp_dir_as_cwd(FILES):
+            items = result_items('top.list', parsing_settings, existence)
+        self.assertEqual(['ResultItemForFilePathExisting',
+                          'ResultItemForPrint',
+                          'ResultItemForTagsPrint',
+                          'ResultItemForFilePathExisting'],
+                         [type(item).__name__ for item in items])
+
+    def test_non_path_items_are_not_constructed_if_suppressed(self):
+        existence = main.FileExistenceHandlingSettings.new_include_non_existing()
+        rendition_settings = new_rendition_settings(existence)
+        rendition_settings.suppress_non_path_output = True
+        parsing_settings = new_parsing_settings().new_constructing_only_output_of(rendition_settings)
+        with tmp_dir_as_cwd(FILES):
+            items = result_items('top.list', parsing_settings, existence)
+        self.assertEqual(['ResultItemForFilePathExisting',
+                          'ResultItemForFilePathNonExisting',
+                          'ResultItemForFilePathExisting'],
+                         [type(item).__name__ for item in items])
+
+    def test_directories_are_not_listed_if_only_non_existing_files_are_output(self):
+        observer = RecordingObserver()
+        with tmp_dir_as_cwd(FILES):
+            output = execute_main_command(['top.list'],
+                                          observer,
+                                          main.FileExistenceHandlingSettings.new_only_non_existing())
+        self.assertEqual('non-existing.txt\na message\n\n', output)
+        self.assertEqual([('checked', 'existing.txt'),
+                          ('checked', 'non-existing.txt')],
+                         observer.events)
+
+
+if __name__ == '__main__':
+    unittest.main()
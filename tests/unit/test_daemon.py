@@ -0,0 +1,197 @@
+import contextlib
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from filelist_test_utils import SRC_DIR, main, tmp_dir_as_cwd
+
+from filelist_lib import daemon_client
+
+PROGRAM = SRC_DIR / 'filelist.py'
+
+FILES = {
+    'top.list': '\n'.join(['existing.txt',
+                           '@INCLUDE dir/included.list',
+                           '@LIST dir -s *.txt',
+                           '']),
+    'existing.txt': '',
+    'dir/included.list': 'existing.txt\n',
+    'dir/existing.txt': '',
+}
+
+
+def run_main(arguments: list, caches: main.EvaluationCaches) -> str:
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        main.main(arguments, caches)
+    return output.getvalue()
+
+
+def modify(path: str, contents: str):
+    """Writes a file, and makes sure that its modification time changes."""
+    mtime_ns = os.stat(path).st_mtime_ns
+    Path(path).write_text(contents)
+    os.utime(path, ns=(mtime_ns + 10 ** 9, mtime_ns + 10 ** 9))
+
+
+def touch_directory(path: str):
+    mtime_ns = os.stat(path).st_mtime_ns
+    os.utime(path, ns=(mtime_ns + 10 ** 9, mtime_ns + 10 ** 9))
+
+
+class TestEvaluationCaches(unittest.TestCase):
+    def test_parsed_files_and_listings_are_reused(self):
+        caches = main.EvaluationCaches()
+        with tmp_dir_as_cwd(FILES):
+            first = run_main(['top.list'], caches)
+            second = run_main(['top.list'], caches)
+        self.assertEqual('existing.txt\ndir/existing.txt\ndir/existing.txt\n', first)
+        self.assertEqual(first, second)
+        self.assertEqual(1, len(caches.directory_listing_cache))
+
+    def test_modified_list_file_is_parsed_again(self):
+        caches = main.EvaluationCaches()
+        with tmp_dir_as_cwd(FILES):
+            run_main(['top.list'], caches)
+            modify('dir/included.list', 'new.txt\n')
+            Path('dir/new.txt').touch()
+            actual = run_main(['top.list'], caches)
+        self.assertEqual('existing.txt\ndir/new.txt\ndir/existing.txt\ndir/new.txt\n', actual)
+
+    def test_modified_directory_is_listed_again(self):
+        caches = main.EvaluationCaches()
+        with tmp_dir_as_cwd(FILES):
+            run_main(['top.list'], caches)
+            os.remove('dir/existing.txt')
+            Path('dir/other.txt').touch()
+            modify('dir/included.list', 'other.txt\n')
+            touch_directory('dir')
+            actual = run_main(['top.list'], caches)
+        self.assertEqual('existing.txt\ndir/other.txt\ndir/other.txt\n', actual)
+
+    def test_list_files_are_not_cached_when_a_preprocessor_is_used(self):
+        caches = main.EvaluationCaches()
+        with tmp_dir_as_cwd(FILES):
+            run_main(['--preprocessor', 'cat', 'top.list'], caches)
+        parsing_settings_without_preprocessor = caches.parsing_settings_with_caches(
+            main.ParsingSettings(None, [], {}),
+            main.DEFAULT_INSTRUCTION_PREFIX)
+        self.assertEqual(0, len(parsing_settings_without_preprocessor.list_file_cache))
+
+
+class TestDaemon(unittest.TestCase):
+    """Runs the program as a client of a daemon, in a separate process."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.socket_dir = tempfile.TemporaryDirectory(prefix='filelist-daemon-test-')
+        cls.socket_path = os.path.join(cls.socket_dir.name, 'daemon.sock')
+        cls.daemon = subprocess.Popen([sys.executable, str(PROGRAM), '--daemon', cls.socket_path],
+                                      stdin=subprocess.DEVNULL)
+        deadline = time.monotonic() + 10
+        while not os.path.exists(cls.socket_path):
+            if time.monotonic() > deadline or cls.daemon.poll() is not None:
+                raise RuntimeError('daemon did not start')
+            time.sleep(0.02)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.daemon.terminate()
+        cls.daemon.wait()
+        cls.socket_dir.cleanup()
+
+    def _run(self,
+             arguments: list,
+             use_daemon: bool = True,
+             stdin: str = '',
+             environment: dict = None) -> subprocess.CompletedProcess:
+        env = dict(os.environ)
+        env.update(environment or {})
+        env['FILELIST_DAEMON_SOCKET'] = self.socket_path
+        if use_daemon:
+            env.pop('FILELIST_NO_DAEMON', None)
+        else:
+            env['FILELIST_NO_DAEMON'] = '1'
+        return subprocess.run([sys.executable, str(PROGRAM)] + arguments,
+                              input=stdin,
+                              stdout=subprocess.PIPE,
+                              stderr=subprocess.PIPE,
+                              universal_newlines=True,
+                              env=env)
+
+    def test_output_is_the_same_as_without_daemon(self):
+        with tmp_dir_as_cwd(FILES):
+            expected = self._run(['top.list'], use_daemon=False)
+            actual = self._run(['top.list'])
+        self.assertEqual(0, actual.returncode)
+        self.assertEqual(expected.stdout, actual.stdout)
+
+    def test_errors_and_exit_code_are_forwarded(self):
+        with tmp_dir_as_cwd({'top.list': 'non-existing.txt\n'}):
+            expected = self._run(['top.list'], use_daemon=False)
+            actual = self._run(['top.list'])
+        self.assertEqual(main.EXIT_FILE_DOES_NOT_EXIST, actual.returncode)
+        self.assertEqual(expected.stderr, actual.stderr)
+
+    def test_stdin_is_forwarded(self):
+        with tmp_dir_as_cwd(FILES):
+            actual = self._run(['-'], stdin='existing.txt\n')
+        self.assertEqual(0, actual.returncode)
+        self.assertEqual('existing.txt\n', actual.stdout)
+
+    def test_only_named_environment_variables_are_forwarded(self):
+        files = {'top.list': '@SHELL echo "x$FILELIST_TEST_VARIABLE"\n',
+                 'x': '',
+                 'x.txt': ''}
+        with tmp_dir_as_cwd(files):
+            not_named = self._run(['top.list'],
+                                  environment={'FILELIST_TEST_VARIABLE': '.txt'})
+            named = self._run(['top.list'],
+                              environment={'FILELIST_TEST_VARIABLE': '.txt',
+                                           'FILELIST_DAEMON_ENVIRONMENT': 'OTHER FILELIST_TEST_VARIABLE'})
+        self.assertEqual('x\n', not_named.stdout)
+        self.assertEqual('x.txt\n', named.stdout)
+
+    def test_commands_use_the_streams_of_the_client(self):
+        files = {'top.list': '@SHELL echo to-stderr >&2; cat\n',
+                 'existing.txt': ''}
+        with tmp_dir_as_cwd(files):
+            actual = self._run(['top.list'], stdin='existing.txt\n')
+        self.assertEqual(0, actual.returncode)
+        self.assertEqual('existing.txt\n', actual.stdout)
+        self.assertEqual('to-stderr\n', actual.stderr)
+
+    def test_modified_list_file_is_read_again(self):
+        with tmp_dir_as_cwd(FILES):
+            self._run(['top.list'])
+            modify('top.list', 'dir/existing.txt\n')
+            actual = self._run(['top.list'])
+        self.assertEqual('dir/existing.txt\n', actual.stdout)
+
+
+class TestSocketMustBePrivate(unittest.TestCase):
+    def test_socket_in_private_directory_is_private(self):
+        with tempfile.TemporaryDirectory() as directory:
+            os.chmod(directory, 0o700)
+            self.assertIsNone(daemon_client.non_private_socket_reason(os.path.join(directory, 'daemon.sock')))
+
+    def test_socket_in_directory_writable_by_others_is_not_private(self):
+        with tempfile.TemporaryDirectory() as directory:
+            os.chmod(directory, 0o777)
+            self.assertIsNotNone(daemon_client.non_private_socket_reason(os.path.join(directory, 'daemon.sock')))
+
+    def test_socket_that_is_not_a_socket_is_not_private(self):
+        with tempfile.TemporaryDirectory() as directory:
+            os.chmod(directory, 0o700)
+            socket_path = os.path.join(directory, 'daemon.sock')
+            os.symlink(os.path.join(directory, 'other.sock'), socket_path)
+            self.assertIsNotNone(daemon_client.non_private_socket_reason(socket_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import contextlib
+import io
+import os
+import unittest
+
+from filelist_test_utils import main, tmp_dir_as_cwd
+
+FILES = {
+    'file.txt': 'top',
+    'dir/file.txt': 'in dir',
+    'dir/sub/file.txt': 'in sub',
+}
+
+PATHS = [
+    'file.txt',
+    'non-existing',
+    'dir',
+    'dir/',
+    'dir/file.txt',
+    'dir/sub/file.txt',
+    'dir/sub/../file.txt',
+    'dir/non-existing',
+    'dir/file.txt/non-existing',
+    'non-existing/file.txt',
+    'dir/sub/..',
+]
+
+
+@unittest.skipUnless(main.DirectoryFdFileSystem.is_supported(), 'dir_fd is not supported')
+class TestDirectoryFdFileSystem(unittest.TestCase):
+    def test_answers_are_those_of_the_operating_system(self):
+        with tmp_dir_as_cwd(FILES):
+            file_system = main.DirectoryFdFileSystem()
+            try:
+                for path in PATHS + [os.path.abspath(path) for path in PATHS]:
+                    with self.subTest(path=path):
+                        self.assertEqual(os.path.exists(path), file_system.exists(path))
+                        self.assertEqual(os.path.isfile(path), file_system.is_file(path))
+                        self.assertEqual(os.path.isdir(path), file_system.is_dir(path))
+                for dir_path in ['', 'dir/', 'dir/sub/', 'non-existing/']:
+                    for file_name in ['file.txt', 'sub/file.txt', '../file.txt', os.path.abspath('file.txt')]:
+                        with self.subTest(dir_path=dir_path, file_name=file_name):
+                            self.assertEqual(os.path.exists(os.path.join(dir_path, file_name)),
+                                             file_system.exists_in_directory(dir_path, file_name))
+            finally:
+                file_system.close()
+
+    def test_open_text_file(self):
+        with tmp_dir_as_cwd(FILES):
+            file_system = main.DirectoryFdFileSystem()
+            try:
+                for path, contents in FILES.items():
+                    with file_system.open_text_file(path) as f:
+                        self.assertEqual(contents, f.read())
+                with self.assertRaises(OSError):
+                    file_system.open_text_file('dir/non-existing')
+            finally:
+                file_system.close()
+
+    def test_number_of_open_directories_is_limited(self):
+        with tmp_dir_as_cwd(FILES):
+            file_system = main.DirectoryFdFileSystem(2)
+            try:
+                for dir_path in ['dir/', 'dir/sub/', 'dir/', 'non-existing/']:
+                    file_system.exists_in_directory(dir_path, 'file.txt')
+                self.assertEqual(['dir/', 'non-existing/'], list(file_system._fds))
+            finally:
+                file_system.close()
+            self.assertEqual(0, len(file_system))
+
+    def test_removed_directory_is_not_seen_after_invalidation(self):
+        with tmp_dir_as_cwd(FILES):
+            file_system = main.DirectoryFdFileSystem()
+            try:
+                self.assertTrue(file_system.exists_in_directory('dir/sub/', 'file.txt'))
+                os.rename('dir/sub', 'dir/moved')
+                os.mkdir('dir/sub')
+                file_system.invalidate()
+                self.assertFalse(file_system.exists_in_directory('dir/sub/', 'file.txt'))
+            finally:
+                file_system.close()
+
+
+    def test_directories_are_opened_again_after_a_preprocessor(self):
+        files = {'top.list': '@INCLUDE dir/sub/paths.list\n@INCLUDE move.list\n@INCLUDE dir/sub/paths.list\n',
+                 'move.list': '# relocate\n',
+                 'dir/sub/paths.list': 'file.txt\n',
+                 'dir/sub/file.txt': ''}
+        preprocessor = ('sh -c \'input=$(cat); case "$input" in'
+                        ' *relocate*) mv dir/sub dir/moved; mkdir dir/sub; cp dir/moved/paths.list dir/sub;;'
+                        ' *) printf "%s\\n" "$input";; esac\'')
+        output = io.StringIO()
+        with tmp_dir_as_cwd(files):
+            with contextlib.redirect_stdout(output):
+                main.main(['--preprocessor', preprocessor, '-m', 'ignore', 'top.list'])
+        self.assertEqual('dir/sub/file.txt\n', output.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
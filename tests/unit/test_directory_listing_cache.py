@@ -0,0 +1,105 @@
+import os
+import unittest
+
+from filelist_test_utils import main, tmp_dir_as_cwd
+
+FILES = {
+    'dir/file.txt': '',
+    'dir/sub/file.txt': '',
+}
+
+
+def sorted_listing(listing: tuple) -> list:
+    return sorted(zip(listing[0], listing[1]))
+
+
+def new_cache(max_num_directories: int = 10) -> main.DirectoryListingCache:
+    cache = main.DirectoryListingCache(max_num_directories)
+    # The directories of the tests have just been modified.
+    cache.RACY_MODIFICATION_INTERVAL_NS = 0
+    return cache
+
+
+class TestListDirectory(unittest.TestCase):
+    def test_entry_types(self):
+        with tmp_dir_as_cwd(FILES):
+            os.symlink('file.txt', 'dir/link-to-file')
+            os.symlink('sub', 'dir/link-to-dir')
+            os.symlink('non-existing', 'dir/broken-link')
+            self.assertEqual([('broken-link', main.ENTRY_TYPE_BROKEN_LINK),
+                              ('file.txt', main.ENTRY_TYPE_FILE),
+                              ('link-to-dir', main.ENTRY_TYPE_DIRECTORY),
+                              ('link-to-file', main.ENTRY_TYPE_FILE),
+                              ('sub', main.ENTRY_TYPE_DIRECTORY)],
+                             sorted_listing(main.list_directory('dir')))
+
+    def test_order_is_that_of_listdir(self):
+        with tmp_dir_as_cwd(FILES):
+            self.assertEqual(os.listdir('dir'), main.list_directory('dir')[0])
+
+
+class TestDirectoryListingCache(unittest.TestCase):
+    def test_modified_directory_is_listed_again(self):
+        cache = new_cache()
+        with tmp_dir_as_cwd(FILES):
+            # So that the modification changes the modification time (regardless of its resolution).
+            os.utime('dir', (0, 0))
+            first = cache.list_directory('dir')
+            self.assertIs(first, cache.list_directory('dir'))
+            open('dir/new.txt', 'w').close()
+            self.assertIn('new.txt', cache.list_directory('dir')[0])
+
+    def test_listings_are_saved_and_loaded(self):
+        with tmp_dir_as_cwd(FILES):
+            saving_cache = new_cache()
+            listing = saving_cache.list_directory('dir')
+            saving_cache.save('cache/listings')
+            loading_cache = new_cache()
+            loading_cache.load('cache/listings')
+            self.assertEqual(1, len(loading_cache))
+            self.assertEqual(listing, loading_cache.list_directory('dir'))
+
+    def test_racy_listings_are_not_saved(self):
+        with tmp_dir_as_cwd(FILES):
+            saving_cache = main.DirectoryListingCache()
+            saving_cache.list_directory('dir')
+            saving_cache.save('listings')
+            loading_cache = new_cache()
+            loading_cache.load('listings')
+            self.assertEqual(0, len(loading_cache))
+
+    def test_racy_listings_are_forgotten_between_executions(self):
+        with tmp_dir_as_cwd(FILES):
+            caches = main.EvaluationCaches()
+            caches.directory_listing_cache.list_directory('dir')
+            caches.directory_listing_cache.RACY_MODIFICATION_INTERVAL_NS = 0
+            caches.directory_listing_cache.list_directory('dir/sub')
+            caches.parsing_settings_with_caches(main.ParsingSettings(None, [], {}),
+                                                main.DEFAULT_INSTRUCTION_PREFIX)
+            self.assertEqual([os.path.abspath('dir/sub')],
+                             list(caches.directory_listing_cache._entries))
+
+    def test_invalid_file_is_ignored(self):
+        with tmp_dir_as_cwd({'listings': 'invalid'}):
+            cache = new_cache()
+            cache.load('listings')
+            cache.load('non-existing')
+            self.assertEqual(0, len(cache))
+
+    def test_least_recently_used_listing_is_evicted(self):
+        with tmp_dir_as_cwd(FILES):
+            cache = new_cache(max_num_directories=2)
+            cache.list_directory('dir')
+            cache.list_directory('dir/sub')
+            cache.list_directory('dir')
+            cache.list_directory('.')
+            cache.save('listings')
+            loading_cache = new_cache()
+            loading_cache.load('listings')
+            self.assertEqual(2, len(loading_cache))
+            self.assertEqual([os.path.abspath('dir'), os.path.abspath('.')],
+                             list(loading_cache._entries))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import contextlib
+import io
+import unittest
+
+from filelist_test_utils import main, new_parsing_settings, tmp_dir_as_cwd, execute_main_command
+
+FILES = {
+    'top.list': '\n'.join(['a.txt',
+                           '# comment',
+                           'b.txt',
+                           '',
+                           'c.txt',
+                           '@PRINT message',
+                           'a.txt',
+                           'missing.txt',
+                           '']),
+    'a.txt': '',
+    'b.txt': '',
+    'c.txt': '',
+}
+
+
+def parsed(file_name: str) -> main.ProcessorForListFile:
+    parsing_settings = new_parsing_settings()
+    return main.ListFileParser.for_top_level(parsing_settings, file_name).apply(
+        main.LinesSourceForFileArgument(parsing_settings, file_name))
+
+
+class TestFilePathLines(unittest.TestCase):
+    def test_consecutive_lines_are_held_by_one_instruction(self):
+        with tmp_dir_as_cwd(FILES):
+            processors = parsed('top.list').processors()
+        self.assertEqual(['ProcessorForFilePaths', 'ProcessorForPrint', 'ProcessorForFilePaths'],
+                         [type(processor).__name__ for processor in processors])
+        self.assertEqual(['a.txt', 'b.txt', 'c.txt'], processors[0].file_names())
+        self.assertEqual([1, 3, 5],
+                         [processors[0].source_of_file(index).source_line.line.number for index in range(3)])
+
+    def test_missing_file_is_reported_for_its_line(self):
+        stderr = io.StringIO()
+        with tmp_dir_as_cwd(FILES):
+            with self.assertRaises(main.ResultItemConstructionForMissingFileException) as context:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    execute_main_command(['top.list'])
+        context.exception.render(stderr)
+        self.assertIn('File "top.list", line 8', stderr.getvalue())
+        self.assertIn('missing.txt', stderr.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import os
+import shutil
+import subprocess
+import unittest
+
+from filelist_test_utils import main, tmp_dir_as_cwd
+
+FILES = {
+    'repo/.gitignore': '*.o\n',
+    'repo/file.txt': '',
+    'repo/dir/file.txt': '',
+    'repo/dir/sub/file-with-a-long-name.txt': '',
+    'repo/dir/sub/file-with-a-longer-name.txt': '',
+    'repo/other/file.txt': '',
+}
+
+
+def git(*arguments):
+    subprocess.run(['git', '-C', 'repo'] + list(arguments),
+                   check=True,
+                   stdout=subprocess.DEVNULL,
+                   stderr=subprocess.DEVNULL)
+
+
+def new_repository(*init_arguments):
+    git('init', '-q', *init_arguments)
+    os.symlink('dir', 'repo/link-to-dir')
+    git('add', '.')
+
+
+def sorted_listing(listing: tuple) -> list:
+    return sorted(zip(listing[0], listing[1]))
+
+
+@unittest.skipUnless(shutil.which('git'), 'git is not installed')
+class TestGitIndexFileSystem(unittest.TestCase):
+    def _assert_answers_are_those_of_working_tree(self, file_system: main.GitIndexFileSystem):
+        for dir_path, dir_names, file_names in os.walk('repo'):
+            if '.git' in dir_names:
+                dir_names.remove('.git')
+            with self.subTest(dir_path=dir_path):
+                self.assertEqual(sorted_listing(main.list_directory(dir_path)),
+                                 sorted_listing(file_system.list_directory(dir_path)))
+            for name in dir_names + file_names:
+                path = os.path.join(dir_path, name)
+                with self.subTest(path=path):
+                    self.assertTrue(file_system.exists(path))
+                    self.assertEqual(os.path.isfile(path), file_system.is_file(path))
+                    self.assertEqual(os.path.isdir(path), file_system.is_dir(path))
+        self.assertTrue(file_system.is_file('repo/link-to-dir/file.txt'))
+        self.assertFalse(file_system.exists('repo/non-existing'))
+
+    def test_index_versions(self):
+        for version in ['2', '3', '4']:
+            with self.subTest(version=version):
+                with tmp_dir_as_cwd(FILES):
+                    new_repository()
+                    git('update-index', '--index-version', version)
+                    self._assert_answers_are_those_of_working_tree(main.GitIndexFileSystem('repo'))
+
+    def test_sha256_repository(self):
+        with tmp_dir_as_cwd(FILES):
+            try:
+                new_repository('--object-format=sha256')
+            except subprocess.CalledProcessError:
+                self.skipTest('git does not support sha256')
+            self._assert_answers_are_those_of_working_tree(main.GitIndexFileSystem('repo'))
+
+    def test_working_tree_is_not_read(self):
+        with tmp_dir_as_cwd(FILES):
+            new_repository()
+            git('update-index', '--skip-worktree', 'other/file.txt')
+            os.remove('repo/file.txt')
+            open('repo/untracked.txt', 'w').close()
+            file_system = main.GitIndexFileSystem('repo')
+            self.assertTrue(file_system.is_file('repo/file.txt'))
+            self.assertFalse(file_system.exists('repo/untracked.txt'))
+            self.assertFalse(file_system.exists('repo/other/file.txt'))
+            self.assertFalse(file_system.exists('repo/other'))
+
+    def test_untracked_files(self):
+        with tmp_dir_as_cwd(FILES):
+            new_repository()
+            open('repo/dir/untracked.txt', 'w').close()
+            open('repo/dir/ignored.o', 'w').close()
+            file_system = main.GitIndexFileSystem('repo', include_untracked=True)
+            self.assertTrue(file_system.is_file('repo/dir/untracked.txt'))
+            self.assertFalse(file_system.exists('repo/dir/ignored.o'))
+
+    def test_not_a_repository(self):
+        with tmp_dir_as_cwd(FILES):
+            with self.assertRaises(OSError):
+                main.GitIndexFileSystem('repo')
+            os.mkdir('repo/.git')
+            with open('repo/.git/index', 'wb') as f:
+                f.write(b'DIRC\0\0\0\x09\0\0\0\0')
+            with self.assertRaises(ValueError):
+                main.GitIndexFileSystem('repo')
+
+
+if __name__ == '__main__':
+    unittest.main()
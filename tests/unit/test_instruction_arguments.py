@@ -0,0 +1,94 @@
+import itertools
+import shlex
+import unittest
+
+from filelist_test_utils import main
+
+TOKENS = ['a', '*.h', '-s', '--sort', '--so', '-r', 'x', '-t', 'f', '-e', '-I', '-p', '--', '-', 'ADD', 'RM', 'PUSH']
+
+
+def parse_result(parse, arguments: list):
+    """The result of a parse function - or the error message."""
+    try:
+        return parse(arguments)
+    except main.InstructionArgumentParserSyntaxErrorException as ex:
+        return ex.message_lines
+
+
+def without_simple_parsers(parser: main.InstructionWithArgparseArgumentParser):
+    """Makes the parser parse all arguments by argparse."""
+    parser._simple_parser = None
+    parser._simple_sub_command_parsers = {}
+    return parser
+
+
+def with_comparable_file_types(args):
+    """FileType has no equality - compare the types by the mode predicates."""
+    if hasattr(args, 'type'):
+        args.type = [[file_type[0].mode_predicate] for file_type in args.type]
+    return args
+
+
+class TestSplitArguments(unittest.TestCase):
+    def test_same_as_shlex(self):
+        for arguments in ['',
+                          '  ',
+                          'a b\tc\r\nd',
+                          '. *.h -s',
+                          '"a b" c',
+                          "'a b' c",
+                          'a\\ b',
+                          'a # b',
+                          'a\x0bb',
+                          'a\xa0b',
+                          'a b',
+                          ]:
+            self.assertEqual(shlex.split(arguments), main.split_arguments(arguments), repr(arguments))
+
+
+class TestSimpleArgumentParser(unittest.TestCase):
+    """The simple parsers must give the same result as argparse - when they give a result."""
+
+    def _assert_same_as_argparse(self, parser_class):
+        parser = parser_class('INSTRUCTION')
+        argparse_parser = without_simple_parsers(parser_class('INSTRUCTION'))
+        for length in range(4):
+            for arguments in itertools.product(TOKENS, repeat=length):
+                arguments = list(arguments)
+                expected = parse_result(argparse_parser._parse, arguments)
+                actual = parse_result(parser._parse, arguments)
+                if hasattr(expected, 'func'):
+                    self.assertIs(type(expected.func), type(actual.func), arguments)
+                    expected.func = actual.func
+                self.assertEqual(with_comparable_file_types(expected),
+                                 with_comparable_file_types(actual),
+                                 arguments)
+
+    def test_list(self):
+        self._assert_same_as_argparse(main.InstructionArgumentParserForDirectoryListing)
+
+    def test_include(self):
+        self._assert_same_as_argparse(main.InstructionArgumentParserForInclude)
+
+    def test_tags(self):
+        self._assert_same_as_argparse(main.InstructionArgumentParserForTags)
+
+
+class TestMemoization(unittest.TestCase):
+    def test_identical_arguments_are_parsed_once(self):
+        parser = main.InstructionArgumentParserForDirectoryListing('LIST')
+        first = parser._parse_argument_memoized('. *.h -s')
+        second = parser._parse_argument_memoized('. *.h -s')
+        self.assertIs(first, second)
+        self.assertEqual('.', first.relative_directory_name)
+        self.assertTrue(first.sort)
+
+    def test_errors_are_not_memoized(self):
+        parser = main.InstructionArgumentParserForInclude('INCLUDE')
+        for _ in range(2):
+            with self.assertRaises(main.InstructionArgumentParserSyntaxErrorException):
+                parser._parse_argument_memoized('')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import contextlib
+import io
+import unittest
+
+from filelist_test_utils import main, tmp_dir_as_cwd
+
+FILES = {
+    'top.list': '\n'.join(['existing.txt',
+                           '@PRINT a message',
+                           '@INCLUDE dir/included.list',
+                           '@TAGS SET t2 t1',
+                           '@LIST dir -s *.txt',
+                           '']),
+    'existing.txt': '',
+    'dir/included.list': 'existing.txt\nnon-existing.txt\n',
+    'dir/existing.txt': '',
+    'dir/other.txt': '',
+}
+
+
+def output_of_main(arguments: list,
+                   evaluation_caches: main.EvaluationCaches = None) -> str:
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        main.main(arguments, evaluation_caches)
+    return output.getvalue()
+
+
+class TestManifest(unittest.TestCase):
+    def _assert_manifest_gives_same_output(self, options: list):
+        with tmp_dir_as_cwd(FILES):
+            expected = output_of_main(options + ['top.list'])
+            self.assertEqual('', output_of_main(options + ['--compile-manifest', 'top.manifest', 'top.list']))
+            actual = output_of_main(['--from-manifest', 'top.manifest'])
+        self.assertEqual(expected, actual)
+
+    def test_output(self):
+        self._assert_manifest_gives_same_output(['-m', 'include'])
+
+    def test_output_with_tags(self):
+        self._assert_manifest_gives_same_output(['-m', 'include', '-t', '-T'])
+
+    def test_output_with_absolute_paths(self):
+        self._assert_manifest_gives_same_output(['-m', 'include', '-a', '-S'])
+
+    def test_empty_output(self):
+        self._assert_manifest_gives_same_output(['-m', 'include', '-S', '-F', 'no-such-tag'])
+
+    def test_dependencies(self):
+        with tmp_dir_as_cwd(FILES):
+            output_of_main(['-m', 'include', '--compile-manifest', 'top.manifest', 'top.list'])
+            manifest = main.Manifest('top.manifest')
+            try:
+                self.assertEqual(['top.list', 'dir/included.list'], manifest.list_files())
+                self.assertEqual(['dir'], manifest.directories())
+            finally:
+                manifest.close()
+
+    def test_dependencies_of_cached_list_files(self):
+        evaluation_caches = main.EvaluationCaches()
+        with tmp_dir_as_cwd(FILES):
+            for _ in range(2):
+                output_of_main(['-m', 'include', '--compile-manifest', 'top.manifest', 'top.list'],
+                               evaluation_caches)
+            manifest = main.Manifest('top.manifest')
+            try:
+                self.assertEqual(['top.list', 'dir/included.list'], manifest.list_files())
+            finally:
+                manifest.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import unittest
+
+from filelist_test_utils import main, tmp_dir_as_cwd, execute_main_command
+
+
+class RecordingObserver(main.Observer):
+    def __init__(self):
+        self.events = []
+
+    def list_file_parsed(self, file_name, includes, start_time, duration):
+        self.events.append(('parsed', file_name, len(includes.from_top_to_bottom())))
+
+    def file_argument_processed(self, file_name, start_time, duration):
+        self.events.append(('processed', file_name))
+
+    def instruction_evaluated(self, processor, start_time, duration):
+        self.events.append(('evaluated', type(processor).__name__, processor.source.source_line.line.number))
+
+    def directory_listed(self, source, directory_path, num_entries, start_time, duration):
+        self.events.append(('listed', directory_path, num_entries))
+
+    def path_checked(self, source, path, exists, start_time, duration):
+        self.events.append(('checked', path, exists))
+
+    def item_emitted(self, result_item, rendition):
+        self.events.append(('emitted', rendition))
+
+    def subprocess_finished(self, source_or_none, command_line, exit_code, start_time, duration):
+        self.events.append(('subprocess', command_line, exit_code))
+
+
+FILES = {
+    'top.list': '\n'.join(['existing.txt',
+                           '@INCLUDE dir/included.list',
+                           '@LIST dir -s *.txt',
+                           '@SHELL echo dir/existing.txt',
+                           '']),
+    'existing.txt': '',
+    'dir/included.list': 'existing.txt\n',
+    'dir/existing.txt': '',
+}
+
+
+class TestObserver(unittest.TestCase):
+    def test_output_is_not_affected_by_observation(self):
+        with tmp_dir_as_cwd(FILES):
+            expected = execute_main_command(['top.list'])
+            actual = execute_main_command(['top.list'], RecordingObserver())
+        self.assertEqual(expected, actual)
+
+    def test_events(self):
+        observer = RecordingObserver()
+        with tmp_dir_as_cwd(FILES):
+            execute_main_command(['top.list'], observer)
+        self.assertEqual([
+            ('parsed', 'top.list', 0),
+            ('checked', 'existing.txt', True),
+            ('emitted', 'existing.txt'),
+            ('evaluated', 'ProcessorForFilePaths', 1),
+            ('parsed', 'dir/included.list', 1),
+            ('checked', 'dir/existing.txt', True),
+            ('emitted', 'dir/existing.txt'),
+            ('evaluated', 'ProcessorForFilePaths', 1),
+            ('evaluated', 'ProcessorForInclude', 2),
+            ('listed', 'dir', 2),
+            ('emitted', 'dir/existing.txt'),
+            ('evaluated', 'ProcessorForDirectoryListing', 3),
+            ('subprocess', 'echo dir/existing.txt', 0),
+            ('checked', 'dir/existing.txt', True),
+            ('emitted', 'dir/existing.txt'),
+            ('evaluated', 'ProcessorForShell', 4),
+            ('processed', 'top.list'),
+        ],
+            observer.events)
+
+    def test_failing_subprocess_is_reported_with_exit_code(self):
+        observer = RecordingObserver()
+        with tmp_dir_as_cwd({'top.list': '@SHELL exit 3\n'}):
+            with self.assertRaises(main.ResultItemConstructionForShellException):
+                execute_main_command(['top.list'], observer)
+        self.assertIn(('subprocess', 'exit 3', 3), observer.events)
+        self.assertIn(('evaluated', 'ProcessorForShell', 1), observer.events)
+
+    def test_non_existing_path_is_reported(self):
+        observer = RecordingObserver()
+        with tmp_dir_as_cwd({'top.list': 'non-existing.txt\n'}):
+            execute_main_command(['top.list'],
+                                 observer,
+                                 main.FileExistenceHandlingSettings.new_ignore_non_existing())
+        self.assertIn(('checked', 'non-existing.txt', False), observer.events)
+
+    def test_multiple_observers(self):
+        observers = [RecordingObserver(), RecordingObserver()]
+        with tmp_dir_as_cwd(FILES):
+            execute_main_command(['top.list'], main.ObserverForMultipleObservers(observers))
+        self.assertTrue(observers[0].events)
+        self.assertEqual(observers[0].events, observers[1].events)
+
+
+if __name__ == '__main__':
+    unittest.main()
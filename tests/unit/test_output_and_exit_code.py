@@ -0,0 +1,27 @@
+import sys
+import unittest
+
+from filelist_test_utils import main
+
+
+def output_then_exit(code):
+    print('output')
+    sys.exit(code)
+
+
+class TestOutputAndExitCodeOf(unittest.TestCase):
+    def test_exit_code_of_completed_action_is_zero(self):
+        self.assertEqual(('output\n', '', 0), main.output_and_exit_code_of(lambda: print('output')))
+
+    def test_exit_code_is_that_of_system_exit(self):
+        self.assertEqual(('output\n', '', 3), main.output_and_exit_code_of(lambda: output_then_exit(3)))
+
+    def test_exit_without_code_is_success(self):
+        self.assertEqual(('output\n', '', 0), main.output_and_exit_code_of(lambda: output_then_exit(None)))
+
+    def test_exit_with_message_is_failure_with_message_on_stderr(self):
+        self.assertEqual(('output\n', 'message\n', 1), main.output_and_exit_code_of(lambda: output_then_exit('message')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+import os
+import unittest
+
+from filelist_test_utils import main, tmp_dir_as_cwd
+
+
+class TestPathIndexFileSystem(unittest.TestCase):
+    def test_files_and_their_directories_exist(self):
+        with tmp_dir_as_cwd({}):
+            file_system = main.PathIndexFileSystem(['dir/sub/file.txt',
+                                                    os.path.abspath('abs/file.txt'),
+                                                    'empty-dir/'])
+            for path in ['dir/sub/file.txt', 'dir/../dir/sub/./file.txt', 'abs/file.txt',
+                         os.path.abspath('dir/sub/file.txt')]:
+                with self.subTest(path=path):
+                    self.assertTrue(file_system.exists(path))
+                    self.assertTrue(file_system.is_file(path))
+                    self.assertFalse(file_system.is_dir(path))
+            for path in ['dir', 'dir/sub', 'abs', 'empty-dir', '.', os.getcwd()]:
+                with self.subTest(path=path):
+                    self.assertTrue(file_system.exists(path))
+                    self.assertFalse(file_system.is_file(path))
+                    self.assertTrue(file_system.is_dir(path))
+            for path in ['file.txt', 'dir/file.txt', 'dir/sub/file.txt/x', '']:
+                with self.subTest(path=path):
+                    self.assertFalse(file_system.exists(path))
+            self.assertTrue(file_system.exists_in_directory('dir/', 'sub/file.txt'))
+
+    def test_read_path_index(self):
+        with tmp_dir_as_cwd({'lines': 'a\nb/c\r\n\nd\n',
+                             'nul-separated': 'a\0b c\nd\0'}):
+            self.assertEqual(['a', 'b/c', 'd'], main.read_path_index('lines'))
+            self.assertEqual(['a', 'b c\nd'], main.read_path_index('nul-separated'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+import contextlib
+import io
+import unittest
+
+from filelist_test_utils import main, new_parsing_settings, tmp_dir_as_cwd
+
+FILES = {
+    'top.list': '\n'.join(['existing.txt',
+                           'non-existing.txt',
+                           '@PRINT a message',
+                           '@TAGS SET t2 t1',
+                           '@INCLUDE dir/included.list',
+                           '@LIST dir -s *.txt',
+                           '@LIST dir *.txt',
+                           '@SHELL echo existing.txt',
+                           '']),
+    'existing.txt': '',
+    'dir/included.list': 'existing.txt\n../existing.txt\nnon-existing.txt\nother.txt\n',
+    'dir/existing.txt': '',
+    'dir/other.txt': '',
+}
+
+
+class ResultItemOutputForRenditions(main.ResultItemOutput):
+    """Collects the rendition of each item, and does not accept batches."""
+
+    def __init__(self):
+        self.lines = []
+
+    def output(self,
+               result_item: main.ResultItem,
+               env: main.RenditionEnvironment):
+        self.lines.append(result_item.rendition(env) + '\n')
+
+
+def new_rendition_settings(file_names_are_relative_file_argument_location: bool = False,
+                           normalize_paths: bool = False,
+                           absolute_paths: bool = False,
+                           tags_settings: main.TagsRenditionSettings = main.TagsRenditionSettings(False, False)):
+    return main.RenditionSettings(file_names_are_relative_file_argument_location,
+                                  True,
+                                  True,
+                                  normalize_paths,
+                                  absolute_paths,
+                                  tags_settings,
+                                  False)
+
+
+def execute(output: main.ResultItemOutput,
+            rendition_settings: main.RenditionSettings):
+    main.ProgramMainFunctionalityCommand(output).execute(['dir/../top.list'],
+                                                         False,
+                                                         [],
+                                                         False,
+                                                         main.TagsCondition.new_for_no_condition(),
+                                                         rendition_settings,
+                                                         new_parsing_settings(),
+                                                         None)
+
+
+class TestBatchesAreRenderedAsSeparateItems(unittest.TestCase):
+    def _assert_same_output(self, rendition_settings: main.RenditionSettings):
+        with tmp_dir_as_cwd(FILES):
+            printed = io.StringIO()
+            with contextlib.redirect_stdout(printed):
+                execute(None, rendition_settings)
+            output_of_items = ResultItemOutputForRenditions()
+            execute(output_of_items, rendition_settings)
+        self.assertEqual(''.join(output_of_items.lines), printed.getvalue())
+
+    def test_default_settings(self):
+        self._assert_same_output(new_rendition_settings())
+
+    def test_file_names_relative_file_argument_location(self):
+        self._assert_same_output(new_rendition_settings(file_names_are_relative_file_argument_location=True))
+
+    def test_normalized_and_absolute_paths(self):
+        self._assert_same_output(new_rendition_settings(normalize_paths=True))
+        self._assert_same_output(new_rendition_settings(absolute_paths=True))
+
+    def test_tags(self):
+        self._assert_same_output(new_rendition_settings(tags_settings=main.TagsRenditionSettings(True, False)))
+        self._assert_same_output(new_rendition_settings(tags_settings=main.TagsRenditionSettings(True, True)))
+
+
+class TestBatchesOfFilePaths(unittest.TestCase):
+    def _batches(self,
+                 file_names: list,
+                 fail_on_non_existing_file: bool = False) -> iter:
+        env = main.RenditionEnvironment.for_top_level_file('top.list',
+                                                           fail_on_non_existing_file,
+                                                           main.TagsCondition.new_for_no_condition(),
+                                                           new_rendition_settings(),
+                                                           main.Tags.new_empty())
+        return main.result_item_batches_for_files_from_file_paths(lambda file_index: file_index,
+                                                                  env,
+                                                                  iter(file_names),
+                                                                  new_parsing_settings())
+
+    def test_batches_are_runs_of_files_with_the_same_existence(self):
+        with tmp_dir_as_cwd(FILES):
+            batches = list(self._batches(['existing.txt', 'dir/other.txt', 'non-existing.txt', 'existing.txt']))
+        self.assertEqual([(main.ResultItemForFilePathsExisting, ['existing.txt', 'dir/other.txt']),
+                          (main.ResultItemForFilePathsNonExisting, ['non-existing.txt']),
+                          (main.ResultItemForFilePathsExisting, ['existing.txt'])],
+                         [(type(batch), batch.file_names) for batch in batches])
+
+    def test_number_of_file_paths_of_a_batch_is_limited(self):
+        num_file_paths = main.ResultItemForFilePaths.MAX_NUM_FILE_PATHS + 1
+        with tmp_dir_as_cwd(FILES):
+            batches = list(self._batches(['existing.txt'] * num_file_paths))
+        self.assertEqual([num_file_paths - 1, 1],
+                         [len(batch.file_names) for batch in batches])
+
+    def test_files_preceding_a_missing_file_are_given_before_the_failure(self):
+        with tmp_dir_as_cwd(FILES):
+            batches = self._batches(['existing.txt', 'non-existing.txt'], fail_on_non_existing_file=True)
+            self.assertEqual(['existing.txt'], next(batches).file_names)
+            with self.assertRaises(main.ResultItemConstructionForMissingFileException) as context:
+                next(batches)
+        self.assertEqual(1, context.exception.source_reference())
+
+
+if __name__ == '__main__':
+    unittest.main()
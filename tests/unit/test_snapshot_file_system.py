@@ -0,0 +1,84 @@
+import os
+import unittest
+
+from filelist_test_utils import main, tmp_dir_as_cwd
+
+FILES = {
+    'root/file.txt': '',
+    'root/dir/file.txt': '',
+    'root/dir/sub/file.txt': '',
+    'outside/file.txt': '',
+}
+
+PATHS = [
+    'root',
+    'root/file.txt',
+    'root/non-existing',
+    'root/dir',
+    'root/dir/sub/file.txt',
+    'root/file.txt/non-existing',
+    'root/non-existing/file.txt',
+    'root/link-to-file',
+    'root/link-to-dir',
+    'root/link-to-dir/file.txt',
+    'root/link-to-dir/non-existing',
+    'root/broken-link',
+    'root/link-to-dir/..',
+    'root/file.txt/',
+    'outside/file.txt',
+    'outside/non-existing',
+    '.',
+]
+
+
+def new_tree():
+    os.symlink('file.txt', 'root/link-to-file')
+    os.symlink('../outside', 'root/link-to-dir')
+    os.symlink('non-existing', 'root/broken-link')
+
+
+class TestSnapshotFileSystem(unittest.TestCase):
+    def test_answers_are_those_of_the_operating_system(self):
+        with tmp_dir_as_cwd(FILES):
+            new_tree()
+            file_system = main.SnapshotFileSystem('root', 2)
+            for path in PATHS + [os.path.abspath(path) for path in PATHS]:
+                with self.subTest(path=path):
+                    self.assertEqual(os.path.exists(path), file_system.exists(path))
+                    self.assertEqual(os.path.isfile(path), file_system.is_file(path))
+                    self.assertEqual(os.path.isdir(path), file_system.is_dir(path))
+
+    def test_listings_are_those_of_list_directory(self):
+        with tmp_dir_as_cwd(FILES):
+            new_tree()
+            file_system = main.SnapshotFileSystem('root')
+            for path in ['root', 'root/dir', 'root/link-to-dir', 'outside']:
+                with self.subTest(path=path):
+                    self.assertEqual(main.list_directory(path), file_system.list_directory(path))
+
+    def test_current_directory_as_root(self):
+        with tmp_dir_as_cwd(FILES):
+            file_system = main.SnapshotFileSystem('.')
+            os.remove('root/file.txt')
+            self.assertTrue(file_system.exists('root/file.txt'))
+
+    def test_symbolic_links_to_directories_are_not_walked(self):
+        with tmp_dir_as_cwd(FILES):
+            new_tree()
+            file_system = main.SnapshotFileSystem('root')
+            self.assertEqual(3, len(file_system))
+
+    def test_modifications_are_not_seen(self):
+        with tmp_dir_as_cwd(FILES):
+            file_system = main.SnapshotFileSystem('root')
+            os.remove('root/file.txt')
+            self.assertTrue(file_system.exists('root/file.txt'))
+
+    def test_non_existing_root(self):
+        with tmp_dir_as_cwd(FILES):
+            with self.assertRaises(OSError):
+                main.SnapshotFileSystem('non-existing')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import contextlib
+import io
+import random
+import unittest
+from pathlib import Path
+
+from filelist_test_utils import main, tmp_dir_as_cwd
+
+NUM_FILES = 300
+
+
+def files_with_repeated_paths() -> dict:
+    """A list-file with paths in random order, where some paths are repeated with other tags."""
+    names = ['file-%03d.txt' % i for i in range(NUM_FILES)]
+    random.Random(1).shuffle(names)
+    lines = ['@TAGS SET t1'] + names[:NUM_FILES // 2] + ['@TAGS SET t2'] + names + ['']
+    files = {'top.list': '\n'.join(lines),
+             'previous.list': '\n'.join(names[NUM_FILES // 3:] + ['removed.txt', ''])}
+    for name in names + ['removed.txt']:
+        files[name] = ''
+    return files
+
+
+def run_main(arguments: list) -> str:
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        main.main(arguments)
+    return output.getvalue()
+
+
+class TestSnapshotsThatDoNotFitInMemory(unittest.TestCase):
+    def _snapshot_and_changes(self, sort_buffer_size: str) -> tuple:
+        with tmp_dir_as_cwd(files_with_repeated_paths()):
+            run_main(['--snapshot', 'previous.snapshot', 'previous.list'])
+            changes = run_main(['--sort-buffer-size', sort_buffer_size,
+                                '--append-tags',
+                                '--diff-against', 'previous.snapshot',
+                                '--snapshot', 'previous.snapshot',
+                                'top.list'])
+            return Path('previous.snapshot').read_text(), changes
+
+    def test_same_snapshot_and_changes_as_in_memory(self):
+        expected_snapshot, expected_changes = self._snapshot_and_changes('256M')
+        actual_snapshot, actual_changes = self._snapshot_and_changes('1')
+        self.assertEqual(NUM_FILES + 1, len(expected_snapshot.splitlines()))
+        self.assertEqual(expected_snapshot, actual_snapshot)
+        self.assertEqual(expected_changes, actual_changes)
+
+
+class TestFilePathsWithNewlines(unittest.TestCase):
+    def test_file_path_with_newline_is_rejected(self):
+        files = {'top.list': '@LIST dir\n',
+                 'dir/new\nline.txt': ''}
+        stderr = io.StringIO()
+        with tmp_dir_as_cwd(files):
+            with contextlib.redirect_stderr(stderr), self.assertRaises(SystemExit) as context:
+                run_main(['--snapshot', 'top.snapshot', 'top.list'])
+            self.assertFalse(Path('top.snapshot').exists())
+        self.assertEqual(main.EXIT_INVALID_ARGUMENTS, context.exception.code)
+        self.assertIn('newline', stderr.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
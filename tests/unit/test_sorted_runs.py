@@ -0,0 +1,83 @@
+import contextlib
+import io
+import random
+import unittest
+
+from filelist_test_utils import main, new_rendition_settings
+
+
+class TestSortedRuns(unittest.TestCase):
+    def _assert_sorted(self, records: list, memory_limit: int):
+        sorted_runs = main.SortedRuns(memory_limit)
+        try:
+            for record in records:
+                sorted_runs.add(record, len(record))
+            self.assertEqual(sorted(records), list(sorted_runs.merged_records()))
+        finally:
+            sorted_runs.close()
+
+    def test_records_in_memory(self):
+        self._assert_sorted(['b', 'c', 'a', 'b'], 1 << 20)
+
+    def test_records_in_runs(self):
+        records = ['dir/file-' + str(i) for i in range(5000)]
+        random.Random(1).shuffle(records)
+        self._assert_sorted(records, 100 * main.SortedRuns.RECORD_OVERHEAD)
+
+    def test_more_runs_than_can_be_merged_at_the_same_time(self):
+        records = ['file-' + str(i) for i in range(3 * main.SortedRuns.MAX_NUM_RUNS_TO_MERGE)]
+        random.Random(2).shuffle(records)
+        self._assert_sorted(records, 1)
+
+    def test_tuple_records_and_paths_with_new_lines(self):
+        records = [('b', 't:b'), ('a\nb', ':a\nb'), ('a', 't2:a'), ('a', 't1:a')]
+        self._assert_sorted(records, 1)
+
+
+class ResultItemOutputForRenditionsOfFilePaths(main.ResultItemOutput):
+    """Collects the renditions of file-paths that are output after the last item."""
+
+    def __init__(self):
+        self.renditions = []
+        self.is_finished = False
+
+    def output_renditions_of_file_paths(self, renditions):
+        self.renditions.extend(renditions)
+
+    def finish(self):
+        self.is_finished = True
+
+
+class TestSortedFilePathsAreGivenToTheWrappedOutput(unittest.TestCase):
+    def _output_of(self, output: main.ResultItemOutput, file_names: list):
+        env = main.RenditionEnvironment.for_top_level_file('top.list',
+                                                           False,
+                                                           main.TagsCondition.new_for_no_condition(),
+                                                           new_rendition_settings(
+                                                               main.FileExistenceHandlingSettings
+                                                               .new_include_non_existing()),
+                                                           main.Tags.new_empty())
+        for file_name in file_names:
+            output.output(main.ResultItemForFilePathExisting(file_name, frozenset()), env)
+        output.finish()
+
+    def test_sorted_file_paths_are_not_printed_directly(self):
+        wrapped = ResultItemOutputForRenditionsOfFilePaths()
+        printed = io.StringIO()
+        with contextlib.redirect_stdout(printed):
+            self._output_of(main.ResultItemOutputForSortedFilePaths(1, wrapped, 2),
+                            ['c', 'a', 'b'])
+        self.assertEqual('', printed.getvalue())
+        self.assertEqual(['a', 'b'], wrapped.renditions)
+        self.assertTrue(wrapped.is_finished)
+
+    def test_limiting_output_counts_sorted_file_paths(self):
+        wrapped = ResultItemOutputForRenditionsOfFilePaths()
+        limiting = main.ResultItemOutputLimitingFilePaths(2, wrapped)
+        self._output_of(main.ResultItemOutputForSortedFilePaths(1, limiting), ['c', 'a', 'b'])
+        self.assertEqual(['a', 'b'], wrapped.renditions)
+        self.assertTrue(limiting.is_complete())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,32 @@
+import unittest
+
+from filelist_test_utils import main
+
+
+class TestSeenSetOfHashes(unittest.TestCase):
+    def test_keys_are_seen_after_they_are_added(self):
+        seen_set = main.SeenSetOfHashes()
+        self.assertFalse(seen_set.add('a'))
+        self.assertFalse(seen_set.add('b'))
+        self.assertTrue(seen_set.add('a'))
+        self.assertTrue(seen_set.add('b'))
+
+
+class TestSeenSetAsBloomFilter(unittest.TestCase):
+    def test_keys_in_all_filters_are_seen(self):
+        seen_set = main.SeenSetAsBloomFilter(0.001)
+        num_keys = 2 * main.SeenSetAsBloomFilter.INITIAL_CAPACITY
+        num_false_positives = sum(seen_set.add('dir/file-' + str(i)) for i in range(num_keys))
+        self.assertGreater(len(seen_set._filters), 1)
+        self.assertLess(num_false_positives, num_keys * 0.001 * 2)
+        for i in range(0, num_keys, 97):
+            self.assertTrue(seen_set.add('dir/file-' + str(i)))
+
+    def test_surrogate_escaped_keys(self):
+        seen_set = main.SeenSetAsBloomFilter(0.01)
+        self.assertFalse(seen_set.add('file-\udcff'))
+        self.assertTrue(seen_set.add('file-\udcff'))
+
+
+if __name__ == '__main__':
+    unittest.main()